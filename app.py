@@ -1,8 +1,33 @@
-from flask import Flask, render_template, request, redirect, session, send_from_directory
-import sqlite3
+from flask import Flask, render_template, request, redirect, session, jsonify, url_for, abort, g
+import csv
+import hashlib
+import io
 import os
-from werkzeug.utils import secure_filename
+import posixpath
+from werkzeug.utils import secure_filename, safe_join
 import shutil
+import sqlite3
+from urllib.parse import quote
+
+import db
+import profiling
+import slowlog
+import migrations
+import chat_events
+import chat_writer
+import uploads
+import resumable
+import blobstore
+import thumbnails
+import fileserve
+import fragments
+import orders
+import custom_requests
+import reconcile
+import compression
+from download_tokens import tokens as download_tokens
+from catalog import catalog
+from db import get_db
 
 # Get the absolute path to the directory containing this script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,141 +36,337 @@ app = Flask(__name__)
 app.secret_key="secret"
 
 # Vercel Configuration
+# Nothing here touches the disk: folders are created, the bundled database
+# copied and the schema checked once per process, before the first request
+# (see prepare_runtime), so a cold start only pays for the imports.
 IS_VERCEL = os.environ.get('VERCEL') == '1'
+BUNDLED_DB = os.path.join(BASE_DIR, 'app_data.db')
 if IS_VERCEL:
     app.config['UPLOAD_FOLDER'] = '/tmp/uploads'
     DB_NAME = '/tmp/app_data.db'
-    
-    # Ensure /tmp/uploads exists
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    
-    # Try to copy DB. If it fails due to paths, initialize empty.
-    bundled_db = os.path.join(BASE_DIR, 'app_data.db')
-    if not os.path.exists(DB_NAME) and os.path.exists(bundled_db):
-        try:
-            shutil.copy2(bundled_db, DB_NAME)
-        except Exception as e:
-            print(f"Failed to copy DB: {e}")
 else:
-    app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'static', 'uploads')
-    DB_NAME = os.path.join(BASE_DIR, 'app_data.db')
-    # Ensure upload directory exists locally
+    app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'static', 'uploads'))
+    DB_NAME = os.environ.get('DATABASE_PATH', os.path.join(BASE_DIR, 'app_data.db'))
+
+# Startup, once per process (see db.init_app)
+def copy_bundled_db():
+    # Vercel's deployment folder is read-only, so the bundled database is
+    # copied to /tmp the first time a process needs it. The copy is renamed
+    # into place, so a process starting alongside never opens half a file.
+    if os.path.exists(DB_NAME) or not os.path.exists(BUNDLED_DB):
+        return
+    tmp = f"{DB_NAME}.{os.getpid()}.tmp"
+    try:
+        shutil.copy2(BUNDLED_DB, tmp)
+        os.replace(tmp, DB_NAME)
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        print(f"Failed to copy DB: {e}")
+
+
+def prepare_runtime():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if IS_VERCEL:
+        copy_bundled_db()
+    # Creates or upgrades the schema (see migrations.py); a single PRAGMA read once current.
+    migrations.migrate(DB_NAME)
+
 
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024 # Increased to 100MB per your suggestion
 
-# Database Initialization Check
-def init_db():
-    con = sqlite3.connect(DB_NAME)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS project_requests(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    student_username TEXT,
-    title TEXT,
-    description TEXT,
-    problem_statement TEXT,
-    objectives TEXT,
-    outcomes TEXT,
-    output_idea TEXT,
-    price INTEGER DEFAULT 0,
-    status TEXT DEFAULT 'Requested',
-    transaction_id TEXT,
-    final_file TEXT
-    )
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS request_photos(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    request_id INTEGER,
-    photo_path TEXT,
-    FOREIGN KEY(request_id) REFERENCES project_requests(id)
-    )
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS request_videos(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    request_id INTEGER,
-    video_path TEXT,
-    FOREIGN KEY(request_id) REFERENCES project_requests(id)
-    )
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS request_messages(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    request_id INTEGER,
-    sender TEXT,
-    message TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY(request_id) REFERENCES project_requests(id)
-    )
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS order_messages(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    order_id INTEGER,
-    sender TEXT,
-    message TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY(order_id) REFERENCES orders(id)
-    )
-    """)
-    con.commit()
-    con.close()
+# Uploads stream straight into UPLOAD_FOLDER (see uploads.py), with a size cap per kind of file
+app.config['UPLOAD_LIMITS'] = {
+    'photo': int(os.environ.get('UPLOAD_LIMIT_PHOTO_MB', 10)) * uploads.MB,
+    'video': int(os.environ.get('UPLOAD_LIMIT_VIDEO_MB', 100)) * uploads.MB,
+    'archive': int(os.environ.get('UPLOAD_LIMIT_ARCHIVE_MB', 100)) * uploads.MB,
+}
+uploads.init_app(app)
+
+# Shared SQLite connection pool (see db.py). Pragmas can be tuned per deployment,
+# e.g. SQLITE_SYNCHRONOUS=FULL for extra durability on the primary server.
+app.config['DATABASE'] = DB_NAME
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', db.DEFAULT_POOL_SIZE))
+app.config['SQLITE_PRAGMAS'] = {
+    name: os.environ[f'SQLITE_{name.upper()}']
+    for name in db.DEFAULT_PRAGMAS
+    if f'SQLITE_{name.upper()}' in os.environ
+}
+db.init_app(app, prepare=prepare_runtime)
+
+# Views declare how many statements they may run (@db.query_budget); with
+# ENFORCE_QUERY_BUDGETS=1 going over raises QueryBudgetExceeded. The load test
+# and benchmarks/check_query_budgets.py turn it on.
+app.config['ENFORCE_QUERY_BUDGETS'] = os.environ.get('ENFORCE_QUERY_BUDGETS', '0') == '1'
+
+# Request metrics for Prometheus at /metrics (see profiling.py). Set
+# METRICS_TOKEN to require "Authorization: Bearer <token>" from the scraper.
+app.config['PROFILING_SLOW_REQUEST_MS'] = float(os.environ.get('PROFILING_SLOW_REQUEST_MS', profiling.DEFAULT_SLOW_REQUEST_MS))
+app.config['PROFILING_SLOW_SAMPLES'] = int(os.environ.get('PROFILING_SLOW_SAMPLES', profiling.DEFAULT_SLOW_SAMPLES))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+profiling.init_app(app)
+
+# Opt-in slow-query log (see slowlog.py): SLOW_QUERY_MS=50 appends every
+# statement at or over 50 ms, with its query plan, to SLOW_QUERY_LOG.
+# Summarise it with "python slowlog.py <log>".
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', os.path.join(os.path.dirname(DB_NAME), 'slow_queries.jsonl'))
+slowlog.log.init_app(app)
+
+# How long a worker serves its catalog snapshot before re-checking the shared
+# generation counter (see catalog.py).
+app.config['CATALOG_CACHE_TTL'] = float(os.environ.get('CATALOG_CACHE_TTL', 2))
+app.config['CATALOG_PAGE_SIZE'] = int(os.environ.get('CATALOG_PAGE_SIZE', 12))
+
+# Rendered project cards are cached per process up to this size (see fragments.py)
+app.config['FRAGMENT_CACHE_MB'] = float(os.environ.get('FRAGMENT_CACHE_MB', fragments.DEFAULT_MAX_MB))
+fragments.cache.init_app(app)
+
+# HTML and JSON responses of at least COMPRESS_MIN_SIZE bytes are gzip- or,
+# with the Brotli package installed, brotli-encoded (see compression.py).
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', compression.DEFAULT_MIN_SIZE))
+compression.init_app(app)
+
+# Chat push (see chat_events.py). Streams are recycled every CHAT_STREAM_SECONDS
+# and the browser reconnects. Each open stream is held by the server for that
+# long, so run gunicorn with the gevent worker (render.yaml): on gthread every
+# open chat takes one of the worker's threads.
+app.config['CHAT_WATCH_INTERVAL'] = float(os.environ.get('CHAT_WATCH_INTERVAL', 0.5))
+app.config['CHAT_STREAM_SECONDS'] = int(os.environ.get('CHAT_STREAM_SECONDS', 300))
+chat_events.hub.init_app(app)
+
+# Optional group commit for chat messages (see chat_writer.py): one writer
+# thread per worker inserts pending messages in one transaction, at most
+# CHAT_GROUP_COMMIT_MS after the first arrives or once CHAT_GROUP_COMMIT_MAX wait.
+# It only pays off with SQLITE_SYNCHRONOUS=FULL; at NORMAL it is slower.
+app.config['CHAT_GROUP_COMMIT'] = os.environ.get('CHAT_GROUP_COMMIT', '0') == '1'
+app.config['CHAT_GROUP_COMMIT_MS'] = float(os.environ.get('CHAT_GROUP_COMMIT_MS', chat_writer.DEFAULT_DELAY_MS))
+app.config['CHAT_GROUP_COMMIT_MAX'] = int(os.environ.get('CHAT_GROUP_COMMIT_MAX', chat_writer.DEFAULT_MAX_BATCH))
+chat_writer.writer.init_app(app)
+
+# Paid downloads: the route always checks entitlement, then streams the file
+# itself, or with DOWNLOAD_OFFLOAD=x-accel-redirect (nginx) / x-sendfile
+# (Apache, lighttpd) hands the transfer to the front proxy. For nginx,
+# DOWNLOAD_OFFLOAD_PREFIX is an internal location aliased to UPLOAD_FOLDER.
+app.config['DOWNLOAD_OFFLOAD'] = os.environ.get('DOWNLOAD_OFFLOAD', '').lower()
+app.config['DOWNLOAD_OFFLOAD_PREFIX'] = os.environ.get('DOWNLOAD_OFFLOAD_PREFIX', '/protected-uploads/')
+if app.config['DOWNLOAD_OFFLOAD'] and app.config['DOWNLOAD_OFFLOAD'] not in fileserve.OFFLOAD_MODES:
+    raise ValueError(f"DOWNLOAD_OFFLOAD must be one of {', '.join(fileserve.OFFLOAD_MODES)}")
+
+# Confirmed orders get signed download links that download() verifies without
+# touching the database (see download_tokens.py).
+app.config['DOWNLOAD_TOKEN_SECRET'] = os.environ.get('DOWNLOAD_TOKEN_SECRET')
+app.config['DOWNLOAD_TOKEN_TTL'] = int(os.environ.get('DOWNLOAD_TOKEN_TTL', 24 * 60 * 60))
+app.config['DOWNLOAD_REVOCATION_REFRESH'] = float(os.environ.get('DOWNLOAD_REVOCATION_REFRESH', 2))
+download_tokens.init_app(app)
+
+# Resized WebP copies of uploaded photos are made in the background
+# (see thumbnails.py); 0 turns generation off.
+app.config['THUMBNAIL_WORKERS'] = int(os.environ.get('THUMBNAIL_WORKERS', thumbnails.DEFAULT_WORKERS))
+thumbnails.worker.init_app(app)
+
+
+# ---------------- STATIC FILES ----------------
+# Static files and uploads are served with ETags, Last-Modified and Range
+# support (see fileserve.py). URLs are fingerprinted: blob-store paths name
+# their content, everything else gets ?v=<mtime/size>, and a request for the
+# current fingerprint may be cached forever. When "python compression.py" has
+# written .br/.gz/.webp copies next to a static file, the best one the client
+# accepts is sent instead. Of the uploads, only published photos and videos
+# are public (is_public_upload).
+def static_file_path(filename):
+    # Uploads live in UPLOAD_FOLDER, which is not under static/ on Vercel
+    if filename.startswith(blobstore.PREFIX):
+        return safe_join(app.config['UPLOAD_FOLDER'], filename[len(blobstore.PREFIX):])
+    return safe_join(app.static_folder, filename)
+
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    if endpoint == "static" and "v" not in values and not fileserve.is_content_addressed(values.get("filename", "")):
+        version = fileserve.fingerprint(static_file_path(values["filename"]) or "")
+        if version:
+            values["v"] = version
+
+
+def is_public_upload(filename):
+    # Published photos and videos and their resized copies. Paid archives
+    # (projects.project_file, project_requests.final_file) share the blob
+    # store but are only sent by download() / download_request(), after the
+    # entitlement check.
+    if posixpath.normpath(filename) != filename:
+        return False
+    if filename.startswith(f"{blobstore.PREFIX}{thumbnails.VARIANT_DIR}/"):
+        return True
+    return blobstore.is_media(get_db(), filename)
+
+
+def serve_static(filename):
+    path = static_file_path(filename)
+    # Hidden entries are spool files and resumable upload sessions
+    if path is None or any(part.startswith(".") for part in filename.split("/")) or not os.path.isfile(path):
+        abort(404)
+    if filename.startswith(blobstore.PREFIX) and not is_public_upload(filename):
+        abort(404)
+    fingerprinted = fileserve.is_content_addressed(path) or request.args.get("v") == fileserve.fingerprint(path)
+    cache_control = fileserve.IMMUTABLE if fingerprinted else fileserve.REVALIDATE
+    # Uploads have no prebuilt copies (photos get their own WebP variants)
+    vary = None if filename.startswith(blobstore.PREFIX) else compression.static_vary(path)
+    variant = compression.static_variant(path, request.accept_encodings, request.accept_mimetypes) if vary else None
+    if variant is None:
+        response = fileserve.send(path, cache_control=cache_control)
+    else:
+        copy, encoding, mimetype = variant
+        response = fileserve.send(copy, cache_control=cache_control, mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    if vary:
+        response.vary.add(vary)
+    return response
 
-init_db()
+
+app.view_functions["static"] = serve_static
 
 
 # ---------------- ADMIN LOGIN ----------------
 # HOME PAGE
 @app.route("/")
 def home():
-    con=sqlite3.connect(DB_NAME)
-    projects_raw=con.execute("SELECT * FROM projects").fetchall()
-    
-    # We will enrich projects with user order status and multiple media
-    projects_with_order_info = []
-    
-    # Fetch all photos and videos mapped by project_id
-    all_photos = con.execute("SELECT project_id, photo_path FROM project_photos").fetchall()
-    all_videos = con.execute("SELECT project_id, video_path FROM project_videos").fetchall()
-    
-    photo_map = {}
-    for pid, path in all_photos:
-        photo_map.setdefault(pid, []).append(path)
-        
-    video_map = {}
-    for pid, path in all_videos:
-        video_map.setdefault(pid, []).append(path)
-    
+    # The catalog itself comes from the in-process snapshot (catalog.py),
+    # one keyset page at a time; only the logged-in student's order status
+    # is read per request.
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    limit = app.config['CATALOG_PAGE_SIZE']
+
     if "student" in session:
         student_username = session["student"]
-        orders = con.execute("SELECT project_id, status, id FROM orders WHERE student_username=?", 
-                             (student_username,)).fetchall()
-        order_dict = {o[0]: (o[1], o[2]) for o in orders}  # project_id -> (status, order_id)
+        con=get_db()
+        student_orders = con.execute("""
+            SELECT orders.project_id, orders.status, orders.id, projects.project_file
+            FROM orders JOIN projects ON projects.id = orders.project_id
+            WHERE orders.student_username=?""", (student_username,)).fetchall()
+        order_dict = {}  # project_id -> (status, order_id, download_url)
+        for project_id, status, order_id, project_file in student_orders:
+            download_url = None
+            if status == orders.CONFIRMED and project_file:
+                token = download_tokens.issue(student_username, project_id)
+                download_url = url_for('download', project_id=project_id, token=token)
+            order_dict[project_id] = (status, order_id, download_url)
         
-        for p in projects_raw:
-            pid = p[0]
-            order_info = order_dict.get(pid, ("none", None))
-            status = order_info[0]
-            oid = order_info[1]
-            photos = photo_map.get(pid, [])
-            videos = video_map.get(pid, [])
-            
-            # Map index (0:id, 1:title, 2:price, 3:description, 4:problem, 5:objectives, 6:outcomes, 7:technologies, 8:project_file, 9:photos_list, 10:videos_list, 11:status, 12:order_id)
-            # Database columns: p[1]:title, p[2]:price, p[5]:description, p[6]:problem, p[7]:objectives, p[8]:outcomes, p[10]:tech, p[9]:project_file
-            projects_with_order_info.append((pid, p[1], p[2], p[5], p[6], p[7], p[8], p[10], p[9], photos, videos, status, oid))
-            
-        con.close()
-        return render_template("index.html", projects=projects_with_order_info)
+        page, prev_cursor, next_cursor = catalog.page(after, before, limit)
+        # Map index (0:id, 1:title, 2:price, 3:description, 4:problem, 5:objectives, 6:outcomes, 7:technologies, 8:project_file, 9:poster, 10:(photo_count, video_count), 11:status, 12:order_id, 13:download_url)
+        projects_with_order_info = [p + order_dict.get(p[0], ("none", None, None)) for p in page]
+        return render_template("index.html", projects=projects_with_order_info,
+                               prev_cursor=prev_cursor, next_cursor=next_cursor)
     else:
-        for p in projects_raw:
-            pid = p[0]
-            photos = photo_map.get(pid, [])
-            videos = video_map.get(pid, [])
-            # Map index (0:id, 1:title, 2:price, 3:description, 4:problem, 5:objectives, 6:outcomes, 7:technologies, 8:project_file, 9:photos_list, 10:videos_list, 11:status, 12:order_id)
-            projects_with_order_info.append((pid, p[1], p[2], p[5], p[6], p[7], p[8], p[10], p[9], photos, videos, "none", None))
-        con.close()
-        return render_template('index.html', projects=projects_with_order_info)
+        page, prev_cursor, next_cursor = catalog.page(after, before, limit, anonymous=True)
+        return render_template('index.html', projects=page,
+                               prev_cursor=prev_cursor, next_cursor=next_cursor)
+
+
+@app.template_global()
+def project_card(p):
+    # The card shows p[0]..p[10] (the snapshot row); the digest of those is
+    # the card's version, so an edited project or a new poster variant misses.
+    card = p[:11]
+    return fragments.cache.get((card[0], fragments.row_version(card)),
+                               lambda: render_template("_project_card.html", p=card))
+
+
+# ---------------- CATALOG API ----------------
+def split_technologies(technologies):
+    return [t.strip() for t in (technologies or "").split(",") if t.strip()]
+
+
+@app.route("/api/projects")
+def api_projects():
+    try:
+        after = int(request.args.get("after", 0))
+        limit = min(int(request.args.get("limit", app.config['CATALOG_PAGE_SIZE'])), 100)
+        min_price = request.args.get("min_price")
+        max_price = request.args.get("max_price")
+        min_price = int(min_price) if min_price is not None else None
+        max_price = int(max_price) if max_price is not None else None
+    except ValueError:
+        return {"error": "after, limit, min_price and max_price must be integers"}, 400
+    if limit < 1:
+        return {"error": "limit must be at least 1"}, 400
+    technology = request.args.get("technology", "").strip().lower()
+
+    # A page only changes when the catalog generation does, so a client
+    # holding the current ETag gets a 304 without any page query running.
+    etag = hashlib.sha1(f"{catalog.version()}|{after}|{limit}|{technology}|{min_price}|{max_price}".encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    sql = """
+        SELECT id, title, price, technologies,
+               (SELECT photo_path FROM project_photos WHERE project_id = projects.id ORDER BY id LIMIT 1) AS poster
+        FROM projects WHERE id > ?"""
+    params = [after]
+    if technology:
+        sql += " AND id IN (SELECT project_id FROM project_technologies WHERE technology = ?)"
+        params.append(technology)
+    if min_price is not None:
+        sql += " AND price >= ?"
+        params.append(min_price)
+    if max_price is not None:
+        sql += " AND price <= ?"
+        params.append(max_price)
+    # Fetch one extra row to know whether there is a next page
+    sql += " ORDER BY id LIMIT ?"
+    params.append(limit + 1)
+
+    rows = get_db().execute(sql, params).fetchall()
+    projects = [{
+        "id": r["id"],
+        "title": r["title"],
+        "price": r["price"],
+        "technologies": split_technologies(r["technologies"]),
+        "poster": url_for('static', filename=r["poster"]) if r["poster"] else None,
+    } for r in rows[:limit]]
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+
+    response = jsonify({"projects": projects, "next_cursor": next_cursor})
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/api/projects/<int:project_id>/media")
+def api_project_media(project_id):
+    # The catalog page only carries a poster and counts; static/media.js
+    # fetches the full gallery when a card is expanded. The gallery is cached
+    # per project on the catalog snapshot and shares its generation as ETag.
+    etag = hashlib.sha1(f"{catalog.version()}|media|{project_id}".encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    media = catalog.media(project_id)
+    if media is None:
+        return {"error": "Unknown project"}, 404
+    photos, videos = media
+
+    def static_url(path):
+        return url_for('static', filename=path)
+
+    response = jsonify({
+        "project_id": project_id,
+        "photos": [{
+            "src": static_url(photo.src),
+            "srcset": ", ".join(f"{static_url(path)} {width}w" for path, width in photo.variants),
+            "full": static_url(photo.path),
+        } for photo in photos],
+        "videos": [{"src": static_url(video)} for video in videos],
+    })
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 
@@ -158,7 +379,7 @@ def admin_login():
         u=request.form["username"]
         p=request.form["password"]
 
-        con=sqlite3.connect(DB_NAME)
+        con=get_db()
         admin=con.execute(
             "SELECT * FROM admin WHERE username=? AND password=?",
             (u,p)).fetchone()
@@ -183,13 +404,13 @@ def admin_dashboard():
 def admin_orders():
     if "admin" not in session:
         return redirect("/admin_login")
-    con = sqlite3.connect(DB_NAME)
-    orders = con.execute("""
+    con = get_db()
+    rows = con.execute("""
         SELECT orders.id, projects.title, orders.student_username, orders.status, orders.transaction_id
         FROM orders 
         JOIN projects ON orders.project_id = projects.id
     """).fetchall()
-    return render_template("admin_orders.html", orders=orders)
+    return render_template("admin_orders.html", orders=rows)
 
 
 # ADD PROJECT
@@ -208,42 +429,43 @@ def add_project():
     videos = request.files.getlist("videos")
     project_file = request.files.get("project_file")
 
-    con=sqlite3.connect(DB_NAME)
+    con=get_db()
     cursor = con.cursor()
     
+    # Uploads go into the content-addressed blob store (see blobstore.py)
     file_path = ""
-    if project_file and project_file.filename:
-        filename = secure_filename(project_file.filename)
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        project_file.save(path)
-        file_path = "uploads/" + filename
+    file_name = None
+    if request.form.get("project_file_upload_id"):
+        file_path, file_name = claim_resumable_upload(con, request.form["project_file_upload_id"])
+    elif project_file and project_file.filename:
+        file_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], project_file)
+        file_name = secure_filename(project_file.filename)
 
     # Insert main project details
-    cursor.execute("INSERT INTO projects(title,project_file,price,photo,video,description,problem_statement,objectives,outcomes,technologies) VALUES(?,?,?,?,?,?,?,?,?,?)",
-                (title,file_path,price,"","",description,problem_statement,objectives,outcomes,technologies))
+    cursor.execute("INSERT INTO projects(title,project_file,project_file_name,price,photo,video,description,problem_statement,objectives,outcomes,technologies) VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+                (title,file_path,file_name,price,"","",description,problem_statement,objectives,outcomes,technologies))
     project_id = cursor.lastrowid
-
+    cursor.executemany("INSERT OR IGNORE INTO project_technologies(project_id, technology) VALUES(?,?)",
+                       [(project_id, t.lower()) for t in split_technologies(technologies)])
     
     # Save photos
+    photo_paths = []
     for photo in photos:
         if photo and photo.filename:
-            filename = secure_filename(photo.filename)
-            photo_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            photo.save(photo_path)
-            db_path = "uploads/" + filename
+            db_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], photo)
             cursor.execute("INSERT INTO project_photos(project_id, photo_path) VALUES(?,?)", (project_id, db_path))
+            photo_paths.append(db_path)
             
     # Save videos
     for video in videos:
         if video and video.filename:
-            filename = secure_filename(video.filename)
-            video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            video.save(video_path)
-            db_path = "uploads/" + filename
+            db_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], video)
             cursor.execute("INSERT INTO project_videos(project_id, video_path) VALUES(?,?)", (project_id, db_path))
 
+    catalog.bump(con)
     con.commit()
-    con.close()
+    drop_resumable_claims()
+    thumbnails.worker.enqueue(*photo_paths)
 
     return redirect("/admin_dashboard")
 
@@ -252,14 +474,41 @@ def add_project():
 
 
 # DELETE PROJECT
+def delete_projects(con, project_ids):
+    """Delete projects with their media; returns ([(project id, None or why
+    not)], blob paths no longer used). Remove those once committed."""
+    existing = {r[0] for r in con.execute("SELECT id FROM projects WHERE id IN (SELECT value FROM json_each(?))",
+                                          (db.in_ids(project_ids),))}
+    results = [(project_id, None if project_id in existing else "No such project")
+               for project_id in dict.fromkeys(project_ids)]
+    ids = [project_id for project_id, error in results if error is None]
+    if not ids:
+        return results, []
+    # Drop the projects' references to their stored files
+    selected = db.in_ids(ids)
+    paths = [r[0] for r in con.execute(
+        "SELECT project_file FROM projects WHERE id IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT photo_path FROM project_photos WHERE project_id IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT video_path FROM project_videos WHERE project_id IN (SELECT value FROM json_each(?))",
+        (selected, selected, selected))]
+    unused = blobstore.release(con, paths)
+    rows = [(project_id,) for project_id in ids]
+    for table, column in (("projects", "id"), ("project_photos", "project_id"), ("project_videos", "project_id"),
+                          ("project_technologies", "project_id")):
+        con.executemany(f"DELETE FROM {table} WHERE {column}=?", rows)
+    catalog.bump(con)
+    return results, unused
+
+
 @app.route("/delete/<int:id>")
 def delete(id):
     if "admin" not in session:
         return redirect("/admin_login")
-    con=sqlite3.connect(DB_NAME)
-    con.execute("DELETE FROM projects WHERE id=?",(id,))
+    con=get_db()
+    _, unused = delete_projects(con, [id])
     con.commit()
-    con.close()
+    blobstore.remove_unused(con, app.config['UPLOAD_FOLDER'], unused)
+    thumbnails.remove_variants(con, app.config['UPLOAD_FOLDER'], unused)
     return redirect("/")
 
 
@@ -271,7 +520,7 @@ def student_login():
         u=request.form["username"]
         p=request.form["password"]
 
-        con=sqlite3.connect(DB_NAME)
+        con=get_db()
         user=con.execute(
             "SELECT * FROM users WHERE username=? AND password=?",
             (u,p)).fetchone()
@@ -290,7 +539,7 @@ def register():
         u=request.form["username"]
         p=request.form["password"]
 
-        con=sqlite3.connect(DB_NAME)
+        con=get_db()
         con.execute("INSERT INTO users(username,password) VALUES(?,?)",(u,p))
         con.commit()
 
@@ -305,7 +554,7 @@ def checkout(id):
     if "student" not in session:
         return redirect("/student_login")
         
-    con = sqlite3.connect(DB_NAME)
+    con = get_db()
     project = con.execute("SELECT id, title, price FROM projects WHERE id=?", (id,)).fetchone()
     
     if not project:
@@ -323,21 +572,11 @@ def submit_payment(project_id):
     txn_id = request.form.get("transaction_id")
     student_username = session["student"]
     
-    con = sqlite3.connect(DB_NAME)
-    
-    # Check if already has a record
-    existing = con.execute("SELECT * FROM orders WHERE project_id=? AND student_username=?", 
-                           (project_id, student_username)).fetchone()
-                           
-    if not existing:
-        con.execute("INSERT INTO orders(project_id, student_username, status, transaction_id) VALUES(?, ?, 'Pending', ?)",
-                    (project_id, student_username, txn_id))
-    else:
-        con.execute("UPDATE orders SET status='Pending', transaction_id=? WHERE project_id=? AND student_username=?",
-                    (txn_id, project_id, student_username))
-                    
+    # One upsert: creates the order, or puts a pending or rejected one back to
+    # Pending with the new id; a confirmed order is left as it is (see orders.py)
+    con = get_db()
+    orders.submit(con, project_id, student_username, txn_id)
     con.commit()
-    con.close()
     
     return redirect("/")
 
@@ -362,7 +601,7 @@ def request_project():
         photos = request.files.getlist("photos")
         videos = request.files.getlist("videos")
 
-        con = sqlite3.connect(DB_NAME)
+        con = get_db()
         cursor = con.cursor()
         
         cursor.execute("""
@@ -373,25 +612,21 @@ def request_project():
         request_id = cursor.lastrowid
         
         # Save photos
+        photo_paths = []
         for photo in photos:
             if photo and photo.filename:
-                filename = secure_filename(photo.filename)
-                photo_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                photo.save(photo_path)
-                db_path = "uploads/" + filename
+                db_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], photo)
                 cursor.execute("INSERT INTO request_photos(request_id, photo_path) VALUES(?,?)", (request_id, db_path))
+                photo_paths.append(db_path)
                 
         # Save videos
         for video in videos:
             if video and video.filename:
-                filename = secure_filename(video.filename)
-                video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                video.save(video_path)
-                db_path = "uploads/" + filename
+                db_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], video)
                 cursor.execute("INSERT INTO request_videos(request_id, video_path) VALUES(?,?)", (request_id, db_path))
 
         con.commit()
-        con.close()
+        thumbnails.worker.enqueue(*photo_paths)
         return redirect("/my_requests")
 
     return render_template("request_project.html")
@@ -403,9 +638,8 @@ def my_requests():
         return redirect("/student_login")
     
     student_username = session["student"]
-    con = sqlite3.connect(DB_NAME)
+    con = get_db()
     requests = con.execute("SELECT * FROM project_requests WHERE student_username=?", (student_username,)).fetchall()
-    con.close()
     
     return render_template("my_requests.html", requests=requests)
 
@@ -415,29 +649,46 @@ def submit_request_payment(request_id):
     if "student" not in session:
         return redirect("/student_login")
     
-    txn_id = request.form.get("transaction_id")
-    con = sqlite3.connect(DB_NAME)
-    con.execute("UPDATE project_requests SET transaction_id=?, status='Pending' WHERE id=?", (txn_id, request_id))
+    txn_id = (request.form.get("transaction_id") or "").strip()
+    if not txn_id:
+        return "Transaction id is required", 400
+    # Only the student's own request, and only while it is awaiting payment
+    # (see custom_requests.py); a verified payment cannot be replaced
+    con = get_db()
+    if custom_requests.submit_payment(con, request_id, session["student"], txn_id) is None:
+        con.rollback()
+        return "This request is not awaiting your payment", 409
     con.commit()
-    con.close()
     
     return redirect("/my_requests")
 
 
+def send_download(filename, download_name):
+    # ``filename`` is relative to UPLOAD_FOLDER; the caller has checked the
+    # student may have it and that it exists.
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    mode = app.config['DOWNLOAD_OFFLOAD']
+    if mode:
+        internal_url = app.config['DOWNLOAD_OFFLOAD_PREFIX'] + quote(filename.replace(os.sep, "/"))
+        return fileserve.offload(mode, file_path, internal_url, download_name=download_name,
+                                 as_attachment=True, cache_control="private, no-cache")
+    return fileserve.send(file_path, download_name=download_name, as_attachment=True,
+                          cache_control="private, no-cache")
+
+
 @app.route("/download_request/<int:request_id>")
 def download_request(request_id):
     if "student" not in session:
         return redirect("/student_login")
     
-    con = sqlite3.connect(DB_NAME)
-    req = con.execute("SELECT final_file, status FROM project_requests WHERE id=?", (request_id,)).fetchone()
-    con.close()
+    con = get_db()
+    req = con.execute("SELECT final_file, status, final_file_name FROM project_requests WHERE id=?", (request_id,)).fetchone()
     
-    if req and req[1] == 'Completed' and req[0]:
+    if req and req[1] == custom_requests.COMPLETED and req[0]:
         filename = req[0].replace('uploads/', '')
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if os.path.exists(file_path):
-            return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+            return send_download(filename, req[2] or os.path.basename(filename))
         return "Error: The file exists in our records but was not found on the server. Please contact support.", 404
     
     return "Access Denied: Custom request is not completed or file is missing.", 403
@@ -447,24 +698,32 @@ def download_request(request_id):
 
 # ---------------- PROJECT REQUESTS (ADMIN) ----------------
 @app.route("/admin_requests")
+@db.query_budget(3)
 def admin_requests():
     if "admin" not in session:
         return redirect("/admin_login")
     
-    con = sqlite3.connect(DB_NAME)
-    con.row_factory = sqlite3.Row
+    con = get_db()
     requests_raw = con.execute("SELECT * FROM project_requests ORDER BY id DESC").fetchall()
     
+    # Load the media for every request on the page with one query per table
+    # instead of two queries per request.
+    ids = db.in_ids(r['id'] for r in requests_raw)
+    photo_map = {}
+    video_map = {}
+    if requests_raw:
+        for rid, path, variants in con.execute(f"SELECT request_id, photo_path, {thumbnails.variants_column('photo_path')} FROM request_photos WHERE request_id IN (SELECT value FROM json_each(?))", (ids,)):
+            photo_map.setdefault(rid, []).append(thumbnails.photo(path, variants))
+        for rid, path in con.execute("SELECT request_id, video_path FROM request_videos WHERE request_id IN (SELECT value FROM json_each(?))", (ids,)):
+            video_map.setdefault(rid, []).append(path)
+    
     requests = []
     for r in requests_raw:
         req_dict = dict(r)
-        photos = con.execute("SELECT photo_path FROM request_photos WHERE request_id=?", (r['id'],)).fetchall()
-        videos = con.execute("SELECT video_path FROM request_videos WHERE request_id=?", (r['id'],)).fetchall()
-        req_dict['photos'] = [p['photo_path'] for p in photos]
-        req_dict['videos'] = [v['video_path'] for v in videos]
+        req_dict['photos'] = photo_map.get(r['id'], [])
+        req_dict['videos'] = video_map.get(r['id'], [])
         requests.append(req_dict)
     
-    con.close()
     return render_template("admin_requests.html", requests=requests)
 
 
@@ -473,31 +732,185 @@ def admin_set_price(request_id):
     if "admin" not in session:
         return redirect("/admin_login")
     
-    price = request.form["price"]
-    con = sqlite3.connect(DB_NAME)
-    con.execute("UPDATE project_requests SET price=?, status='Price Set' WHERE id=?", (price, request_id))
+    try:
+        price = custom_requests.parse_price(request.form.get("price"))
+    except ValueError as e:
+        return str(e), 400
+    # Only before the student has paid (see custom_requests.py)
+    con = get_db()
+    custom_requests.set_price(con, request_id, price)
     con.commit()
-    con.close()
     
     return redirect("/admin_requests")
 
 
+# ---------------- BULK ADMIN ACTIONS ----------------
+# The admin pages post the ticked rows' ids with an action. Every row is
+# checked against the same rules as the single-row routes, the valid ones are
+# written with executemany in one transaction, and the response lists a
+# result per row (JSON for API clients); ids that are not ids at all come back
+# as "Invalid id" rows. A body or action that cannot be used is a 400.
+class BulkRequestError(ValueError):
+    pass
+
+
+@app.errorhandler(BulkRequestError)
+def bulk_request_error(e):
+    return {"error": str(e)}, 400
+
+
+def bulk_form():
+    """The posted form, or the JSON body when it is an object; else None."""
+    if not request.is_json:
+        return request.form
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def parse_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        value = int(value)
+    return value if isinstance(value, int) and value > 0 else None
+
+
+def bulk_ids(form, field):
+    """(ids, [(value, error)] for the values that are not ids)."""
+    if request.is_json:
+        values = form.get(field)
+        if not isinstance(values, list):
+            values = [] if values is None else [values]
+    else:
+        values = form.getlist(field)
+    ids, invalid = [], []
+    for value in values:
+        row_id = parse_id(value)
+        if row_id is None:
+            invalid.append((value, "Invalid id"))
+        else:
+            ids.append(row_id)
+    return ids, invalid
+
+
+def bulk_response(kind, action, results, back):
+    rows = [{"id": row_id, "ok": error is None, "error": error} for row_id, error in results]
+    summary = {"action": action, "succeeded": sum(r["ok"] for r in rows), "failed": sum(not r["ok"] for r in rows),
+               "results": rows}
+    if request.is_json or request.accept_mimetypes.best == "application/json":
+        return summary
+    return render_template("admin_bulk_result.html", kind=kind, back=back, **summary)
+
+
+def bulk_request(field, actions):
+    """(form, action, ids, invalid) for a bulk post; BulkRequestError if the
+    body or the action is unusable."""
+    form = bulk_form()
+    if form is None:
+        raise BulkRequestError("Expected a JSON object")
+    action = form.get("action")
+    if action not in actions:
+        raise BulkRequestError(f"action must be one of: {', '.join(actions)}")
+    ids, invalid = bulk_ids(form, field)
+    if not ids and not invalid:
+        raise BulkRequestError(f"Select at least one {field.split('_')[0]}")
+    return form, action, ids, invalid
+
+
+@app.route("/admin_orders/bulk", methods=["POST"])
+def admin_orders_bulk():
+    if "admin" not in session:
+        return redirect("/admin_login")
+    _, action, ids, invalid = bulk_request("order_id", ("confirm", "reject", "delete"))
+
+    results = []
+    if ids:
+        con = get_db()
+        # Hold the write lock from the status check to the commit
+        con.execute("BEGIN IMMEDIATE")
+        if action == "delete":
+            results = orders.delete_many(con, ids)
+        else:
+            results = orders.bulk_transition(con, ids, action)
+        con.commit()
+    return bulk_response("orders", action, results + invalid, "/admin_orders")
+
+
+@app.route("/admin_requests/bulk", methods=["POST"])
+def admin_requests_bulk():
+    if "admin" not in session:
+        return redirect("/admin_login")
+    form, action, ids, invalid = bulk_request("request_id", ("confirm", "set_price", "delete"))
+    if action == "set_price":
+        try:
+            price = custom_requests.parse_price(form.get("price"))
+        except ValueError as e:
+            raise BulkRequestError(str(e)) from None
+
+    results, unused = [], []
+    if ids:
+        con = get_db()
+        con.execute("BEGIN IMMEDIATE")
+        if action == "delete":
+            results, unused = custom_requests.delete_many(con, ids)
+        elif action == "confirm":
+            results = custom_requests.confirm_payments(con, ids)
+        else:
+            results = custom_requests.set_prices(con, ids, price)
+        con.commit()
+        blobstore.remove_unused(con, app.config['UPLOAD_FOLDER'], unused)
+        thumbnails.remove_variants(con, app.config['UPLOAD_FOLDER'], unused)
+    return bulk_response("requests", action, results + invalid, "/admin_requests")
+
+
+@app.route("/admin_projects/bulk", methods=["POST"])
+def admin_projects_bulk():
+    if "admin" not in session:
+        return redirect("/admin_login")
+    _, action, ids, invalid = bulk_request("project_id", ("delete",))
+
+    results, unused = [], []
+    if ids:
+        con = get_db()
+        con.execute("BEGIN IMMEDIATE")
+        results, unused = delete_projects(con, ids)
+        con.commit()
+        blobstore.remove_unused(con, app.config['UPLOAD_FOLDER'], unused)
+        thumbnails.remove_variants(con, app.config['UPLOAD_FOLDER'], unused)
+    return bulk_response("projects", action, results + invalid, "/")
+
+
 @app.route("/admin_complete_request/<int:request_id>", methods=["POST"])
 def admin_complete_request(request_id):
     if "admin" not in session:
         return redirect("/admin_login")
     
     final_file = request.files.get("final_file")
-    if final_file and final_file.filename:
-        filename = secure_filename(final_file.filename)
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        final_file.save(path)
-        db_path = "uploads/" + filename
-        
-        con = sqlite3.connect(DB_NAME)
-        con.execute("UPDATE project_requests SET final_file=?, status='Completed' WHERE id=?", (db_path, request_id))
+    con = get_db()
+    # Only a paid (or payment-pending) request can be delivered; take the write
+    # lock first so the status cannot change before deliver() runs
+    con.execute("BEGIN IMMEDIATE")
+    old = con.execute("SELECT final_file, status FROM project_requests WHERE id=?", (request_id,)).fetchone()
+    if old is None or old["status"] not in custom_requests.DELIVERABLE:
+        con.rollback()
+        return ("No such request", 404) if old is None else ("This request is not awaiting delivery", 409)
+
+    db_path = None
+    if request.form.get("final_file_upload_id"):
+        db_path, file_name = claim_resumable_upload(con, request.form["final_file_upload_id"])
+    elif final_file and final_file.filename:
+        db_path = blobstore.save_upload(con, app.config['UPLOAD_FOLDER'], final_file)
+        file_name = secure_filename(final_file.filename)
+
+    if db_path:
+        # A file left from an earlier delivery loses its reference
+        unused = blobstore.release(con, [old["final_file"]])
+        custom_requests.deliver(con, request_id, db_path, file_name)
         con.commit()
-        con.close()
+        drop_resumable_claims()
+        blobstore.remove_unused(con, app.config['UPLOAD_FOLDER'], unused)
+    else:
+        con.rollback()
     
     return redirect("/admin_requests")
 
@@ -508,8 +921,71 @@ def confirm_payment(order_id):
     if "admin" not in session:
         return redirect("/admin_login")
         
-    con = sqlite3.connect(DB_NAME)
-    con.execute("UPDATE orders SET status='Confirmed' WHERE id=?", (order_id,))
+    # Only a pending order can be confirmed; anything else is a no-op
+    con = get_db()
+    orders.confirm(con, order_id)
+    con.commit()
+    
+    return redirect("/admin_orders")
+
+
+# REJECT PAYMENT
+# The transaction id did not check out; the student can submit a new one.
+@app.route("/reject_payment/<int:order_id>")
+def reject_payment(order_id):
+    if "admin" not in session:
+        return redirect("/admin_login")
+        
+    con = get_db()
+    orders.reject(con, order_id)
+    con.commit()
+    
+    return redirect("/admin_orders")
+
+
+# RECONCILE PAYMENTS
+# Confirms every pending order and custom request whose transaction id is on
+# an uploaded bank/UPI statement, in one transaction (see reconcile.py).
+@app.route("/admin_reconcile", methods=["GET", "POST"])
+def admin_reconcile():
+    if "admin" not in session:
+        return redirect("/admin_login")
+    if request.method == "GET":
+        return render_template("admin_reconcile.html", report=None, error=None)
+
+    statement = request.files.get("statement")
+    if not statement or not statement.filename:
+        return render_template("admin_reconcile.html", report=None, error="Choose a statement CSV file."), 400
+
+    con = get_db()
+    # Decoded and parsed as it is read, so a long statement is never held in memory
+    lines = io.TextIOWrapper(statement.stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        report = reconcile.reconcile(con, lines).as_dict()
+    except (reconcile.StatementError, csv.Error) as e:
+        con.rollback()
+        return render_template("admin_reconcile.html", report=None, error=str(e)), 400
+    finally:
+        lines.detach()
+    con.commit()
+
+    if request.accept_mimetypes.best == "application/json":
+        return report
+    return render_template("admin_reconcile.html", report=report, error=None)
+
+
+# REVOKE PAYMENT
+# Reverses a confirmation, e.g. a payment that turned out not to have arrived.
+# Download links already handed out stop working on every worker.
+@app.route("/revoke_payment/<int:order_id>")
+def revoke_payment(order_id):
+    if "admin" not in session:
+        return redirect("/admin_login")
+    
+    con = get_db()
+    order = orders.revoke(con, order_id)
+    if order:
+        download_tokens.revoke(con, order[0], order[1])
     con.commit()
     
     return redirect("/admin_orders")
@@ -527,91 +1003,282 @@ def logout():
 @app.route("/download/<int:project_id>")
 
 def download(project_id):
+    # Signed link from the home page: no order lookup, and the file comes
+    # from the catalog snapshot, so retries cost no queries
+    token = request.args.get("token")
+    if token:
+        claims = download_tokens.verify(token, project_id)
+        archive = claims and catalog.archive(project_id)
+        if archive and session.get("student", claims["student"]) == claims["student"]:
+            filename = archive[0].replace('uploads/', '')
+            if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+                return send_download(filename, archive[1] or os.path.basename(filename))
+            return "Error: Project file record exists but the file is missing from the server. Please notify the administrator.", 404
+        if "student" not in session:
+            return "Access Denied: This download link has expired or been revoked. Please log in to download.", 403
+
     if "student" not in session:
         return redirect("/student_login")
         
     student_username = session["student"]
-    con = sqlite3.connect(DB_NAME)
+    con = get_db()
     
     # Check if order is confirmed
     order = con.execute("SELECT status FROM orders WHERE project_id=? AND student_username=?", 
                         (project_id, student_username)).fetchone()
     
-    if order and order[0] == 'Confirmed':
-        project = con.execute("SELECT project_file FROM projects WHERE id=?", (project_id,)).fetchone()
+    if order and order[0] == orders.CONFIRMED:
+        project = con.execute("SELECT project_file, project_file_name FROM projects WHERE id=?", (project_id,)).fetchone()
         if project and project[0]:
             filename = project[0].replace('uploads/', '')
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             if os.path.exists(file_path):
-                return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+                # Blobs are named by hash; hand the student the name the admin uploaded
+                return send_download(filename, project[1] or os.path.basename(filename))
             return "Error: Project file record exists but the file is missing from the server. Please notify the administrator.", 404
         return "File not found: The project file has not been uploaded for this project yet.", 404
             
     return "Access Denied: Payment not confirmed or project not found.", 403
 
+# ---------------- RESUMABLE UPLOADS (ADMIN) ----------------
+# Chunked, resumable alternative to posting project_file/final_file inline.
+# See resumable.py for the protocol; the finished upload id is then sent to
+# add_project as project_file_upload_id or to admin_complete_request as
+# final_file_upload_id.
+@app.errorhandler(resumable.UploadError)
+def resumable_upload_error(e):
+    body = {"error": e.message}
+    headers = {}
+    if e.offset is not None:
+        body["offset"] = e.offset
+        headers["Upload-Offset"] = str(e.offset)
+    return body, e.status, headers
+
+
+def claim_resumable_upload(con, upload_id):
+    # Returns (blob path, original file name). The caller must call
+    # drop_resumable_claims() after committing; a request that ends without
+    # doing so gets its claims undone by restore_resumable_claims().
+    def place(data_file, meta):
+        ext = os.path.splitext(meta["filename"])[1]
+        try:
+            path = blobstore.store(con, app.config['UPLOAD_FOLDER'], data_file, meta["sha256"], meta["size"], ext)
+        except blobstore.MissingBlob:
+            # The stored copy the session was matched against has been deleted since
+            raise resumable.reopen(app.config['UPLOAD_FOLDER'], upload_id) from None
+        moved = data_file is not None and not os.path.exists(data_file)
+        g.setdefault("resumable_claims", []).append((upload_id, path if moved else None))
+        return path, secure_filename(meta["filename"])
+    return resumable.claim(app.config['UPLOAD_FOLDER'], upload_id, place)
+
+
+def drop_resumable_claims():
+    for upload_id, _ in g.pop("resumable_claims", []):
+        resumable.drop(app.config['UPLOAD_FOLDER'], upload_id)
+
+
+@app.teardown_request
+def restore_resumable_claims(exc=None):
+    # The request rolled back after claiming: the blobs row went with it, so
+    # the file moved into the blob store goes back into its session. Under
+    # the write lock, as in blobstore.remove_unused: if the same content has
+    # been stored since, the file is that upload's now and stays.
+    moved = [(upload_id, path) for upload_id, path in g.pop("resumable_claims", []) if path]
+    if not moved:
+        return
+    con = get_db()
+    if con.in_transaction:
+        con.rollback()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        for upload_id, path in moved:
+            try:
+                if con.execute("SELECT 1 FROM blobs WHERE path=?", (path,)).fetchone():
+                    resumable.restore(app.config['UPLOAD_FOLDER'], upload_id, None)
+                else:
+                    resumable.restore(app.config['UPLOAD_FOLDER'], upload_id,
+                                      blobstore.fs_path(app.config['UPLOAD_FOLDER'], path))
+            except (resumable.UploadError, OSError):
+                pass  # the session has expired meanwhile
+    finally:
+        con.rollback()
+
+
+@app.route("/api/uploads", methods=["POST"])
+def create_upload():
+    if "admin" not in session:
+        return {"error": "Unauthorized"}, 401
+    data = request.get_json(silent=True) or {}
+    already_stored = bool(data.get("sha256")) and blobstore.lookup(get_db(), data["sha256"]) is not None
+    upload_id = resumable.create(app.config['UPLOAD_FOLDER'], data.get("filename"), data.get("size"),
+                                 data.get("sha256"), app.config['UPLOAD_LIMITS']['archive'], already_stored)
+    return resumable.status(app.config['UPLOAD_FOLDER'], upload_id), 201
+
+
+@app.route("/api/uploads/<upload_id>", methods=["HEAD", "GET"])
+def upload_status(upload_id):
+    if "admin" not in session:
+        return {"error": "Unauthorized"}, 401
+    info = resumable.status(app.config['UPLOAD_FOLDER'], upload_id)
+    return info, 200, {"Upload-Offset": str(info["offset"]), "Cache-Control": "no-store"}
+
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT", "PATCH"])
+def upload_chunk(upload_id):
+    if "admin" not in session:
+        return {"error": "Unauthorized"}, 401
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return {"error": "Upload-Offset header is required"}, 400
+    new_offset = resumable.append(app.config['UPLOAD_FOLDER'], upload_id, offset, request.stream)
+    return {"upload_id": upload_id, "offset": new_offset}, 200, {"Upload-Offset": str(new_offset)}
+
+
+@app.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    if "admin" not in session:
+        return {"error": "Unauthorized"}, 401
+    data = request.get_json(silent=True) or {}
+    return resumable.finalize(app.config['UPLOAD_FOLDER'], upload_id, data.get("sha256"))
+
+
 # ---------------- CHAT SYSTEM ----------------
-@app.route("/send_message/<int:request_id>", methods=["POST"])
-def send_message(request_id):
+# Both send endpoints answer once the message is committed, with its id
+def post_chat_message(kind, conversation_id):
     if "student" not in session and "admin" not in session:
         return {"error": "Unauthorized"}, 401
     
     sender = session.get("student") if "student" in session else "Admin"
-    message = request.json.get("message")
+    data = request.get_json(silent=True)
+    message = data.get("message") if isinstance(data, dict) else None
     
-    if not message:
+    if not message or not isinstance(message, str):
         return {"error": "Empty message"}, 400
-        
-    con = sqlite3.connect(DB_NAME)
-    con.execute("INSERT INTO request_messages(request_id, sender, message) VALUES(?,?,?)",
-                (request_id, sender, message))
-    con.commit()
-    con.close()
-    return {"status": "success"}
 
-@app.route("/get_messages/<int:request_id>")
-def get_messages(request_id):
+    try:
+        message_id = chat_writer.writer.insert(kind, conversation_id, sender, message)
+    except sqlite3.IntegrityError:
+        return {"error": "The message could not be saved"}, 409
+    except (TimeoutError, sqlite3.Error):
+        return {"error": "The server is busy, please send again"}, 503
+    return {"status": "success", "id": message_id}
+
+
+@app.route("/send_message/<int:request_id>", methods=["POST"])
+def send_message(request_id):
+    return post_chat_message("request", request_id)
+
+# Both chat fetch endpoints take ?after_id=<id> (only newer messages),
+# ?before_id=<id> (older history) and ?limit=<n>; with no cursor they return
+# the latest page. "has_more" tells the client whether another page exists.
+def chat_page_response(kind, conversation_id):
     if "student" not in session and "admin" not in session:
         return {"error": "Unauthorized"}, 401
-        
-    con = sqlite3.connect(DB_NAME)
-    con.row_factory = sqlite3.Row
-    messages = con.execute("SELECT * FROM request_messages WHERE request_id=? ORDER BY timestamp ASC",
-                           (request_id,)).fetchall()
-    con.close()
-    
-    return {"messages": [dict(m) for m in messages]}
+    try:
+        after_id = request.args.get("after_id")
+        after_id = int(after_id) if after_id is not None else None
+        before_id = request.args.get("before_id")
+        before_id = int(before_id) if before_id is not None else None
+        limit = int(request.args.get("limit", chat_events.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return {"error": "after_id, before_id and limit must be integers"}, 400
+    limit = max(1, min(limit, chat_events.MAX_PAGE_SIZE))
+
+    messages, has_more = chat_events.load_messages(get_db(), kind, conversation_id, after_id, before_id, limit)
+    return {"messages": messages, "has_more": has_more}
+
+
+@app.route("/get_messages/<int:request_id>")
+def get_messages(request_id):
+    return chat_page_response("request", request_id)
 
 
 @app.route("/get_order_messages/<int:order_id>")
 def get_order_messages(order_id):
-    if "student" not in session and "admin" not in session:
-        return {"error": "Unauthorized"}, 401
-        
-    con = sqlite3.connect(DB_NAME)
-    con.row_factory = sqlite3.Row
-    messages = con.execute("SELECT * FROM order_messages WHERE order_id=? ORDER BY timestamp ASC",
-                           (order_id,)).fetchall()
-    con.close()
-    
-    return {"messages": [dict(m) for m in messages]}
+    return chat_page_response("order", order_id)
 
 @app.route("/send_order_message/<int:order_id>", methods=["POST"])
 def send_order_message(order_id):
+    return post_chat_message("order", order_id)
+
+
+# ---------------- CHAT STREAMS (SSE) ----------------
+# Open chats subscribe here instead of polling get_*_messages. The stream
+# sends what is newer than Last-Event-ID (on reconnect) or ?after_id= (the
+# newest message the client already fetched), otherwise the latest page, and
+# then pushes new messages as chat_events.hub sees them committed.
+def chat_stream_response(kind, conversation_id):
     if "student" not in session and "admin" not in session:
         return {"error": "Unauthorized"}, 401
-    
-    sender = session.get("student") if "student" in session else "Admin"
-    message = request.json.get("message")
-    
-    if not message:
-        return {"error": "Empty message"}, 400
-        
-    con = sqlite3.connect(DB_NAME)
-    con.execute("INSERT INTO order_messages(order_id, sender, message) VALUES(?,?,?)",
-                (order_id, sender, message))
-    con.commit()
-    con.close()
-    return {"status": "success"}
+
+    after_id = request.headers.get("Last-Event-ID", type=int)
+    if after_id is None:
+        after_id = request.args.get("after_id", type=int)
+
+    # Subscribe before reading history so nothing falls in between
+    sub = chat_events.hub.subscribe(kind, conversation_id)
+    try:
+        con = get_db()
+        if after_id is None:
+            history, _ = chat_events.load_messages(con, kind, conversation_id)
+        else:
+            # Catch up on everything missed since the cursor, a page at a time
+            history, has_more = [], True
+            while has_more:
+                page, has_more = chat_events.load_messages(con, kind, conversation_id, after_id=after_id,
+                                                           limit=chat_events.MAX_PAGE_SIZE)
+                history.extend(page)
+                after_id = page[-1]["id"] if page else after_id
+    except Exception:
+        chat_events.hub.unsubscribe(sub)
+        raise
+    # Hand the connection back now; the stream itself never touches the database
+    db.close_db()
+
+    response = app.response_class(
+        chat_events.stream(sub, history, after_id or 0, app.config['CHAT_STREAM_SECONDS']),
+        mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: chat_events.hub.unsubscribe(sub))
+    return response
+
+
+@app.route("/stream_messages/<int:request_id>")
+def stream_messages(request_id):
+    return chat_stream_response("request", request_id)
+
+
+@app.route("/stream_order_messages/<int:order_id>")
+def stream_order_messages(order_id):
+    return chat_stream_response("order", order_id)
+
+
+# ---------------- METRICS ----------------
+def metrics_allowed(public_without_token):
+    token = app.config['METRICS_TOKEN']
+    if "admin" in session:
+        return True
+    if token:
+        return request.headers.get("Authorization") == f"Bearer {token}"
+    return public_without_token
+
+
+@app.route("/metrics")
+def metrics():
+    if not metrics_allowed(public_without_token=True):
+        return "Forbidden", 403
+    return app.response_class(app.extensions["profiling"].render_prometheus(),
+                              mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/metrics/slow")
+def slow_requests():
+    # Statement lists can reveal more than the counters, so never public
+    if not metrics_allowed(public_without_token=False):
+        return "Forbidden", 403
+    return jsonify({"threshold_ms": app.config['PROFILING_SLOW_REQUEST_MS'],
+                    "requests": app.extensions["profiling"].slow_requests()})
 
 
 # Expose the app for Vercel
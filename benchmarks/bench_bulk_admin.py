@@ -0,0 +1,101 @@
+"""Bulk admin actions against the single-row routes.
+
+Builds a synthetic dataset (see dataset.py) and, for each --rows size,
+clears that many pending orders two ways on a fresh copy of the database:
+
+    one by one   GET /confirm_payment/<id> per order, a transaction each
+    bulk         one POST /admin_orders/bulk with every id (checked, then
+                 written with executemany in a single transaction)
+
+and checks both leave the same orders confirmed.
+
+    python benchmarks/bench_bulk_admin.py --students 5000 --rows 100 500 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import dataset
+
+ROOT = dataset.ROOT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 500, 2000], help="orders cleared per run")
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_db, uploads = os.path.join(tmp, "base.db"), os.path.join(tmp, "uploads")
+        ctx = dataset.generate(base_db, uploads, projects=args.projects, students=args.students,
+                               requests=0, messages=0, hot_messages=0, photos_per_project=0,
+                               videos_per_project=0, archive_kb=1, seed=args.seed)
+        con = sqlite3.connect(base_db)
+        pending = [r[0] for r in con.execute("SELECT id FROM orders WHERE status = 'Pending' ORDER BY id")]
+        con.close()
+        print(f"dataset: {ctx['orders']} orders, {len(pending)} pending")
+
+        db_path = os.path.join(tmp, "bench.db")
+        os.environ.update(DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+
+        app = app_module.app
+        pool = app.extensions["sqlite_pool"]
+        failures = 0
+
+        def fresh_client():
+            pool.close_all()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            shutil.copy(base_db, db_path)
+            client = app.test_client()
+            client.post("/admin_login", data=dict(zip(("username", "password"), ctx["admin"]))).close()
+            return client
+
+        def confirmed(ids):
+            con = sqlite3.connect(db_path)
+            count = con.execute("SELECT count(*) FROM orders WHERE status = 'Confirmed' AND id IN "
+                                "(SELECT value FROM json_each(?))", (json.dumps(ids),)).fetchone()[0]
+            con.close()
+            return count
+
+        for rows in args.rows:
+            ids = pending[:rows]
+
+            client = fresh_client()
+            start = time.perf_counter()
+            for order_id in ids:
+                client.get(f"/confirm_payment/{order_id}").close()
+            single = time.perf_counter() - start
+            single_confirmed = confirmed(ids)
+
+            client = fresh_client()
+            start = time.perf_counter()
+            response = client.post("/admin_orders/bulk", json={"action": "confirm", "order_id": ids})
+            bulk = time.perf_counter() - start
+            result = response.get_json()
+            response.close()
+            bulk_confirmed = confirmed(ids)
+
+            if not (single_confirmed == bulk_confirmed == result["succeeded"] == len(ids)):
+                failures += 1
+                print(f"FAIL: {len(ids)} ids, one by one confirmed {single_confirmed}, "
+                      f"bulk confirmed {bulk_confirmed} (reported {result['succeeded']})")
+            print(f"{len(ids):>6} orders  one by one {single * 1000:8.1f} ms  bulk {bulk * 1000:7.1f} ms  "
+                  f"x{single / bulk:5.1f}")
+        pool.close_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
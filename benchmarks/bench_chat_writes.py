@@ -0,0 +1,137 @@
+"""Chat messages per second, with and without group commit.
+
+Builds a small synthetic dataset (see dataset.py), then --concurrency
+threads, each with its own logged-in test client, post --messages chat
+messages to a handful of conversations. Every configuration runs in turn:
+
+    direct        insert and commit per request (CHAT_GROUP_COMMIT off)
+    group Nms     the writer thread, flushing N ms after a batch's first message
+
+For each: messages/sec, per-message latency percentiles, and for group
+commit the commits made and the average batch. Every message must come back
+with an id, and the ids must be unique and all present in the database.
+The configurations share one database (the writer thread keeps its
+connection), each tagging its own messages.
+
+    python benchmarks/bench_chat_writes.py --concurrency 16 --messages 4000 --synchronous FULL
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import dataset
+
+ROOT = dataset.ROOT
+DEFAULT_DELAYS = (0, 2, 10)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run(app, ctx, label, total, concurrency):
+    per_thread = total // concurrency
+    latencies, ids, errors = [], [], []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency + 1)
+
+    def sender(index):
+        client = app.test_client()
+        client.post("/admin_login", data=dict(zip(("username", "password"), ctx["admin"]))).close()
+        # Spread over a few conversations, like several chats open at once
+        conversation = index % 4 + 1
+        mine, mine_ids, mine_errors = [], [], 0
+        start_gate.wait()
+        for n in range(per_thread):
+            start = time.perf_counter()
+            response = client.post(f"/send_message/{conversation}", json={"message": f"{label} {index}-{n}"})
+            mine.append(time.perf_counter() - start)
+            if response.status_code == 200:
+                mine_ids.append(response.get_json()["id"])
+            else:
+                mine_errors += 1
+            response.close()
+        with lock:
+            latencies.extend(mine)
+            ids.extend(mine_ids)
+            errors.append(mine_errors)
+
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    start_gate.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "messages": len(latencies),
+        "errors": sum(errors),
+        "ids": ids,
+        "rate": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000, help="messages per configuration")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delays", type=float, nargs="+", default=DEFAULT_DELAYS,
+                        help="CHAT_GROUP_COMMIT_MS values to try")
+    parser.add_argument("--max-batch", type=int, default=100, help="CHAT_GROUP_COMMIT_MAX")
+    parser.add_argument("--synchronous", default="NORMAL", choices=("OFF", "NORMAL", "FULL"),
+                        help="SQLite synchronous pragma; FULL makes every commit fsync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, uploads = os.path.join(tmp, "bench.db"), os.path.join(tmp, "uploads")
+        ctx = dataset.generate(db_path, uploads, projects=20, students=50, requests=20, messages=0,
+                               hot_messages=0, photos_per_project=0, videos_per_project=0, archive_kb=1, seed=0)
+        os.environ.update(DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0",
+                          SQLITE_SYNCHRONOUS=args.synchronous, SQLITE_POOL_SIZE=str(args.concurrency))
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import chat_writer
+
+        app = app_module.app
+        app.config["PROPAGATE_EXCEPTIONS"] = False
+        writer = chat_writer.writer
+        print(f"{args.messages} messages, {args.concurrency} senders, synchronous={args.synchronous}")
+        failures = 0
+        for delay in [None] + list(args.delays):
+            label = "direct" if delay is None else f"group {delay:g}ms"
+            app.config["CHAT_GROUP_COMMIT"] = delay is not None
+            app.config["CHAT_GROUP_COMMIT_MS"] = delay or 0
+            app.config["CHAT_GROUP_COMMIT_MAX"] = args.max_batch
+            writer.init_app(app)
+            batches_before, messages_before = writer.batches, writer.messages
+
+            r = run(app, ctx, label, args.messages, args.concurrency)
+
+            con = sqlite3.connect(db_path)
+            stored = {row[0] for row in con.execute("SELECT id FROM request_messages WHERE message LIKE ?",
+                                                      (f"{label} %",))}
+            con.close()
+            if r["errors"] or len(set(r["ids"])) != len(r["ids"]) or set(r["ids"]) != stored:
+                failures += 1
+                print(f"FAIL: {r['errors']} errors, {len(r['ids'])} ids returned, {len(stored)} stored")
+            line = (f"{label:<12} {r['rate']:8.0f} msg/s   p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  "
+                    f"p99 {r['p99_ms']:7.2f} ms")
+            if delay is not None:
+                batches = writer.batches - batches_before
+                line += f"   {batches} commits, {(writer.messages - messages_before) / max(batches, 1):.1f} per batch"
+            print(line)
+        app.extensions["sqlite_pool"].close_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
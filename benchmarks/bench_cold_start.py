@@ -0,0 +1,94 @@
+"""Cold start: time from a fresh interpreter to the first response.
+
+Each run starts a new Python process that imports app.py and serves one
+request through the test client, as a serverless platform does on a cold
+start. Reported per run, then as medians:
+
+    import    importing app.py (Flask, the modules, the app's config)
+    first     the first request, including the once-per-process startup
+              (upload folder, bundled database copy, schema check)
+    second    a second request, for comparison
+    total     process launch to first response, as seen from outside
+
+Two cases: "new database" (nothing on disk yet, so the first request
+creates the schema) and "existing database" (already migrated, so the
+startup is a single PRAGMA read). The probe also checks that importing the
+app created neither the database nor the upload folder.
+
+    python benchmarks/bench_cold_start.py --runs 10 --path /
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+start = time.perf_counter()
+import json, os, sys
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+touched = [p for p in (os.environ["DATABASE_PATH"], os.environ["UPLOAD_FOLDER"]) if os.path.exists(p)]
+client = app.app.test_client()
+status = client.get({path!r}).status_code
+first = time.perf_counter()
+client.get({path!r})
+second = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first": first - imported, "second": second - first,
+                  "status": status, "touched_on_import": touched}}))
+"""
+
+
+def run_once(path, env):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, path=path)], env=env,
+                         check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    result = json.loads(out.strip().splitlines()[-1])
+    # Launch overhead is the part of the total the probe could not see
+    result["total"] = total - result["second"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/", help="URL of the first request")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app_data.db")
+        uploads = os.path.join(tmp, "uploads")
+        env = dict(os.environ, DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0")
+        for case in ("new database", "existing database"):
+            runs = []
+            for _ in range(args.runs):
+                if case == "new database":
+                    shutil.rmtree(uploads, ignore_errors=True)
+                    for suffix in ("", "-wal", "-shm"):
+                        if os.path.exists(db_path + suffix):
+                            os.remove(db_path + suffix)
+                runs.append(run_once(args.path, env))
+            print(f"{case}: status {runs[0]['status']}")
+            if case == "new database":
+                touched = sorted({p for r in runs for p in r["touched_on_import"]})
+                failures += bool(touched)
+                print(f"  import created: {', '.join(touched) if touched else 'nothing'}")
+            for key in ("import", "first", "second", "total"):
+                values = [r[key] * 1000 for r in runs]
+                print(f"  {key:>6}: median {statistics.median(values):7.1f} ms   "
+                      f"min {min(values):7.1f} ms   max {max(values):7.1f} ms")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
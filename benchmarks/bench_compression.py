@@ -0,0 +1,131 @@
+"""Bytes on the wire with and without compression.
+
+Builds a small synthetic dataset (see dataset.py) and a copy of static/
+with its precompressed copies (see compression.py), then fetches the main
+pages, chat JSON and static assets through the test client once per
+Accept-Encoding: identity, gzip and, with the Brotli package installed, br.
+Images are fetched with and without WebP in Accept. For every response
+the benchmark checks that the decoded body is the identity body, and
+reports its size, the saving and, for dynamic responses, the time the
+app spent (compression included).
+
+    python benchmarks/bench_compression.py --projects 50 --hot-messages 500
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import dataset
+
+ROOT = dataset.ROOT
+ENCODINGS = ("identity", "gzip", "br")
+STATIC_FILES = ("style.css", "chat.js", "media.js")
+IMAGES = ("bg_premium.png",)
+
+
+def decode(body, coding):
+    if coding == "gzip":
+        return gzip.decompress(body)
+    if coding == "br":
+        import brotli
+        return brotli.decompress(body)
+    return body
+
+
+def fetch(client, path, headers, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        elapsed = time.perf_counter() - start
+        coding = response.headers.get("Content-Encoding", "identity")
+        mimetype = response.mimetype
+        response.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return body, coding, mimetype, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fetches per page and encoding (the fastest counts)")
+    dataset.add_arguments(parser)
+    parser.set_defaults(projects=50, students=100, project_requests=50, hot_messages=500, archive_kb=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, uploads, static = (os.path.join(tmp, name) for name in ("bench.db", "uploads", "static"))
+        ctx = dataset.generate(db_path, uploads, **dataset.scale(args))
+        shutil.copytree(os.path.join(ROOT, "static"), static, ignore=shutil.ignore_patterns("uploads", "*.gz", "*.br",
+                                                                                          "*.webp"))
+        os.environ.update(DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import compression
+
+        compression.build(static)
+        app = app_module.app
+        app.static_folder = static
+        with app.test_request_context():
+            static_urls = {name: app_module.url_for("static", filename=name) for name in STATIC_FILES + IMAGES}
+
+        student = ("/student_login", {"username": ctx["students"][0], "password": ctx["password"]})
+        admin = ("/admin_login", dict(zip(("username", "password"), ctx["admin"])))
+        pages = [
+            ("home, anonymous", None, "/"),
+            ("home, student", student, "/"),
+            ("admin orders", admin, "/admin_orders"),
+            ("admin requests", admin, "/admin_requests"),
+            ("chat JSON, long", admin, f"/get_messages/{ctx['hot_request']}"),
+            ("order chat JSON", admin, f"/get_order_messages/{ctx['hot_order']}"),
+            ("catalog JSON", None, "/api/projects?limit=48"),
+        ] + [(name, None, url) for name, url in static_urls.items() if name not in IMAGES]
+        encodings = [e for e in ENCODINGS if e != "br" or compression.brotli is not None]
+        if compression.brotli is None:
+            print("note: the Brotli package is not installed, so there are no br results")
+
+        header = f"{'response':<20} {'identity':>10}" + "".join(f" {e:>17}" for e in encodings[1:])
+        print(header + "   app time identity / compressed")
+        totals = dict.fromkeys(encodings, 0)
+        failures = 0
+        for label, user, path in pages:
+            client = app.test_client()
+            if user:
+                client.post(user[0], data=user[1]).close()
+            sizes, times, plain = {}, {}, None
+            for encoding in encodings:
+                body, coding, _, elapsed = fetch(client, path, {"Accept-Encoding": encoding}, args.runs)
+                if encoding == "identity":
+                    plain = body
+                elif decode(body, coding) != plain:
+                    failures += 1
+                    print(f"MISMATCH: {label} decoded from {coding} differs from the identity body")
+                sizes[encoding], times[encoding] = len(body), elapsed
+                totals[encoding] += len(body)
+            base = sizes["identity"]
+            print(f"{label:<20} {base:>10,}" + "".join(f" {sizes[e]:>9,} {1 - sizes[e] / base:>6.1%}"
+                                                      for e in encodings[1:])
+                  + f"   {times['identity'] * 1000:6.2f} / {times[encodings[-1]] * 1000:6.2f} ms")
+        base = totals["identity"]
+        print(f"{'total':<20} {base:>10,}" + "".join(f" {totals[e]:>9,} {1 - totals[e] / base:>6.1%}"
+                                                    for e in encodings[1:]))
+
+        print(f"\n{'image':<20} {'original':>10} {'webp':>17}")
+        client = app.test_client()
+        for name in IMAGES:
+            original, _, _, _ = fetch(client, static_urls[name], {"Accept": "image/png"}, 1)
+            webp, _, mimetype, _ = fetch(client, static_urls[name], {"Accept": "image/webp,*/*"}, 1)
+            if mimetype != "image/webp":
+                print(f"{name:<20} {len(original):>10,}   (no WebP copy: Pillow missing?)")
+                continue
+            print(f"{name:<20} {len(original):>10,} {len(webp):>9,} {1 - len(webp) / len(original):>6.1%}")
+        app.extensions["sqlite_pool"].close_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Requests/sec for the store's routes with and without the db.py pool.
+
+"before" reproduces the old behaviour: a fresh sqlite3.connect() per request
+with SQLite's default rollback journal. "after" is the pooled WAL setup from
+db.py. Both runs use the same freshly seeded database and the same mix of
+catalog reads and chat writes, spread over several threads.
+
+    python benchmarks/bench_connections.py --threads 8 --requests 2000
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class NaivePool:
+    """Stand-in for the old code path: connect on use, close afterwards."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self):
+        con = sqlite3.connect(self.path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def release(self, con):
+        con.close()
+
+    def close_all(self):
+        pass
+
+
+def seed(path, projects=50):
+    subprocess.run([sys.executable, os.path.join(ROOT, "migrations.py"), path],
+                   check=True, stdout=subprocess.DEVNULL)
+    con = sqlite3.connect(path)
+    for i in range(projects):
+        cur = con.execute(
+            "INSERT INTO projects(title,project_file,price,photo,video,description,problem_statement,objectives,outcomes,technologies) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?)",
+            (f"Project {i}", "", 100 + i, "", "", "desc", "na", "na", "na", "Python, Flask"))
+        con.execute("INSERT INTO project_photos(project_id, photo_path) VALUES(?,?)",
+                    (cur.lastrowid, f"uploads/p{i}.png"))
+        con.execute("INSERT INTO orders(project_id, student_username, status, transaction_id) VALUES(?,?,?,?)",
+                    (cur.lastrowid, "bench", "Pending", f"TXN{i}"))
+    con.commit()
+    con.close()
+
+
+def run(app, threads, total):
+    errors = []
+    per_thread = total // threads
+
+    def worker():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["student"] = "bench"
+        for i in range(per_thread):
+            if i % 4 == 0:
+                resp = client.post("/send_order_message/1", json={"message": f"msg {i}"})
+            elif i % 4 == 1:
+                resp = client.get("/get_order_messages/1")
+            else:
+                resp = client.get("/")
+            if resp.status_code >= 500:
+                errors.append(resp.status_code)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("before", "after"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "app_data.db")
+            seed(path)
+            os.environ["DATABASE_PATH"] = path
+            sys.path.insert(0, ROOT)
+            for name in ("app", "db"):
+                sys.modules.pop(name, None)
+            import app as app_module
+            app = app_module.app
+            app.testing = False
+            app.config["PROPAGATE_EXCEPTIONS"] = False
+            if mode == "before":
+                app.extensions["sqlite_pool"] = NaivePool(path)
+                sqlite3.connect(path).execute("PRAGMA journal_mode=DELETE").close()
+            results[mode] = run(app, args.threads, args.requests)
+            app.extensions["sqlite_pool"].close_all()
+
+    for mode, (rps, errors) in results.items():
+        print(f"{mode:>6}: {rps:8.1f} req/s  ({errors} server errors)")
+    print(f"speedup: {results['after'][0] / results['before'][0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Statement reconciliation: throughput and memory against statement size.
+
+Builds a synthetic dataset (see dataset.py) with --students students, so
+there are many pending orders, then for each --rows size writes a
+statement CSV in which about half the rows pay a pending order or
+request, and the rest are unknown ids, a few duplicates and a few wrong
+amounts. Each size runs on a fresh copy of the database:
+
+    upload     POST /admin_reconcile through the test client (parsing,
+               matching and the one commit), rows/sec
+    memory     reconcile.reconcile() alone under tracemalloc: peak Python
+               memory, one chunk plus the set of ids seen so far; the
+               statement itself is never held
+    one by one for comparison, GET /confirm_payment for --single orders,
+               scaled to the number of rows the upload confirmed
+
+    python benchmarks/bench_reconcile.py --students 20000 --rows 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import dataset
+
+ROOT = dataset.ROOT
+
+
+def write_statement(path, pending, rows, rng):
+    """CSV with ``rows`` rows; returns how many should be confirmed."""
+    payable = rng.sample(pending, min(len(pending), rows // 2))
+    matching = 0
+    with open(path, "w", newline="") as f:
+        f.write("Account Statement,,,\nPeriod,2026-10-01 to 2026-10-31,,\n")
+        f.write("Date,Narration,UTR No.,Credit Amount\n")
+        for i in range(rows):
+            if i < len(payable):
+                txn, price = payable[i]
+                if i % 50 == 49:
+                    price += 1  # wrong amount
+                else:
+                    matching += 1
+            elif i % 20 == 0 and payable:
+                txn, price = payable[i % len(payable)]  # duplicate
+            else:
+                txn, price = f"UNKNOWN{i:09d}", 100
+            f.write(f"2026-10-{i % 28 + 1:02d},UPI/{i},{txn},{price}.00\n")
+    return matching
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000], help="statement sizes")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--single", type=int, default=200, help="orders confirmed one request at a time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_db, uploads = os.path.join(tmp, "base.db"), os.path.join(tmp, "uploads")
+        start = time.perf_counter()
+        ctx = dataset.generate(base_db, uploads, projects=args.projects, students=args.students,
+                               requests=args.students // 10, messages=0, hot_messages=0, photos_per_project=0,
+                               videos_per_project=0, archive_kb=1, seed=args.seed)
+        con = sqlite3.connect(base_db)
+        pending = con.execute("""
+            SELECT orders.transaction_id, projects.price FROM orders JOIN projects ON projects.id = orders.project_id
+            WHERE orders.status = 'Pending'
+            UNION ALL
+            SELECT transaction_id, price FROM project_requests WHERE status = 'Pending'""").fetchall()
+        con.close()
+        print(f"dataset: {ctx['orders']} orders, {len(pending)} pending payments "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        db_path = os.path.join(tmp, "bench.db")
+        os.environ.update(DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import db
+        import reconcile
+
+        app = app_module.app
+        pool = app.extensions["sqlite_pool"]
+        failures = 0
+
+        def fresh_copy():
+            pool.close_all()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            shutil.copy(base_db, db_path)
+
+        for rows in args.rows:
+            statement = os.path.join(tmp, f"statement_{rows}.csv")
+            expected = write_statement(statement, pending, rows, random.Random(args.seed))
+
+            fresh_copy()
+            client = app.test_client()
+            client.post("/admin_login", data=dict(zip(("username", "password"), ctx["admin"]))).close()
+            with open(statement, "rb") as f:
+                start = time.perf_counter()
+                response = client.post("/admin_reconcile", data={"statement": (f, "statement.csv", "text/csv")},
+                                       headers={"Accept": "application/json"})
+                elapsed = time.perf_counter() - start
+            report = response.get_json()
+            response.close()
+            confirmed = report["confirmed_orders"] + report["confirmed_requests"]
+            if confirmed != expected:
+                failures += 1
+                print(f"FAIL: expected {expected} confirmations, got {confirmed}")
+
+            fresh_copy()
+            con = db.connect(db_path)
+            with open(statement, encoding="utf-8-sig", newline="") as f:
+                tracemalloc.start()
+                reconcile.reconcile(con, f)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            con.rollback()
+            con.close()
+
+            counts = ", ".join(f"{k} {v}" for k, v in report["counts"].items())
+            print(f"{rows:>8} rows  {elapsed * 1000:8.1f} ms  {rows / elapsed:9.0f} rows/s  "
+                  f"peak {peak / 1024 / 1024:6.1f} MB   {counts}")
+
+        # Baseline: what the same confirmations cost through the single-row route
+        fresh_copy()
+        con = sqlite3.connect(db_path)
+        order_ids = [r[0] for r in con.execute("SELECT id FROM orders WHERE status = 'Pending' LIMIT ?",
+                                               (args.single,))]
+        con.close()
+        client = app.test_client()
+        client.post("/admin_login", data=dict(zip(("username", "password"), ctx["admin"]))).close()
+        start = time.perf_counter()
+        for order_id in order_ids:
+            client.get(f"/confirm_payment/{order_id}").close()
+        per_order = (time.perf_counter() - start) / max(len(order_ids), 1)
+        print(f"one by one: {per_order * 1000:.2f} ms per confirm_payment request "
+              f"(x {expected} = {per_order * expected * 1000:.0f} ms for the last statement, "
+              f"before any checking by hand)")
+        pool.close_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
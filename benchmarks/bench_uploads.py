@@ -0,0 +1,100 @@
+"""Peak memory and time for a large video upload, and early rejection of oversize parts.
+
+Runs add_project with a single large video through the WSGI app twice: once
+with Werkzeug's stock request class (spool to a temp file, then copy in
+FileStorage.save) and once with uploads.UploadRequest (stream into
+UPLOAD_FOLDER, rename on save). Peak Python memory is measured with
+tracemalloc around the request only, after the request body has been built.
+
+    python benchmarks/bench_uploads.py --size-mb 50
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from flask import Request
+from flask.testing import EnvironBuilder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CountingStream(io.RawIOBase):
+    """Request body that records how many bytes the app actually read."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.consumed = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.consumed += len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def build_environ(app, size):
+    video = tempfile.TemporaryFile()
+    chunk = os.urandom(1024 * 1024)
+    for _ in range(size // len(chunk)):
+        video.write(chunk)
+    video.seek(0)
+    builder = EnvironBuilder(app, path="/add_project", method="POST", data={
+        "title": "bench", "price": "1", "videos": (video, "demo.mp4", "video/mp4"),
+    })
+    environ = builder.get_environ()
+    body = CountingStream(environ["wsgi.input"])
+    environ["wsgi.input"] = io.BufferedReader(body)
+    return environ, body
+
+
+def run_once(app, size):
+    environ, body = build_environ(app, size)
+    statuses = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    b"".join(app(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statuses[0], elapsed, peak, body.consumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=50)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app_data.db")
+        subprocess.run([sys.executable, os.path.join(ROOT, "migrations.py"), path],
+                       check=True, stdout=subprocess.DEVNULL)
+        os.environ["DATABASE_PATH"] = path
+        os.environ["UPLOAD_FOLDER"] = os.path.join(tmp, "uploads")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        app = app_module.app
+        streaming_request = app.request_class
+
+        for label, request_class in (("stock", Request), ("streaming", streaming_request)):
+            app.request_class = request_class
+            status, elapsed, peak, consumed = run_once(app, size)
+            print(f"{label:>9}: {status:<20} {elapsed * 1000:8.1f} ms  peak {peak / 1024:8.1f} KiB")
+
+        # Oversize part: how much of the body is read before the 413
+        app.request_class = streaming_request
+        app.config["UPLOAD_LIMITS"]["video"] = 5 * 1024 * 1024
+        status, elapsed, peak, consumed = run_once(app, size)
+        print(f" oversize: {status:<20} {elapsed * 1000:8.1f} ms  read {consumed / 1024 / 1024:.1f} of {args.size_mb} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Check the download offload headers without a real nginx or Apache.
+
+Runs download() (download_request() shares its send_download()) through
+the WSGI app in each DOWNLOAD_OFFLOAD mode behind ProxyEmulator, a small
+middleware that does what the front proxy would: when the app answers
+with X-Accel-Redirect or X-Sendfile it replaces the empty body with the
+named file (only from the internal location or the upload folder, like
+the real configuration).
+Checks that the app sends the right header and no body, that the
+student still receives the file, and that a student without a confirmed
+order gets 403 and no offload header. Offloading only protects the
+archive if it is not public anyway, so it also checks that its
+/static/uploads/... URL is refused, to the buyer as well as to a stranger.
+
+    python benchmarks/check_offload.py
+"""
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import unquote
+
+from werkzeug.test import Client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProxyEmulator:
+    def __init__(self, app, upload_folder, internal_prefix):
+        self.app = app
+        self.upload_folder = os.path.realpath(upload_folder)
+        self.internal_prefix = internal_prefix
+        self.last_upstream = None
+
+    def resolve(self, headers):
+        if "X-Accel-Redirect" in headers:
+            url = headers["X-Accel-Redirect"]
+            assert url.startswith(self.internal_prefix), url
+            return os.path.join(self.upload_folder, unquote(url[len(self.internal_prefix):]))
+        if "X-Sendfile" in headers:
+            return headers["X-Sendfile"]
+        return None
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured["status"], captured["headers"] = status, headers
+
+        body = b"".join(self.app(environ, capture))
+        headers = dict(captured["headers"])
+        self.last_upstream = (captured["status"], headers, body)
+        path = self.resolve(headers)
+        if path is None:
+            start_response(captured["status"], captured["headers"])
+            return [body]
+
+        path = os.path.realpath(path)
+        assert path.startswith(self.upload_folder + os.sep), path
+        with open(path, "rb") as f:
+            data = f.read()
+        passed = [(k, v) for k, v in captured["headers"]
+                  if k not in ("X-Accel-Redirect", "X-Sendfile", "Content-Length")]
+        start_response("200 OK", passed + [("Content-Length", str(len(data)))])
+        return [data]
+
+
+def login(client, username, password):
+    client.post("/register", data={"username": username, "password": password})
+    client.post("/student_login", data={"username": username, "password": password})
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app_data.db")
+        subprocess.run([sys.executable, os.path.join(ROOT, "migrations.py"), path],
+                       check=True, stdout=subprocess.DEVNULL)
+        os.environ["DATABASE_PATH"] = path
+        os.environ["UPLOAD_FOLDER"] = os.path.join(tmp, "uploads")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        app = app_module.app
+
+        archive = os.urandom(2 * 1024 * 1024)
+        admin = app.test_client()
+        admin.post("/admin_login", data={"username": "Rakesh", "password": "Rakesh205@"})
+        admin.post("/add_project", data={"title": "offload", "price": "1", "technologies": "x",
+                                         "project_file": (io.BytesIO(archive), "final project.zip")},
+                   content_type="multipart/form-data")
+
+        proxy = ProxyEmulator(app, app.config["UPLOAD_FOLDER"], app.config["DOWNLOAD_OFFLOAD_PREFIX"])
+        student = Client(proxy)
+        login(student, "buyer", "pw")
+        student.post("/submit_payment/1", data={"transaction_id": "TX-OFFLOAD"})
+        admin.get("/confirm_payment/1")
+        stranger = Client(proxy)
+        login(stranger, "stranger", "pw")
+
+        con = sqlite3.connect(path)
+        static_url = "/static/" + con.execute("SELECT project_file FROM projects WHERE id = 1").fetchone()[0]
+        con.close()
+
+        failures = 0
+        for mode in ("", "x-accel-redirect", "x-sendfile"):
+            app.config["DOWNLOAD_OFFLOAD"] = mode
+            start = time.perf_counter()
+            response = student.get("/download/1")
+            elapsed = time.perf_counter() - start
+            status, upstream_headers, upstream_body = proxy.last_upstream
+            checks = {
+                "student gets the file": response.status_code == 200 and response.data == archive,
+                "original file name": "final_project.zip" in response.headers.get("Content-Disposition", ""),
+                "private caching": "private" in upstream_headers.get("Cache-Control", ""),
+            }
+            if mode == "x-accel-redirect":
+                checks["X-Accel-Redirect set"] = upstream_headers.get("X-Accel-Redirect", "").startswith(
+                    app.config["DOWNLOAD_OFFLOAD_PREFIX"] + "blobs/")
+                checks["app sent no body"] = upstream_body == b""
+            elif mode == "x-sendfile":
+                checks["X-Sendfile set"] = os.path.isfile(upstream_headers.get("X-Sendfile", ""))
+                checks["app sent no body"] = upstream_body == b""
+            else:
+                checks["no offload header"] = not {"X-Accel-Redirect", "X-Sendfile"} & set(upstream_headers)
+                checks["app streamed the file"] = len(upstream_body) == len(archive)
+
+            denied = stranger.get("/download/1")
+            _, denied_headers, _ = proxy.last_upstream
+            checks["not entitled: 403"] = denied.status_code == 403
+            checks["not entitled: no offload header"] = not {"X-Accel-Redirect", "X-Sendfile"} & set(denied_headers)
+
+            for who, client in (("buyer", student), ("stranger", stranger), ("anonymous", Client(proxy))):
+                checks[f"/static URL refused ({who})"] = client.get(static_url).status_code in (403, 404)
+
+            print(f"{mode or 'direct':>17}: {elapsed * 1000:7.1f} ms round trip")
+            for name, ok in checks.items():
+                failures += not ok
+                print(f"{'ok' if ok else 'FAIL':>21}  {name}")
+
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Check the views that declare a query budget against a large data set.
+
+Builds a synthetic dataset (see dataset.py) with --requests project
+requests, a third of them with photos and a quarter with videos, turns
+ENFORCE_QUERY_BUDGETS on and fetches every budgeted view through the test
+client. A view that runs more statements than its @db.query_budget
+raises QueryBudgetExceeded, so an N+1 query fails here however fast the
+page still is. It also lowers each budget by one and checks that the view
+is then refused, so the check cannot pass by not being enforced.
+
+    python benchmarks/check_query_budgets.py --requests 2000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+import dataset
+
+ROOT = dataset.ROOT
+
+# endpoint -> (role, url); every view with @db.query_budget must be listed
+BUDGETED = {
+    "admin_requests": ("admin", "/admin_requests"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="custom project requests")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, uploads = os.path.join(tmp, "app_data.db"), os.path.join(tmp, "uploads")
+        ctx = dataset.generate(db_path, uploads, projects=20, students=100, requests=args.requests, messages=0,
+                               hot_messages=0, photos_per_project=1, videos_per_project=1, archive_kb=1,
+                               seed=args.seed)
+        os.environ.update(DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0",
+                          ENFORCE_QUERY_BUDGETS="1")
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import db
+        from flask import g
+
+        app = app_module.app
+        # Raise QueryBudgetExceeded to the caller instead of answering 500
+        app.config["PROPAGATE_EXCEPTIONS"] = True
+        failures = 0
+
+        def check(name, ok, detail=""):
+            nonlocal failures
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':>6}  {name}{f'  ({detail})' if detail else ''}")
+
+        budgeted = sorted(endpoint for endpoint, view in app.view_functions.items() if hasattr(view, "query_budget"))
+        check("every budgeted view is checked", budgeted == sorted(BUDGETED), ", ".join(budgeted))
+        check("budgets are enforced", app.config["ENFORCE_QUERY_BUDGETS"] is True)
+
+        for endpoint, (role, url) in BUDGETED.items():
+            view = app.view_functions[endpoint]
+            limit = view.query_budget
+            client = app.test_client()
+            if role == "admin":
+                client.post("/admin_login", data=dict(zip(("username", "password"), ctx["admin"])))
+            with client:
+                response = client.get(url)
+                used = g.query_stats.count
+            page = response.get_data(as_text=True)
+            check(f"{endpoint}: 200 within budget", response.status_code == 200 and used <= limit,
+                  f"{used} of {limit} queries, {ctx['requests']} requests")
+            if endpoint == "admin_requests":
+                check(f"{endpoint}: every request listed", page.count('class="request-card"') == ctx["requests"])
+                check(f"{endpoint}: photos and videos shown",
+                      len(re.findall(r'<img [^>]*alt="Photo"', page)) == ctx["requests"] // 3
+                      and page.count("<video ") == ctx["requests"] // 4)
+
+            view.query_budget = used - 1
+            try:
+                client.get(url)
+                refused = False
+            except db.QueryBudgetExceeded:
+                refused = True
+            finally:
+                view.query_budget = limit
+            check(f"{endpoint}: refused with a budget of {used - 1}", refused)
+
+        app.extensions["sqlite_pool"].close_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Synthetic store data at a chosen scale, for the benchmarks.
+
+generate() builds a migrated database and upload folder with:
+
+* N projects, each with photos (real PNGs, with their WebP variants
+  recorded like the thumbnail worker would), videos and an archive;
+* M students, with orders in every status spread over the projects;
+* project requests in every status, some with photos, videos and a final file;
+* chat histories on every order and request, with a few "hot"
+  conversations that are much longer.
+
+Files are stored through blobstore, so a handful of distinct images and
+archives are shared by all the rows that use them, like identical
+uploads are in production. The same seed always gives the same data.
+
+    python benchmarks/dataset.py out.db --uploads out_uploads --projects 500 --students 2000
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import blobstore  # noqa: E402
+import orders  # noqa: E402
+import thumbnails  # noqa: E402
+
+ORDER_STATUSES = orders.STATUSES
+REQUEST_STATUSES = ("Requested", "Price Set", "Pending", "Paid", "Completed")
+TECHNOLOGIES = ("Python", "Flask", "Django", "React", "Node.js", "Java", "Android", "IoT",
+                "Machine Learning", "PHP", "MySQL", "Arduino")
+STUDENT_PASSWORD = "bench"
+ADMIN = ("Rakesh", "Rakesh205@")
+
+DISTINCT_PHOTOS = 8
+DISTINCT_VIDEOS = 2
+DISTINCT_ARCHIVES = 4
+
+
+def make_png(rng, width=1280, height=800):
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randrange(20, 300), y + rng.randrange(20, 200)),
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def store_bytes(con, upload_folder, data, ext):
+    sha = hashlib.sha256(data).hexdigest()
+    fd, tmp = tempfile.mkstemp(dir=upload_folder)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    path = blobstore.store(con, upload_folder, tmp, sha, len(data), ext)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    return path
+
+
+def generate(path, upload_folder, projects=200, students=500, requests=200, messages=20,
+             hot_messages=2000, photos_per_project=3, videos_per_project=1, archive_kb=512, seed=0):
+    """Build the dataset at ``path`` / ``upload_folder``; returns a manifest
+    describing what the load test can ask for."""
+    rng = random.Random(seed)
+    subprocess.run([sys.executable, os.path.join(ROOT, "migrations.py"), path],
+                   check=True, stdout=subprocess.DEVNULL)
+    os.makedirs(upload_folder, exist_ok=True)
+    con = sqlite3.connect(path)
+
+    photo_paths = []
+    for _ in range(DISTINCT_PHOTOS):
+        photo = store_bytes(con, upload_folder, make_png(rng), ".png")
+        thumbnails.record(con, photo, thumbnails.generate(upload_folder, photo))
+        photo_paths.append(photo)
+    video_paths = [store_bytes(con, upload_folder, rng.randbytes(256 * 1024), ".mp4")
+                   for _ in range(DISTINCT_VIDEOS)]
+    archive_paths = [store_bytes(con, upload_folder, rng.randbytes(archive_kb * 1024), ".zip")
+                     for _ in range(DISTINCT_ARCHIVES)]
+
+    project_rows, photo_rows, video_rows, tech_rows = [], [], [], []
+    for pid in range(1, projects + 1):
+        techs = rng.sample(TECHNOLOGIES, rng.randint(1, 4))
+        project_rows.append((pid, f"Project {pid}: {rng.choice(TECHNOLOGIES)} system", archive_paths[pid % DISTINCT_ARCHIVES],
+                             f"project_{pid}.zip", rng.randrange(199, 4999), "", "",
+                             f"Description of project {pid}. " * 8, "Problem statement. " * 4,
+                             "Objectives. " * 4, "Outcomes. " * 4, ", ".join(techs)))
+        tech_rows += [(pid, t.lower()) for t in techs]
+        photo_rows += [(pid, photo_paths[(pid + i) % DISTINCT_PHOTOS]) for i in range(photos_per_project)]
+        video_rows += [(pid, video_paths[(pid + i) % DISTINCT_VIDEOS]) for i in range(videos_per_project)]
+    con.executemany("INSERT INTO projects(id,title,project_file,project_file_name,price,photo,video,description,"
+                    "problem_statement,objectives,outcomes,technologies) VALUES(?,?,?,?,?,?,?,?,?,?,?,?)", project_rows)
+    con.executemany("INSERT OR IGNORE INTO project_technologies(project_id, technology) VALUES(?,?)", tech_rows)
+    con.executemany("INSERT INTO project_photos(project_id, photo_path) VALUES(?,?)", photo_rows)
+    con.executemany("INSERT INTO project_videos(project_id, video_path) VALUES(?,?)", video_rows)
+
+    usernames = [f"student{i}" for i in range(1, students + 1)]
+    con.executemany("INSERT INTO users(username, password) VALUES(?,?)",
+                    [(u, STUDENT_PASSWORD) for u in usernames])
+
+    # Every student orders a few projects, in every status
+    order_rows = []
+    for username in usernames:
+        for pid in rng.sample(range(1, projects + 1), min(projects, rng.randint(1, 4))):
+            status = rng.choice(ORDER_STATUSES)
+            order_rows.append((pid, username, status, f"TXN-{username}-{pid}"))
+    con.executemany("INSERT INTO orders(project_id, student_username, status, transaction_id) VALUES(?,?,?,?)",
+                    order_rows)
+
+    request_rows, request_photo_rows, request_video_rows = [], [], []
+    for rid in range(1, requests + 1):
+        status = REQUEST_STATUSES[rid % len(REQUEST_STATUSES)]
+        final = archive_paths[rid % DISTINCT_ARCHIVES] if status == "Completed" else None
+        request_rows.append((rid, rng.choice(usernames), f"Request {rid}", "Description. " * 10, "Problem. " * 4,
+                             "Objectives. " * 4, "Outcomes. " * 4, "A working prototype",
+                             rng.randrange(499, 9999) if status != "Requested" else 0, status,
+                             f"RTXN-{rid}" if status in ("Pending", "Paid", "Completed") else None,
+                             final, f"request_{rid}.zip" if final else None))
+        if rid % 3 == 0:
+            request_photo_rows.append((rid, photo_paths[rid % DISTINCT_PHOTOS]))
+        if rid % 4 == 0:
+            request_video_rows.append((rid, video_paths[rid % DISTINCT_VIDEOS]))
+    con.executemany("INSERT INTO project_requests(id, student_username, title, description, problem_statement, "
+                    "objectives, outcomes, output_idea, price, status, transaction_id, final_file, final_file_name) "
+                    "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)", request_rows)
+    con.executemany("INSERT INTO request_photos(request_id, photo_path) VALUES(?,?)", request_photo_rows)
+    con.executemany("INSERT INTO request_videos(request_id, video_path) VALUES(?,?)", request_video_rows)
+
+    # Each stored file is shared by many rows, as identical uploads are
+    counts = " + ".join(f"(SELECT COUNT(*) FROM {table} WHERE {column} = blobs.path)"
+                        for table, column in blobstore.REFERENCES.items())
+    con.execute(f"UPDATE blobs SET refcount = {counts}")
+
+    def chat(kind, conversation_id, owner, count):
+        return [(conversation_id, owner if i % 2 else "Admin", f"Message {i} in {kind} {conversation_id}. " * 3)
+                for i in range(count)]
+
+    hot_order, hot_request = 1, 1
+    order_messages, request_messages = [], []
+    for oid, (_, username, _, _) in enumerate(order_rows, start=1):
+        order_messages += chat("order", oid, username, hot_messages if oid == hot_order else messages)
+    for rid, row in enumerate(request_rows, start=1):
+        request_messages += chat("request", rid, row[1], hot_messages if rid == hot_request else messages)
+    con.executemany("INSERT INTO order_messages(order_id, sender, message) VALUES(?,?,?)", order_messages)
+    con.executemany("INSERT INTO request_messages(request_id, sender, message) VALUES(?,?,?)", request_messages)
+
+    con.execute("UPDATE cache_generations SET generation = generation + 1 WHERE name='catalog'")
+    con.commit()
+    con.execute("ANALYZE")
+    con.close()
+
+    confirmed = [(username, pid) for pid, username, status, _ in order_rows if status == orders.CONFIRMED]
+    return {
+        "projects": projects,
+        "students": usernames,
+        "password": STUDENT_PASSWORD,
+        "admin": ADMIN,
+        "confirmed": confirmed,
+        "hot_order": hot_order,
+        "hot_order_student": order_rows[hot_order - 1][1],
+        "hot_request": hot_request,
+        "orders": len(order_rows),
+        "requests": requests,
+        "order_messages": len(order_messages),
+        "request_messages": len(request_messages),
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--project-requests", type=int, default=200, help="custom project requests")
+    parser.add_argument("--messages", type=int, default=20, help="chat messages per order and request")
+    parser.add_argument("--hot-messages", type=int, default=2000, help="messages in the long conversations")
+    parser.add_argument("--photos", type=int, default=3, help="photos per project")
+    parser.add_argument("--videos", type=int, default=1, help="videos per project")
+    parser.add_argument("--archive-kb", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def scale(args):
+    return {"projects": args.projects, "students": args.students, "requests": args.project_requests,
+            "messages": args.messages, "hot_messages": args.hot_messages, "photos_per_project": args.photos,
+            "videos_per_project": args.videos, "archive_kb": args.archive_kb, "seed": args.seed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument("--uploads", required=True, help="upload folder to fill")
+    add_arguments(parser)
+    args = parser.parse_args()
+    manifest = generate(args.database, args.uploads, **scale(args))
+    print(json.dumps({k: v for k, v in manifest.items() if k not in ("students", "confirmed")}, indent=2))
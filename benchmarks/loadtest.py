@@ -0,0 +1,646 @@
+"""Latency percentiles and throughput for the store's main routes.
+
+Builds a synthetic dataset (see dataset.py), then drives each scenario
+with --concurrency threads, each logged in as its own student or as the
+admin, for --requests operations in total:
+
+    home_anonymous, home_student      the catalog page
+    admin_orders, admin_requests      the admin tables
+    get_messages, get_order_messages  latest page of a long chat, or another chat
+    download                          a confirmed student's full archive
+    add_project, request_project      multipart uploads with a photo (and an archive)
+    resumable_upload                  create, PUT, finalize, then add_project by upload id
+
+Targets:
+
+    client    the Flask test client, in process: the app's own cost
+    gunicorn  a real gunicorn (gevent, as in render.yaml; --worker-class
+              gthread for comparison) over HTTP keep-alive
+
+With --open-streams N the gunicorn target first opens N chat streams
+(/stream_messages/<id> as the admin, the way open chat panels do) and
+keeps them reading while the scenarios run, then reports how many were
+accepted and how many were still open at the end. On a thread-per-request
+worker every open stream holds a thread, so the pages behind them stall.
+With the streams still open it then uploads a full-size photo through
+add_project (thumbnails on) while probe connections keep fetching a small
+page, and reports the slowest probe before and during the upload and the
+resize: on the gevent worker anything that blocks the event loop, like
+Pillow or a SQLite write waiting for the lock, freezes every stream and
+request of that worker for as long as it runs.
+
+Each data set and target starts from the same freshly generated copy, so
+runs with the same arguments are comparable. --output saves the results
+(with the git revision and scale) as JSON, and --compare prints the change
+against an earlier file.
+
+    python benchmarks/loadtest.py --target client --requests 400 --output before.json
+    python benchmarks/loadtest.py --target client gunicorn --requests 400 --compare before.json
+    python benchmarks/loadtest.py --target gunicorn --open-streams 300 --scenarios home_student get_messages
+"""
+import argparse
+import hashlib
+import http.client
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import dataset
+
+ROOT = dataset.ROOT
+
+TARGETS = ("client", "gunicorn")
+WORKER_CLASSES = ("gevent", "gthread")
+UPLOAD_PHOTO_KB = 200
+# How long --open-streams waits for every stream to be accepted
+STREAM_CONNECT_SECONDS = 30
+# Upload check: photo size, probe connections (enough to reach every worker),
+# how long to wait for the thumbnails after the upload returns (probing all
+# the while) and the slowest probe that still counts as responsive
+STALL_PHOTO = (4000, 3000)
+PROBE_CONNECTIONS = 4
+PROBE_INTERVAL = 0.02
+THUMBNAIL_WAIT_SECONDS = 30
+STALL_LIMIT_MS = 200
+
+
+# ---------------- REQUESTS ----------------
+def multipart(fields, files=()):
+    """(body, content type) for a form with ``files`` as (field, filename, bytes)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def form(fields):
+    return urlencode(fields).encode(), "application/x-www-form-urlencoded"
+
+
+class ClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        response = self.client.open(path, method=method, data=body, headers=headers)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+    def close(self):
+        pass
+
+
+class HTTPSession:
+    """One keep-alive connection with its own session cookie."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.connection = http.client.HTTPConnection(host, port, timeout=120)
+        self.cookie = None
+
+    def send(self, method, path, body, headers):
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status, data
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        try:
+            return self.send(method, path, body, headers)
+        except (http.client.HTTPException, ConnectionError):
+            # The server may close an idle keep-alive connection; retry once on a new one
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            return self.send(method, path, body, headers)
+
+    def close(self):
+        self.connection.close()
+
+
+class OpenStreams:
+    """``count`` chat streams held open against a running server, each read
+    by its own client thread until close()."""
+
+    def __init__(self, host, port, ctx, count):
+        self.host, self.port = host, port
+        self.ctx = ctx
+        self.count = count
+        self.lock = threading.Lock()
+        self.connections = []
+        self.accepted = 0
+        self.ended = 0
+        self.closing = False
+        self.threads = []
+
+    def open(self):
+        admin = HTTPSession(self.host, self.port)
+        login(admin, self.ctx, "admin", 0)
+        admin.close()
+        for i in range(self.count):
+            request_id = i % self.ctx["requests"] + 1
+            t = threading.Thread(target=self.hold, args=(admin.cookie, request_id), daemon=True)
+            t.start()
+            self.threads.append(t)
+        deadline = time.monotonic() + STREAM_CONNECT_SECONDS
+        while self.accepted < self.count and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self.accepted
+
+    def hold(self, cookie, request_id):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=STREAM_CONNECT_SECONDS)
+        with self.lock:
+            self.connections.append(connection)
+        try:
+            connection.request("GET", f"/stream_messages/{request_id}", headers={"Cookie": cookie})
+            response = connection.getresponse()
+            # The first frame is the retry hint; history and heartbeats follow
+            if response.status != 200 or not response.readline():
+                return
+            with self.lock:
+                self.accepted += 1
+            connection.sock.settimeout(None)
+            while response.readline():
+                pass
+        except (OSError, ValueError, http.client.HTTPException):
+            pass  # close() shuts the socket down mid-chunk
+        finally:
+            connection.close()
+            with self.lock:
+                self.ended += not self.closing
+
+    def still_open(self):
+        with self.lock:
+            return self.accepted - self.ended
+
+    def close(self):
+        with self.lock:
+            self.closing = True
+            connections = list(self.connections)
+        for connection in connections:
+            sock = connection.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        for t in self.threads:
+            t.join(5)
+
+
+class Probes:
+    """Connections fetching a small page in a loop; records (start, seconds)."""
+
+    def __init__(self, host, port, count):
+        self.host, self.port = host, port
+        self.count = count
+        self.samples = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for _ in range(self.count):
+            t = threading.Thread(target=self.run, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def run(self):
+        session = HTTPSession(self.host, self.port)
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                session.request("GET", "/api/projects?limit=1")
+                with self.lock:
+                    self.samples.append((start, time.perf_counter() - start))
+                self.stopped.wait(PROBE_INTERVAL)
+        finally:
+            session.close()
+
+    def slowest(self, since, until=math.inf):
+        with self.lock:
+            return max((seconds for start, seconds in self.samples if since <= start < until), default=0.0)
+
+    def stop(self):
+        self.stopped.set()
+        for t in self.threads:
+            t.join(STREAM_CONNECT_SECONDS)
+
+
+def upload_while_streaming(host, port, ctx, db_path, seed):
+    """Upload a STALL_PHOTO-sized photo while Probes run; see the module docstring."""
+    photo = dataset.make_png(random.Random(seed), *STALL_PHOTO)
+    title = f"Upload check {uuid.uuid4().hex}"
+    probes = Probes(host, port, PROBE_CONNECTIONS)
+    probes.start()
+    try:
+        time.sleep(1)
+        start = time.perf_counter()
+        admin = HTTPSession(host, port)
+        login(admin, ctx, "admin", 0)
+        status, _ = admin.request("POST", "/add_project", *multipart(
+            {"title": title, "price": "999", "technologies": "Python", "description": "d"},
+            [("photos", "photo.png", photo), ("project_file", "project.zip", b"zip")]))
+        admin.close()
+        uploaded = time.perf_counter()
+        # The resize runs after the response, behind whatever else is queued
+        con = sqlite3.connect(db_path)
+        deadline = uploaded + THUMBNAIL_WAIT_SECONDS
+        while True:
+            variants = con.execute(
+                "SELECT count(*) FROM image_variants WHERE source IN (SELECT photo_path FROM project_photos "
+                "WHERE project_id IN (SELECT id FROM projects WHERE title=?))", (title,)).fetchone()[0]
+            if variants or time.perf_counter() > deadline:
+                break
+            time.sleep(0.1)
+        con.close()
+        # Probe a little longer so the last resize step is covered too
+        time.sleep(0.5)
+    finally:
+        probes.stop()
+    return {
+        "status": status,
+        "upload_ms": round((uploaded - start) * 1000, 2),
+        "variants": variants,
+        "probes": len(probes.samples),
+        "before_max_ms": round(probes.slowest(0, start) * 1000, 2),
+        "during_max_ms": round(probes.slowest(start) * 1000, 2),
+    }
+
+
+# ---------------- SCENARIOS ----------------
+def login(session, ctx, role, index):
+    if role == "admin":
+        session.request("POST", "/admin_login", *form(dict(zip(("username", "password"), ctx["admin"]))))
+    elif role == "student":
+        students = ctx["students"]
+        session.request("POST", "/student_login",
+                        *form({"username": students[index % len(students)], "password": ctx["password"]}))
+    elif role == "confirmed":
+        confirmed = ctx["confirmed"]
+        session.request("POST", "/student_login",
+                        *form({"username": confirmed[index % len(confirmed)][0], "password": ctx["password"]}))
+
+
+def home(session, ctx, rng, index):
+    return session.request("GET", "/")[0]
+
+
+def admin_orders(session, ctx, rng, index):
+    return session.request("GET", "/admin_orders")[0]
+
+
+def admin_requests(session, ctx, rng, index):
+    return session.request("GET", "/admin_requests")[0]
+
+
+def get_messages(session, ctx, rng, index):
+    # Mostly the long conversation, sometimes another one
+    request_id = ctx["hot_request"] if rng.random() < 0.75 else rng.randint(1, ctx["requests"])
+    return session.request("GET", f"/get_messages/{request_id}")[0]
+
+
+def get_order_messages(session, ctx, rng, index):
+    order_id = ctx["hot_order"] if rng.random() < 0.75 else rng.randint(1, ctx["orders"])
+    return session.request("GET", f"/get_order_messages/{order_id}")[0]
+
+
+def download(session, ctx, rng, index):
+    confirmed = ctx["confirmed"]
+    status, data = session.request("GET", f"/download/{confirmed[index % len(confirmed)][1]}")
+    if status == 200 and len(data) != ctx["archive_kb"] * 1024:
+        return 599
+    return status
+
+
+def add_project(session, ctx, rng, index):
+    body, content_type = multipart(
+        {"title": f"Bench project {rng.random()}", "price": "999", "technologies": "Python, Flask",
+         "description": "Uploaded by the load test"},
+        [("photos", "photo.png", rng.randbytes(UPLOAD_PHOTO_KB * 1024)),
+         ("project_file", "project.zip", rng.randbytes(ctx["archive_kb"] * 1024))])
+    return session.request("POST", "/add_project", body, content_type)[0]
+
+
+def request_project(session, ctx, rng, index):
+    body, content_type = multipart(
+        {"title": "Bench request", "description": "d", "problem_statement": "p", "objectives": "o",
+         "outcomes": "o", "output_idea": "i"},
+        [("photos", "photo.png", rng.randbytes(UPLOAD_PHOTO_KB * 1024))])
+    return session.request("POST", "/request_project", body, content_type)[0]
+
+
+def resumable_upload(session, ctx, rng, index):
+    data = rng.randbytes(ctx["archive_kb"] * 1024)
+    sha = hashlib.sha256(data).hexdigest()
+    status, body = session.request("POST", "/api/uploads",
+                                   json.dumps({"filename": "project.zip", "size": len(data), "sha256": sha}).encode(),
+                                   "application/json")
+    if status != 201:
+        return status
+    upload_id = json.loads(body)["upload_id"]
+    status, _ = session.request("PUT", f"/api/uploads/{upload_id}", data, "application/octet-stream",
+                                {"Upload-Offset": "0"})
+    if status != 200:
+        return status
+    status, _ = session.request("POST", f"/api/uploads/{upload_id}/finalize",
+                                json.dumps({"sha256": sha}).encode(), "application/json")
+    if status != 200:
+        return status
+    return session.request("POST", "/add_project", *form(
+        {"title": "Bench resumable", "price": "999", "project_file_upload_id": upload_id}))[0]
+
+
+# name -> (role, operation); uploads last, as they grow the data set
+SCENARIOS = {
+    "home_anonymous": ("anonymous", home),
+    "home_student": ("student", home),
+    "admin_orders": ("admin", admin_orders),
+    "admin_requests": ("admin", admin_requests),
+    "get_messages": ("admin", get_messages),
+    "get_order_messages": ("admin", get_order_messages),
+    "download": ("confirmed", download),
+    "add_project": ("admin", add_project),
+    "request_project": ("student", request_project),
+    "resumable_upload": ("admin", resumable_upload),
+}
+
+
+# ---------------- RUNNER ----------------
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(count / wall, 1) if wall else None,
+        "mean_ms": round(sum(latencies) / count * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def run_scenario(new_session, ctx, name, total, concurrency, warmup, seed):
+    role, operation = SCENARIOS[name]
+    per_thread = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+    latencies, errors = [], []
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        session = new_session()
+        try:
+            login(session, ctx, role, index)
+            for _ in range(warmup):
+                operation(session, ctx, rng, index)
+            ready.wait()
+            mine, failed = [], 0
+            for _ in range(per_thread[index]):
+                start = time.perf_counter()
+                status = operation(session, ctx, rng, index)
+                mine.append(time.perf_counter() - start)
+                failed += status >= 400
+            latencies.extend(mine)
+            errors.append(failed)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return summarize(latencies, sum(errors), time.perf_counter() - start)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env, args, log_path):
+    port = free_port()
+    log = open(log_path, "w")
+    if args.worker_class == "gevent":
+        concurrency = ["--worker-connections", str(args.worker_connections)]
+    else:
+        concurrency = ["--threads", str(args.threads)]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--worker-class", args.worker_class, *concurrency,
+         "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    with open(log_path) as f:
+        raise RuntimeError(f"gunicorn did not start:\n{f.read()}")
+
+
+def prepare(base_db, base_uploads, tmp, target):
+    """Fresh copy of the generated data set for one target; returns the app environment."""
+    db_path = os.path.join(tmp, f"{target}.db")
+    uploads = os.path.join(tmp, f"{target}_uploads")
+    shutil.copy(base_db, db_path)
+    shutil.copytree(base_uploads, uploads)
+    # A view over its query budget answers 500 and counts as an error
+    return dict(os.environ, DATABASE_PATH=db_path, UPLOAD_FOLDER=uploads, THUMBNAIL_WORKERS="0",
+                ENFORCE_QUERY_BUDGETS="1")
+
+
+def run_target(target, env, ctx, args, tmp):
+    results = {}
+    if target == "client":
+        os.environ.update(env)
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        app = app_module.app
+        app.config["PROPAGATE_EXCEPTIONS"] = False
+        for name in args.scenarios:
+            results[name] = run_scenario(lambda: ClientSession(app), ctx, name, args.requests,
+                                         args.concurrency, args.warmup, args.seed)
+            report_line(target, name, results[name])
+        app.extensions["sqlite_pool"].close_all()
+        return results
+
+    for module in ("gunicorn", args.worker_class if args.worker_class == "gevent" else None):
+        if module and importlib.util.find_spec(module) is None:
+            print(f"gunicorn: skipped, {module} is not installed")
+            return {"skipped": f"{module} is not installed"}
+    if args.open_streams:
+        # The upload check needs the thumbnail workers render.yaml runs with
+        env = dict(env, THUMBNAIL_WORKERS=os.environ.get("THUMBNAIL_WORKERS", "2"))
+    process, port = start_gunicorn(env, args, os.path.join(tmp, "gunicorn.log"))
+    streams = None
+    try:
+        if args.open_streams:
+            streams = OpenStreams("127.0.0.1", port, ctx, args.open_streams)
+            accepted = streams.open()
+            print(f"{target:>8} {accepted}/{args.open_streams} chat streams open")
+        for name in args.scenarios:
+            results[name] = run_scenario(lambda: HTTPSession("127.0.0.1", port), ctx, name, args.requests,
+                                         args.concurrency, args.warmup, args.seed)
+            report_line(target, name, results[name])
+        if streams:
+            if importlib.util.find_spec("PIL") is None:
+                print(f"{target:>8} upload check skipped, Pillow is not installed")
+            else:
+                check = upload_while_streaming("127.0.0.1", port, ctx, env["DATABASE_PATH"], args.seed)
+                check["stalled"] = check["during_max_ms"] > STALL_LIMIT_MS
+                results["upload_while_streaming"] = check
+                print(f"{target:>8} upload while streaming: {check['status']} in {check['upload_ms']:.0f} ms, "
+                      f"{check['variants']} variants; slowest of {check['probes']} probes "
+                      f"{check['before_max_ms']:.1f} ms before, {check['during_max_ms']:.1f} ms during"
+                      f"{'  STALLED' if check['stalled'] else ''}")
+            results["open_streams"] = {"requested": args.open_streams, "accepted": streams.accepted,
+                                       "still_open": streams.still_open()}
+            print(f"{target:>8} {streams.still_open()}/{args.open_streams} chat streams still open at the end")
+    finally:
+        if streams:
+            streams.close()
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return results
+
+
+# ---------------- REPORTING ----------------
+def report_line(target, name, r):
+    print(f"{target:>8} {name:<19} {r['requests']:6d} req {r['errors']:4d} err {r['throughput_rps']:8.1f} req/s  "
+          f"p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("scale") != results["meta"].get("scale"):
+        print("note: the baseline was run at a different scale")
+    print(f"\nchange against {baseline_path} ({baseline['meta'].get('revision') or 'unknown revision'}):")
+    for target, scenarios in results["results"].items():
+        for name, r in scenarios.items():
+            before = baseline["results"].get(target, {}).get(name)
+            if name not in SCENARIOS or not isinstance(r, dict) or not isinstance(before, dict):
+                continue
+
+            def change(key):
+                return f"{(r[key] - before[key]) / before[key] * 100:+6.1f}%" if before[key] else "   n/a"
+            print(f"{target:>8} {name:<19} req/s {change('throughput_rps')}  p50 {change('p50_ms')}  "
+                  f"p95 {change('p95_ms')}  p99 {change('p99_ms')}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", nargs="+", choices=TARGETS, default=["client"])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=400, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured operations per thread")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--worker-class", choices=WORKER_CLASSES, default="gevent", help="gunicorn worker class")
+    parser.add_argument("--worker-connections", type=int, default=1000, help="connections per gevent worker")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--open-streams", type=int, default=0, help="chat streams held open during the run")
+    parser.add_argument("--output", help="write the results here as JSON")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    dataset.add_arguments(parser)
+    args = parser.parse_args()
+    # Keep the given order of scenarios but always run uploads after the reads
+    args.scenarios = [name for name in SCENARIOS if name in args.scenarios]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_db, base_uploads = os.path.join(tmp, "base.db"), os.path.join(tmp, "base_uploads")
+        start = time.perf_counter()
+        ctx = dataset.generate(base_db, base_uploads, **dataset.scale(args))
+        ctx["archive_kb"] = args.archive_kb
+        print(f"dataset: {args.projects} projects, {args.students} students, {ctx['orders']} orders, "
+              f"{args.project_requests} project requests, {ctx['order_messages'] + ctx['request_messages']} messages "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        results = {
+            "meta": {
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "scale": dataset.scale(args),
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "gunicorn": {"workers": args.workers, "worker_class": args.worker_class,
+                             "worker_connections": args.worker_connections, "threads": args.threads},
+                "open_streams": args.open_streams,
+            },
+            "results": {},
+        }
+        for target in args.target:
+            env = prepare(base_db, base_uploads, tmp, target)
+            results["results"][target] = run_target(target, env, ctx, args, tmp)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
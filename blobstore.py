@@ -0,0 +1,225 @@
+"""Content-addressed storage for uploaded media and archives.
+
+Every uploaded file is stored once, by SHA-256, at
+UPLOAD_FOLDER/blobs/<aa>/<bb>/<sha256><ext>, and the database keeps the
+same "uploads/..." style path it always has, so templates and downloads
+work unchanged. The blobs table counts how many rows point at each blob:
+uploading a file that is already stored only bumps the count (the spooled
+copy is dropped and nothing new is written), and a blob is deleted from
+disk when its last reference goes away.
+
+Columns that hold blob paths: project_photos.photo_path,
+project_videos.video_path, request_photos.photo_path,
+request_videos.video_path, projects.project_file and
+project_requests.final_file.
+
+Run this file to move files uploaded before the blob store into it:
+
+    python blobstore.py [path/to/app_data.db] [path/to/uploads]
+"""
+import hashlib
+import os
+import sys
+
+import uploads
+
+PREFIX = "uploads/"
+BLOB_DIR = "blobs"
+
+# table -> path column, for every place that references a blob
+REFERENCES = {
+    "project_photos": "photo_path",
+    "project_videos": "video_path",
+    "request_photos": "photo_path",
+    "request_videos": "video_path",
+    "projects": "project_file",
+    "project_requests": "final_file",
+}
+
+# Download-name columns for the files students download
+ORIGINAL_NAMES = {
+    "projects": "project_file_name",
+    "project_requests": "final_file_name",
+}
+
+# The photos and videos shown on the site; the rest are paid archives, which
+# only download() and download_request() may send
+MEDIA = {table: column for table, column in REFERENCES.items() if table not in ORIGINAL_NAMES}
+
+
+def blob_path(sha256, ext):
+    """Database path for a blob, relative to the static folder."""
+    return f"{PREFIX}{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+
+def fs_path(upload_folder, db_path):
+    return os.path.join(upload_folder, *db_path[len(PREFIX):].split("/"))
+
+
+def is_blob(db_path):
+    return bool(db_path) and db_path.startswith(f"{PREFIX}{BLOB_DIR}/")
+
+
+def is_media(con, db_path):
+    """Whether a photo or video row points at ``db_path`` (indexed, migration 11)."""
+    sql = " UNION ALL ".join(f"SELECT 1 FROM {table} WHERE {column}=?" for table, column in MEDIA.items())
+    return con.execute(f"{sql} LIMIT 1", (db_path,) * len(MEDIA)).fetchone() is not None
+
+
+def lookup(con, sha256):
+    row = con.execute("SELECT path FROM blobs WHERE sha256=?", (sha256,)).fetchone()
+    return row[0] if row else None
+
+
+class MissingBlob(LookupError):
+    """store() was given no file for content that is not (or no longer) stored."""
+
+
+def store(con, upload_folder, src, sha256, size, ext):
+    """Take a reference on the blob for ``sha256``, moving ``src`` into place if it is new.
+
+    ``src`` may be None when the caller only has the checksum of content it
+    believes is stored; the blob must then still exist in this transaction,
+    else MissingBlob is raised. Returns the database path. If the content was
+    already stored, ``src`` is left for the caller to discard.
+    """
+    if src is None:
+        row = con.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256=? RETURNING path",
+                          (sha256,)).fetchone()
+        if row is None:
+            raise MissingBlob(sha256)
+        return row[0]
+
+    path = blob_path(sha256, ext)
+    row = con.execute(
+        "INSERT INTO blobs(sha256, path, size, refcount) VALUES(?,?,?,1) "
+        "ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1 "
+        "RETURNING path, refcount",
+        (sha256, path, size)).fetchone()
+    path, refcount = row[0], row[1]
+    dest = fs_path(upload_folder, path)
+    if refcount == 1 or not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(src, dest)
+    return path
+
+
+def add_ref(con, db_path):
+    if is_blob(db_path):
+        con.execute("UPDATE blobs SET refcount = refcount + 1 WHERE path=?", (db_path,))
+
+
+def release(con, db_paths):
+    """Drop one reference per path; returns the blob paths that are now unused.
+
+    Pass the result to remove_unused() once the transaction has committed.
+    """
+    unused = []
+    for db_path in db_paths:
+        if not is_blob(db_path):
+            continue
+        row = con.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE path=? RETURNING refcount",
+            (db_path,)).fetchone()
+        if row is not None and row[0] <= 0:
+            con.execute("DELETE FROM blobs WHERE path=? AND refcount <= 0", (db_path,))
+            unused.append(db_path)
+    return unused
+
+
+def remove_unused(con, upload_folder, db_paths):
+    """Delete the files of blobs that release() found unused.
+
+    Someone may upload the same content again meanwhile. store() takes its
+    reference and moves the file into place inside a write transaction, so
+    checking for the row and unlinking under the write lock here means that
+    upload has either committed (the row is back and the file stays) or
+    writes its file after this one is gone.
+    """
+    if not db_paths:
+        return
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        for db_path in db_paths:
+            if con.execute("SELECT 1 FROM blobs WHERE path=?", (db_path,)).fetchone():
+                continue
+            try:
+                os.remove(fs_path(upload_folder, db_path))
+            except FileNotFoundError:
+                pass
+    finally:
+        # Nothing was written; this only lets go of the lock
+        con.rollback()
+
+
+def save_upload(con, upload_folder, storage):
+    """Store an uploaded FileStorage; returns its database path."""
+    ext = os.path.splitext(storage.filename or "")[1]
+    stream = storage.stream
+    if isinstance(stream, uploads.SpoolFile):
+        stream.file.close()
+        path = store(con, upload_folder, stream.path, stream.hexdigest, stream.size, ext)
+        stream.committed = not os.path.exists(stream.path)
+        return path
+
+    # Not spooled by UploadRequest: hash it into a temp file first
+    tmp = os.path.join(upload_folder, f".upload-{os.getpid()}-{id(storage)}")
+    size, sha256 = uploads.save(storage, tmp)
+    path = store(con, upload_folder, tmp, sha256, size, ext)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    return path
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def import_legacy(con, upload_folder):
+    """Move files referenced by their original name into the blob store."""
+    moved = 0
+    for table, column in REFERENCES.items():
+        rows = con.execute(
+            f"SELECT rowid, {column} FROM {table} WHERE {column} LIKE ? AND {column} NOT LIKE ?",
+            (PREFIX + "%", f"{PREFIX}{BLOB_DIR}/%")).fetchall()
+        for rowid, old_path in rows:
+            src = fs_path(upload_folder, old_path)
+            if not os.path.exists(src):
+                continue
+            sha256 = file_digest(src)
+            tmp = None
+            if lookup(con, sha256) is None:
+                # Several rows may share one legacy file; copy so later rows still find it
+                tmp = src + ".blob"
+                with open(src, "rb") as f_in, open(tmp, "wb") as f_out:
+                    for chunk in iter(lambda: f_in.read(1024 * 1024), b""):
+                        f_out.write(chunk)
+            new_path = store(con, upload_folder, tmp, sha256, os.path.getsize(src), os.path.splitext(src)[1])
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            con.execute(f"UPDATE {table} SET {column}=? WHERE rowid=?", (new_path, rowid))
+            if table in ORIGINAL_NAMES:
+                con.execute(f"UPDATE {table} SET {ORIGINAL_NAMES[table]}=? WHERE rowid=?",
+                            (os.path.basename(old_path), rowid))
+            moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    import db
+    import migrations
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    db_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "app_data.db")
+    folder = sys.argv[2] if len(sys.argv) > 2 else os.path.join(here, "static", "uploads")
+    migrations.migrate(db_file)
+    con = db.connect(db_file)
+    count = import_legacy(con, folder)
+    con.commit()
+    con.close()
+    print(f"Moved {count} file references into the blob store. "
+          f"The original files in {folder} can be removed once you have checked the site.")
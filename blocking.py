@@ -0,0 +1,29 @@
+"""Blocking work under gunicorn's gevent worker (see render.yaml).
+
+gevent monkey-patches threading, so every thread in a gevent worker is a
+greenlet on the worker's one event loop. Anything that holds on to it
+without yielding, such as Pillow resizing a photo, a SQLite write waiting
+up to busy_timeout for the write lock, or the fsync behind a commit,
+freezes every request and chat stream of that worker until it returns.
+
+call() runs such work on one of gevent's native threads and parks only the
+calling greenlet; Pillow and sqlite3 release the GIL while they work, so the
+loop carries on. Outside gevent it is a plain call.
+"""
+import sys
+
+
+def patched():
+    """Whether gevent has replaced threading in this process."""
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+def call(function, *args):
+    """``function(*args)``, off the event loop when there is one. (gevent runs
+    it in place when the caller is already on one of the pool's threads.)"""
+    if not patched():
+        return function(*args)
+    import gevent
+
+    return gevent.get_hub().threadpool.apply(function, args)
@@ -0,0 +1,170 @@
+"""In-process snapshot of the project catalog shown on the home page.
+
+The catalog only changes when an admin adds or deletes a project, so each
+worker keeps the assembled project list in memory and rebuilds it only when
+the shared generation counter (a row in cache_generations) moves on. Write
+paths call bump() inside their own transaction, which invalidates every
+worker's copy; a worker notices at most CATALOG_CACHE_TTL seconds later,
+and immediately for writes it made itself. Between checks a page view reads
+the snapshot without touching the database.
+"""
+import bisect
+import threading
+import time
+
+from flask import current_app
+
+import thumbnails
+from db import get_db
+
+DEFAULT_TTL = 2.0
+DEFAULT_PAGE_SIZE = 12
+
+# Snapshot rows keep home()'s tuple layout so index.html is unchanged:
+# (0:id, 1:title, 2:price, 3:description, 4:problem, 5:objectives,
+#  6:outcomes, 7:technologies, 8:project_file, 9:poster, 10:media counts)
+# and home() appends (11:status, 12:order_id) per student. The poster is the
+# project's first photo as a thumbnails.Photo (or None) and the counts are
+# (photos, videos).
+
+
+class Snapshot:
+    def __init__(self, generation, projects):
+        self.generation = generation
+        self.projects = projects
+        self.anonymous = [p + ("none", None) for p in projects]
+        self.ids = [p[0] for p in projects]
+        # project id -> (photos, videos), filled in by CatalogCache.media()
+        self.media = {}
+        # project id -> (stored file, download name), filled in by CatalogCache.archive()
+        self.archives = {}
+
+
+class CatalogCache:
+    def __init__(self, name="catalog"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.current = None
+        self.checked_at = 0.0
+
+    def current_generation(self, con):
+        row = con.execute("SELECT generation FROM cache_generations WHERE name=?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, con):
+        con.execute(
+            "INSERT INTO cache_generations(name, generation) VALUES(?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET generation = generation + 1",
+            (self.name,))
+        # Our own write: drop the local copy now rather than waiting for the TTL
+        self.checked_at = 0.0
+
+    def load(self, con):
+        projects_raw = con.execute(
+            "SELECT id, title, price, description, problem_statement, objectives, outcomes, technologies, project_file "
+            "FROM projects ORDER BY id").fetchall()
+
+        # Only the first photo (the poster) and the media counts go into the
+        # snapshot; the full gallery is loaded per project by media().
+        posters = {}
+        photo_counts = {}
+        for pid, count, path, variants in con.execute(
+                f"SELECT project_id, n, photo_path, {thumbnails.variants_column('photo_path')} FROM "
+                "(SELECT project_id, COUNT(*) AS n, MIN(id), photo_path FROM project_photos GROUP BY project_id)"):
+            posters[pid] = thumbnails.photo(path, variants)
+            photo_counts[pid] = count
+        video_counts = dict(con.execute("SELECT project_id, COUNT(*) FROM project_videos GROUP BY project_id").fetchall())
+
+        # Columns are named because the table's own order (project_file second,
+        # photo/video before description) does not match the tuple layout.
+        return [
+            tuple(p) + (posters.get(p[0]), (photo_counts.get(p[0], 0), video_counts.get(p[0], 0)))
+            for p in projects_raw
+        ]
+
+    def load_media(self, con, project_id):
+        photos = tuple(
+            thumbnails.photo(path, variants)
+            for path, variants in con.execute(
+                f"SELECT photo_path, {thumbnails.variants_column('photo_path')} FROM project_photos "
+                "WHERE project_id=? ORDER BY id", (project_id,)))
+        videos = tuple(r[0] for r in con.execute(
+            "SELECT video_path FROM project_videos WHERE project_id=? ORDER BY id", (project_id,)))
+        return photos, videos
+
+    def fresh(self, ttl):
+        return self.current is not None and time.monotonic() - self.checked_at < ttl
+
+    def get(self):
+        """Return the current Snapshot, re-checking the generation when the TTL is up."""
+        ttl = current_app.config.get("CATALOG_CACHE_TTL", DEFAULT_TTL)
+        if self.fresh(ttl):
+            return self.current
+
+        with self.lock:
+            if self.fresh(ttl):
+                return self.current
+            con = get_db()
+            # Read the generation before the rows: a write landing in between
+            # only costs an extra reload on the next check.
+            generation = self.current_generation(con)
+            if self.current is None or generation != self.current.generation:
+                self.current = Snapshot(generation, self.load(con))
+            self.checked_at = time.monotonic()
+            return self.current
+
+    def media(self, project_id):
+        """(photos, videos) of one project, or None if there is no such project.
+
+        Cached on the snapshot, so a new catalog generation (a project added
+        or deleted, or new photo variants) starts afresh.
+        """
+        snap = self.get()
+        i = bisect.bisect_left(snap.ids, project_id)
+        if i == len(snap.ids) or snap.ids[i] != project_id:
+            return None
+        media = snap.media.get(project_id)
+        if media is None:
+            media = snap.media[project_id] = self.load_media(get_db(), project_id)
+        return media
+
+    def archive(self, project_id):
+        """(stored path, download name) of a project's archive, or None.
+
+        Lets signed download links name only the project: the path stays on
+        the server, and retries of one link cost no queries after the first.
+        """
+        snap = self.get()
+        i = bisect.bisect_left(snap.ids, project_id)
+        if i == len(snap.ids) or snap.ids[i] != project_id:
+            return None
+        if project_id not in snap.archives:
+            row = get_db().execute("SELECT project_file, project_file_name FROM projects WHERE id=?",
+                                   (project_id,)).fetchone()
+            snap.archives[project_id] = tuple(row) if row and row[0] else None
+        return snap.archives[project_id]
+
+    def snapshot(self):
+        return self.get().projects
+
+    def version(self):
+        return self.get().generation
+
+    def page(self, after=None, before=None, limit=DEFAULT_PAGE_SIZE, anonymous=False):
+        """Keyset page of the snapshot: projects with id > after (or the last
+        ``limit`` with id < before). Returns (projects, prev_cursor, next_cursor)."""
+        snap = self.get()
+        ids = snap.ids
+        rows = snap.anonymous if anonymous else snap.projects
+        if before is not None:
+            end = bisect.bisect_left(ids, before)
+            start = max(end - limit, 0)
+        else:
+            start = bisect.bisect_right(ids, after) if after is not None else 0
+            end = min(start + limit, len(ids))
+        prev_cursor = ids[start] if start > 0 else None
+        next_cursor = ids[end - 1] if end < len(ids) else None
+        return rows[start:end], prev_cursor, next_cursor
+
+
+catalog = CatalogCache()
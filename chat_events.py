@@ -0,0 +1,183 @@
+"""Server-Sent Events push for the order and request chats.
+
+Each worker runs one watcher thread with its own SQLite connection. It
+checks PRAGMA data_version every CHAT_WATCH_INTERVAL seconds, which only
+changes when some connection (in this worker or another) has committed, and
+only then reads the rows newer than the last id it has seen. New messages
+are fanned out to the open streams of their conversation. send_message and
+send_order_message call notify() after committing so local messages go out
+straight away instead of waiting for the next tick.
+
+The watcher is the only publisher, so every stream sees a conversation's
+messages in id order, whichever worker wrote them.
+
+A stream waits on its queue between messages, so it needs a worker that
+can hold many idle requests: gunicorn's gevent worker (see render.yaml),
+where the threads and queues here are greenlets. A thread-per-request
+worker can only hold as many open chats as it has threads.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+import db
+
+log = logging.getLogger(__name__)
+
+# kind -> (table, conversation column)
+CHANNELS = {
+    "request": ("request_messages", "request_id"),
+    "order": ("order_messages", "order_id"),
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+DEFAULT_WATCH_INTERVAL = 0.5
+DEFAULT_STREAM_SECONDS = 300
+DEFAULT_HEARTBEAT_SECONDS = 15
+
+
+def load_messages(con, kind, conversation_id, after_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of a conversation in id order, plus whether more remain.
+
+    after_id pages forwards (messages newer than the cursor), before_id
+    pages backwards through older history, and with neither the latest
+    ``limit`` messages are returned. Every form is a range scan on the
+    (conversation, id) index, so the cost follows the page, not the history.
+    """
+    table, column = CHANNELS[kind]
+    if after_id is not None:
+        rows = con.execute(
+            f"SELECT * FROM {table} WHERE {column}=? AND id>? ORDER BY id LIMIT ?",
+            (conversation_id, after_id, limit + 1)).fetchall()
+        return [dict(r) for r in rows[:limit]], len(rows) > limit
+
+    sql = f"SELECT * FROM {table} WHERE {column}=?"
+    params = [conversation_id]
+    if before_id is not None:
+        sql += " AND id<?"
+        params.append(before_id)
+    rows = con.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+    return [dict(r) for r in reversed(rows[:limit])], len(rows) > limit
+
+
+class Subscription:
+    def __init__(self, kind, conversation_id):
+        self.kind = kind
+        self.conversation_id = conversation_id
+        self.queue = queue.Queue()
+
+
+class ChatHub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.subscribers = {}  # (kind, conversation_id) -> set of Subscription
+        self.last_ids = None   # kind -> highest message id already dispatched
+        self.thread = None
+        self.con = None
+        self.path = None
+        self.interval = DEFAULT_WATCH_INTERVAL
+
+    def init_app(self, app):
+        self.path = app.config["DATABASE"]
+        self.interval = app.config.get("CHAT_WATCH_INTERVAL", DEFAULT_WATCH_INTERVAL)
+        app.extensions["chat_hub"] = self
+
+    def subscribe(self, kind, conversation_id):
+        sub = Subscription(kind, conversation_id)
+        with self.lock:
+            if self.con is None:
+                # Opened lazily so gunicorn's fork happens before any thread exists
+                self.con = db.connect(self.path)
+                self.thread = threading.Thread(target=self.run, name="chat-watcher", daemon=True)
+                self.thread.start()
+            if self.last_ids is None:
+                # The watcher idles while nobody listens; resume from the current
+                # end of each table. Callers read history after subscribing, so
+                # nothing committed in between is lost.
+                self.last_ids = {
+                    k: self.con.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                    for k, (table, _) in CHANNELS.items()
+                }
+            self.subscribers.setdefault((kind, conversation_id), set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            key = (sub.kind, sub.conversation_id)
+            subs = self.subscribers.get(key)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.subscribers[key]
+            if not self.subscribers:
+                self.last_ids = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    def run(self):
+        data_version = None
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                with self.lock:
+                    current = self.con.execute("PRAGMA data_version").fetchone()[0]
+                    if current == data_version or self.last_ids is None:
+                        data_version = current
+                        continue
+                    data_version = current
+                    self.dispatch()
+            except Exception:
+                log.exception("Chat watcher error")
+                time.sleep(self.interval)
+
+    def dispatch(self):
+        for kind, (table, column) in CHANNELS.items():
+            rows = self.con.execute(
+                f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (self.last_ids[kind],)).fetchall()
+            for row in rows:
+                message = dict(row)
+                for sub in self.subscribers.get((kind, row[column]), ()):
+                    sub.queue.put(message)
+                self.last_ids[kind] = row["id"]
+
+
+def format_event(message):
+    return f"id: {message['id']}\ndata: {json.dumps(message)}\n\n"
+
+
+def stream(sub, history, after_id=0, stream_seconds=DEFAULT_STREAM_SECONDS, heartbeat=DEFAULT_HEARTBEAT_SECONDS):
+    """Yield history then live messages as SSE frames.
+
+    The stream ends after ``stream_seconds``; EventSource reconnects on its
+    own and sends Last-Event-ID, so the client resumes where it left off.
+    The caller unsubscribes ``sub`` when the response is closed.
+    """
+    yield "retry: 1000\n\n"
+    last_id = after_id
+    for message in history:
+        yield format_event(message)
+        last_id = message["id"]
+    deadline = time.monotonic() + stream_seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            message = sub.queue.get(timeout=min(heartbeat, remaining))
+        except queue.Empty:
+            yield ": keep-alive\n\n"
+            continue
+        # Already sent as part of the history
+        if message["id"] <= last_id:
+            continue
+        yield format_event(message)
+        last_id = message["id"]
+
+
+hub = ChatHub()
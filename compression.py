@@ -0,0 +1,187 @@
+"""Response compression and precompressed static files.
+
+Dynamic responses: compress_response() (an after_request hook) brotli- or
+gzip-encodes HTML, JSON, CSS and JS bodies of at least COMPRESS_MIN_SIZE
+bytes for clients that accept it. Brotli is used when the Brotli package is
+installed and the client prefers or accepts it, otherwise gzip. Compressed
+responses get Vary: Accept-Encoding, and a strong ETag becomes weak (the
+bytes differ from the identity encoding); the ETag checks in app.py compare
+weakly, so a 304 still works. Streamed and file responses, ranges and
+anything already encoded are left alone.
+
+Static files: the build step writes <file>.br and <file>.gz next to each
+text asset under static/ (and <file>.webp next to PNG/JPEG images when
+Pillow is available). serve_static then sends the best copy the client
+accepts, straight from disk with its own ETag and the fingerprinted URL's
+caching, and falls back to the original when a copy is missing or older
+than its source. Run it after changing static files (render.yaml does on
+deploy):
+
+    python compression.py [static folder]
+"""
+import gzip
+import io
+import mimetypes
+import os
+import sys
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6            # per response: fast, most of the gain
+BROTLI_QUALITY = 5
+BUILD_GZIP_LEVEL = 9      # build step: once per file, so take the best
+BUILD_BROTLI_QUALITY = 11
+WEBP_QUALITY = 85
+
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/javascript", "application/javascript",
+                "application/json", "image/svg+xml"}
+STATIC_TEXT = (".css", ".js", ".svg", ".html", ".json", ".txt")
+STATIC_IMAGES = (".png", ".jpg", ".jpeg")
+# Extension of the copy -> Content-Encoding
+ENCODINGS = ((".br", "br"), (".gz", "gzip"))
+
+
+def accepted(accept_encodings, coding):
+    return accept_encodings[coding] > 0 or (coding != "br" and accept_encodings["*"] > 0)
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accepted(accept_encodings, "br"):
+        return "br"
+    if accepted(accept_encodings, "gzip"):
+        return "gzip"
+    return None
+
+
+def encode(data, coding):
+    if coding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+# ---------------- DYNAMIC RESPONSES ----------------
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or "Content-Range" in response.headers
+            or response.mimetype not in COMPRESSIBLE
+            or "no-transform" in response.headers.get("Cache-Control", "")):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < current_app.config.get("COMPRESS_MIN_SIZE", DEFAULT_MIN_SIZE):
+        return response
+    coding = choose_encoding(request.accept_encodings)
+    if coding is None:
+        return response
+    response.set_data(encode(data, coding))
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
+
+
+# ---------------- PRECOMPRESSED STATIC FILES ----------------
+def fresh_copy(source, copy):
+    try:
+        return os.path.getmtime(copy) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def static_vary(path):
+    """The request header a static file's response depends on, or None when
+    the build step makes no copies of that kind of file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in STATIC_TEXT:
+        return "Accept-Encoding"
+    if ext in STATIC_IMAGES:
+        return "Accept"
+    return None
+
+
+def static_variant(path, accept_encodings, accept_mimetypes):
+    """(path, Content-Encoding, mimetype) of the best prebuilt copy of the
+    static file at ``path`` for this client, or None to send the original."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in STATIC_TEXT:
+        for suffix, coding in ENCODINGS:
+            if accepted(accept_encodings, coding) and fresh_copy(path, path + suffix):
+                return path + suffix, coding, mimetypes.guess_type(path)[0]
+    elif ext in STATIC_IMAGES and accept_mimetypes["image/webp"] > 0 and fresh_copy(path, path + ".webp"):
+        return path + ".webp", None, "image/webp"
+    return None
+
+
+def write_if_smaller(dest, data, original_size):
+    # Not worth a second file (or the client's decoding) for under 5% saved
+    if len(data) >= original_size * 0.95:
+        if os.path.exists(dest):
+            os.remove(dest)
+        return False
+    tmp = f"{dest}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dest)
+    return True
+
+
+def build(static_folder, skip=("uploads",)):
+    """Write the .br/.gz/.webp copies under ``static_folder``; returns
+    [(file, original bytes, {suffix: bytes})]."""
+    report = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if d not in skip and not d.startswith(".")]
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in STATIC_TEXT and ext not in STATIC_IMAGES:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            written = {}
+            if ext in STATIC_TEXT:
+                copies = {".gz": gzip.compress(data, BUILD_GZIP_LEVEL, mtime=0)}
+                if brotli is not None:
+                    copies[".br"] = brotli.compress(data, quality=BUILD_BROTLI_QUALITY)
+            else:
+                copies = {}
+                webp = to_webp(path)
+                if webp is not None:
+                    copies[".webp"] = webp
+            for suffix, encoded in copies.items():
+                if write_if_smaller(path + suffix, encoded, len(data)):
+                    written[suffix] = len(encoded)
+            report.append((os.path.relpath(path, static_folder), len(data), written))
+    return report
+
+
+def to_webp(path):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+        return out.getvalue()
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "static")
+    if brotli is None:
+        print("Brotli is not installed: writing gzip copies only.")
+    for name, size, written in build(folder):
+        copies = ", ".join(f"{suffix} {n / size:.0%}" for suffix, n in written.items()) or "no smaller copy"
+        print(f"{name:<30} {size:>9,} bytes  {copies}")
@@ -0,0 +1,127 @@
+"""Custom project request states and the admin's writes to them.
+
+    Requested  --set price-->   Price Set
+    Price Set  --set price-->   Price Set   re-quoted before the student pays
+    Price Set  --student pays-> Pending     transaction id submitted
+    Pending    --confirm-->     Paid        found on a statement (reconcile.py),
+                                            or checked by hand
+    Pending/Paid --deliver-->   Completed   admin uploads the final file
+
+As with orders.py, single-row writes name the states they start from (and
+return None when the request is not in one of them), and
+the bulk versions (admin_requests_bulk in app.py) check every request
+against the same rules, report a result per request and apply the valid
+ones with executemany, under the write lock the caller took. The caller
+commits.
+"""
+import blobstore
+import db
+
+REQUESTED = "Requested"
+PRICE_SET = "Price Set"
+PENDING = "Pending"
+PAID = "Paid"
+COMPLETED = "Completed"
+
+# A price can change until the student has paid it
+PRICEABLE = (REQUESTED, PRICE_SET)
+# The final file can be delivered once the student has paid
+DELIVERABLE = (PENDING, PAID)
+# Deleting a request with a payment awaiting delivery would lose the payment
+DELETABLE = (REQUESTED, PRICE_SET, COMPLETED)
+
+
+def parse_price(text):
+    """The price in whole rupees, or ValueError with a message for the admin."""
+    try:
+        price = int(str(text).strip())
+    except ValueError:
+        raise ValueError("Price must be a whole number of rupees") from None
+    if price < 1:
+        raise ValueError("Price must be at least 1")
+    return price
+
+
+def set_price(con, request_id, price):
+    """Returns the request id, or None when it is not PRICEABLE."""
+    row = con.execute(
+        f"UPDATE project_requests SET price=?, status=? WHERE id=? AND status IN ({', '.join('?' * len(PRICEABLE))}) "
+        "RETURNING id",
+        (price, PRICE_SET, request_id, *PRICEABLE)).fetchone()
+    return row[0] if row else None
+
+
+def submit_payment(con, request_id, student, transaction_id):
+    """Price Set -> Pending with the student's transaction id. Returns the
+    request id, or None when it is not theirs or not awaiting payment."""
+    row = con.execute(
+        "UPDATE project_requests SET transaction_id=?, status=? WHERE id=? AND student_username=? AND status=? "
+        "RETURNING id",
+        (transaction_id, PENDING, request_id, student, PRICE_SET)).fetchone()
+    return row[0] if row else None
+
+
+def deliver(con, request_id, final_file, final_file_name):
+    """Pending/Paid -> Completed with the final file. Returns the request id,
+    or None when it is not DELIVERABLE."""
+    row = con.execute(
+        "UPDATE project_requests SET final_file=?, final_file_name=?, status=? "
+        f"WHERE id=? AND status IN ({', '.join('?' * len(DELIVERABLE))}) RETURNING id",
+        (final_file, final_file_name, COMPLETED, request_id, *DELIVERABLE)).fetchone()
+    return row[0] if row else None
+
+
+def check(con, request_ids, allowed):
+    """[(request id, None if it may proceed, else why not)] for each id once."""
+    current = dict(con.execute("SELECT id, status FROM project_requests WHERE id IN (SELECT value FROM json_each(?))",
+                               (db.in_ids(request_ids),)).fetchall())
+    results = []
+    for request_id in dict.fromkeys(request_ids):
+        status = current.get(request_id)
+        if status is None:
+            results.append((request_id, "No such request"))
+        elif status not in allowed:
+            results.append((request_id, f"Request is {status}, not {' or '.join(allowed)}"))
+        else:
+            results.append((request_id, None))
+    return results
+
+
+def set_prices(con, request_ids, price):
+    results = check(con, request_ids, PRICEABLE)
+    con.executemany(
+        f"UPDATE project_requests SET price=?, status=? WHERE id=? AND status IN ({', '.join('?' * len(PRICEABLE))})",
+        [(price, PRICE_SET, request_id, *PRICEABLE) for request_id, error in results if error is None])
+    return results
+
+
+def mark_paid_many(con, request_ids):
+    """Pending -> Paid for each id still Pending; returns how many moved."""
+    return con.executemany("UPDATE project_requests SET status=? WHERE id=? AND status=?",
+                           [(PAID, request_id, PENDING) for request_id in request_ids]).rowcount
+
+
+def confirm_payments(con, request_ids):
+    results = check(con, request_ids, (PENDING,))
+    mark_paid_many(con, [request_id for request_id, error in results if error is None])
+    return results
+
+
+def delete_many(con, request_ids):
+    """Delete DELETABLE requests with their media and chat. Returns (results,
+    blob paths no longer used); remove those once committed."""
+    results = check(con, request_ids, DELETABLE)
+    ids = [request_id for request_id, error in results if error is None]
+    if not ids:
+        return results, []
+    selected = db.in_ids(ids)
+    paths = [r[0] for r in con.execute(
+        "SELECT final_file FROM project_requests WHERE id IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT photo_path FROM request_photos WHERE request_id IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT video_path FROM request_videos WHERE request_id IN (SELECT value FROM json_each(?))",
+        (selected, selected, selected))]
+    rows = [(request_id,) for request_id in ids]
+    for table, column in (("request_photos", "request_id"), ("request_videos", "request_id"),
+                          ("request_messages", "request_id"), ("project_requests", "id")):
+        con.executemany(f"DELETE FROM {table} WHERE {column}=?", rows)
+    return results, blobstore.release(con, paths)
@@ -0,0 +1,277 @@
+"""SQLite connection handling for StudentProjectHub.
+
+Routes call get_db() instead of sqlite3.connect(). The connection is
+borrowed from a small per-process pool, kept on flask.g for the rest of
+the request and handed back by the teardown hook, so every request uses
+exactly one connection and nothing is left open when it finishes.
+
+Connections are TimedConnection objects: while one is lent to a request,
+every statement it runs is counted and timed (execute plus fetching) into
+g.query_stats, which the query budgets and the profiling middleware read.
+Statements that can wait for the write lock or sync to disk (anything but a
+read) and commits go through blocking.call(), so under gevent they wait on a
+native thread instead of stalling the whole worker.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, request
+
+import blocking
+
+# Tuned for a small read-heavy store running under several gunicorn workers.
+# WAL lets readers and the single writer work at the same time, and
+# busy_timeout makes a blocked writer wait instead of failing straight away
+# with "database is locked". Override any of these with app.config['SQLITE_PRAGMAS'].
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -8000,  # negative = KiB, so roughly 8 MB per connection
+    "temp_store": "MEMORY",
+}
+
+DEFAULT_POOL_SIZE = 4
+
+
+# ---------------- INSTRUMENTATION ----------------
+class QueryStats:
+    """Statements one request ran: count, total seconds and
+    [sql, seconds, parameters] entries."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = []
+
+    def record(self, sql, seconds, parameters=None):
+        # Transaction control is bookkeeping, not a query the route asked for
+        if not sql.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+            self.count += 1
+        self.time += seconds
+        entry = [sql, seconds, parameters]
+        self.statements.append(entry)
+        return entry
+
+
+def is_read(sql):
+    return sql.lstrip()[:6].upper() in ("SELECT", "PRAGMA")
+
+
+def run(method, sql, parameters):
+    if is_read(sql):
+        return method(sql, parameters)
+    return blocking.call(method, sql, parameters)
+
+
+class TimedCursor(sqlite3.Cursor):
+    entry = None
+
+    def execute(self, sql, parameters=()):
+        stats = self.connection.stats
+        if stats is None:
+            return run(super().execute, sql, parameters)
+        start = time.perf_counter()
+        try:
+            return run(super().execute, sql, parameters)
+        finally:
+            self.entry = stats.record(sql, time.perf_counter() - start, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = self.connection.stats
+        if stats is None:
+            return run(super().executemany, sql, seq_of_parameters)
+        # Keep the rows only when they can be looked at again (not a generator)
+        rows = seq_of_parameters if isinstance(seq_of_parameters, (list, tuple)) else None
+        start = time.perf_counter()
+        try:
+            return run(super().executemany, sql, seq_of_parameters)
+        finally:
+            self.entry = stats.record(sql, time.perf_counter() - start, rows)
+
+    # SQLite does most of a SELECT's work while rows are stepped through,
+    # so fetching counts towards the statement that produced the rows.
+    def _timed(self, fetch, *args):
+        stats = self.connection.stats
+        if stats is None or self.entry is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.entry[1] += elapsed
+            stats.time += elapsed
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+
+class TimedConnection(sqlite3.Connection):
+    stats = None  # QueryStats of the request currently holding the connection
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if self.stats is None:
+            return blocking.call(super().commit)
+        start = time.perf_counter()
+        try:
+            return blocking.call(super().commit)
+        finally:
+            self.stats.record("COMMIT", time.perf_counter() - start)
+
+
+def connect(path, pragmas=None):
+    con = sqlite3.connect(path, check_same_thread=False, factory=TimedConnection)
+    con.row_factory = sqlite3.Row
+    for name, value in (pragmas or DEFAULT_PRAGMAS).items():
+        con.execute(f"PRAGMA {name}={value}")
+    return con
+
+
+class ConnectionPool:
+    def __init__(self, path, pragmas=None, size=DEFAULT_POOL_SIZE, prepare=None):
+        self.path = path
+        self.pragmas = pragmas
+        self.idle = queue.LifoQueue(maxsize=size)
+        # Run once per process before the first connection (see ensure_ready)
+        self.prepare = prepare
+        self.prepare_lock = threading.Lock()
+
+    def ensure_ready(self):
+        """Run the ``prepare`` callback if this process has not yet. A failure
+        leaves it pending, so the next request tries again."""
+        if self.prepare is None:
+            return
+        with self.prepare_lock:
+            if self.prepare is not None:
+                self.prepare()
+                self.prepare = None
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            self.ensure_ready()
+            return connect(self.path, self.pragmas)
+
+    def release(self, con):
+        # Never hand a half-finished transaction to the next request
+        if con.in_transaction:
+            con.rollback()
+        try:
+            self.idle.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def get_pool(app=None):
+    app = app or current_app
+    return app.extensions["sqlite_pool"]
+
+
+def query_stats():
+    """QueryStats for the current request (the profiling middleware may have
+    created it already)."""
+    if "query_stats" not in g:
+        g.query_stats = QueryStats()
+    return g.query_stats
+
+
+def get_db():
+    if "db" not in g:
+        g.db = get_pool().acquire()
+        g.db.stats = query_stats()
+    return g.db
+
+
+def close_db(exc=None):
+    con = g.pop("db", None)
+    if con is not None:
+        con.stats = None
+        get_pool().release(con)
+
+
+def in_ids(ids):
+    """Bind a list of ids as one parameter: ``col IN (SELECT value FROM json_each(?))``.
+
+    Keeps batched lookups at a single statement however many ids there are.
+    """
+    return json.dumps(list(ids))
+
+
+# ---------------- QUERY BUDGETS ----------------
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit):
+    """Declare the most statements a view may run per request.
+
+    Only enforced when app.config['ENFORCE_QUERY_BUDGETS'] is set (the load
+    test and benchmarks/check_query_budgets.py), so an N+1 regression fails
+    loudly there and costs nothing in production.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def check_query_budget(response):
+    if not current_app.config.get("ENFORCE_QUERY_BUDGETS"):
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, "query_budget", None)
+    used = g.query_stats.count if "query_stats" in g else 0
+    if limit is not None and used > limit:
+        raise QueryBudgetExceeded(f"{request.endpoint} ran {used} queries, budget is {limit}")
+    return response
+
+
+def ensure_ready():
+    get_pool().ensure_ready()
+
+
+def init_app(app, prepare=None):
+    """``prepare`` is the process's one-time setup (creating folders, copying
+    or migrating the database). It runs before the first request rather than
+    at import, so importing the app stays free of I/O."""
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas.update(app.config.get("SQLITE_PRAGMAS", {}))
+    app.extensions["sqlite_pool"] = ConnectionPool(
+        app.config["DATABASE"],
+        pragmas,
+        app.config.get("SQLITE_POOL_SIZE", DEFAULT_POOL_SIZE),
+        prepare,
+    )
+    app.before_request(ensure_ready)
+    app.teardown_appcontext(close_db)
+    app.after_request(check_query_budget)
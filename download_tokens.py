@@ -0,0 +1,138 @@
+"""Signed, expiring download links for confirmed orders.
+
+When home() shows a confirmed order it links to /download/<id>?token=...,
+where the token is an HMAC-SHA256 over (student, project id, issued,
+expires). The payload is only signed, not encrypted, so it names nothing
+the student should not see: the stored file is looked up by project id
+from the catalog snapshot (catalog.archive()) when the link is used.
+download() checks the signature, the expiry and the deny-list and then
+serves the file. It does not look at orders, so a download manager that
+retries or fetches in parallel costs no queries.
+
+Revoking an order (see revoke_payment in app.py) writes a row to
+download_revocations. Tokens for that order issued at or before that
+moment are then refused. Times are in microseconds, so a link issued
+right after a revoke and re-confirm is not mistaken for one from before. Each worker keeps the recent revocations in a
+dict and picks up other workers' rows with one indexed query at most
+every DOWNLOAD_REVOCATION_REFRESH seconds. Entries older than the token
+lifetime can no longer match a live token and are dropped, so the list
+stays small.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from db import get_db
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_REFRESH = 2.0
+SIGNATURE_BYTES = 16
+MICROSECONDS = 1_000_000
+
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def now():
+    """Microseconds since the epoch, the unit of issued/expires/revoked_at."""
+    return time.time_ns() // 1000
+
+
+class DownloadTokens:
+    def __init__(self):
+        self.key = None
+        self.ttl = DEFAULT_TTL
+        self.refresh = DEFAULT_REFRESH
+        self.lock = threading.Lock()
+        self.revoked = {}      # (student, project_id) -> revoked_at
+        self.seen_until = 0    # newest revoked_at read from the table
+        self.checked_at = None
+
+    def init_app(self, app):
+        secret = app.config.get("DOWNLOAD_TOKEN_SECRET") or app.secret_key
+        # Derived key, so a token can never be passed off as a session cookie or vice versa
+        self.key = hmac.new(secret.encode(), b"download-token", hashlib.sha256).digest()
+        self.ttl = app.config.get("DOWNLOAD_TOKEN_TTL", DEFAULT_TTL)
+        self.refresh = app.config.get("DOWNLOAD_REVOCATION_REFRESH", DEFAULT_REFRESH)
+        app.extensions["download_tokens"] = self
+
+    def sign(self, payload):
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+    def issue(self, student, project_id):
+        issued = now()
+        payload = json.dumps([student, project_id, issued, issued + self.ttl * MICROSECONDS],
+                             separators=(",", ":")).encode()
+        return f"{b64encode(payload)}.{b64encode(self.sign(payload))}"
+
+    def verify(self, token, project_id):
+        """Claims of a valid token for ``project_id``, or None if it is forged,
+        expired, for another project or revoked."""
+        try:
+            payload_text, signature_text = token.split(".")
+            payload = b64decode(payload_text)
+            signature = b64decode(signature_text)
+        except (ValueError, binascii.Error):
+            return None
+        if not hmac.compare_digest(signature, self.sign(payload)):
+            return None
+        try:
+            student, token_project, issued, expires = json.loads(payload)
+        except ValueError:
+            return None  # signed, but in the format of an older release
+        if token_project != project_id or expires < now():
+            return None
+        if self.is_revoked(student, project_id, issued):
+            return None
+        return {"student": student, "project_id": project_id, "issued": issued, "expires": expires}
+
+    # ---------------- REVOCATION ----------------
+    def revoke(self, con, student, project_id):
+        """Refuse every token issued so far for this order. The caller commits."""
+        revoked_at = now()
+        con.execute(
+            "INSERT INTO download_revocations(student_username, project_id, revoked_at) VALUES(?,?,?) "
+            "ON CONFLICT(student_username, project_id) DO UPDATE SET revoked_at=excluded.revoked_at",
+            (student, project_id, revoked_at))
+        con.execute("DELETE FROM download_revocations WHERE revoked_at < ?",
+                    (revoked_at - self.ttl * MICROSECONDS,))
+        with self.lock:
+            self.revoked[(student, project_id)] = revoked_at
+
+    def is_revoked(self, student, project_id, issued):
+        self.sync()
+        revoked_at = self.revoked.get((student, project_id))
+        return revoked_at is not None and issued <= revoked_at
+
+    def fresh(self):
+        return self.checked_at is not None and time.monotonic() - self.checked_at < self.refresh
+
+    def sync(self):
+        """Pick up revocations made by other workers, at most once per refresh interval."""
+        if self.fresh():
+            return
+        with self.lock:
+            if self.fresh():
+                return
+            rows = get_db().execute(
+                "SELECT student_username, project_id, revoked_at FROM download_revocations WHERE revoked_at >= ?",
+                (self.seen_until,)).fetchall()
+            for student, project_id, revoked_at in rows:
+                key = (student, project_id)
+                self.revoked[key] = max(revoked_at, self.revoked.get(key, 0))
+                self.seen_until = max(self.seen_until, revoked_at)
+            cutoff = now() - self.ttl * MICROSECONDS
+            self.revoked = {key: at for key, at in self.revoked.items() if at >= cutoff}
+            self.checked_at = time.monotonic()
+
+
+tokens = DownloadTokens()
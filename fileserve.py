@@ -0,0 +1,200 @@
+"""Conditional and ranged file responses for downloads and uploaded media.
+
+send() answers one GET for a file on disk with:
+
+* a strong ETag (the SHA-256 for blob-store files, whose name is their
+  hash, otherwise mtime and size) and Last-Modified;
+* 304 for a matching If-None-Match / If-Modified-Since;
+* 206 for a Range request, as a single part or as multipart/byteranges
+  for several ranges, honouring If-Range so a resumed download never
+  splices two versions of a file; 416 when no range fits the file.
+
+Static URLs are fingerprinted (see fingerprint()): blob-store and variant
+paths already name their content, and other static files get a ?v= query
+from their mtime and size. A request for the current fingerprint is
+served with an immutable Cache-Control, so replaying a video or revisiting
+a page does not refetch it.
+"""
+import mimetypes
+import os
+import re
+import secrets
+
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+
+CHUNK = 64 * 1024
+# Many tiny ranges cost more to answer than the whole file; past this
+# (after merging overlaps) the Range header is ignored and a 200 is sent.
+MAX_RANGES = 16
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Blob-store files are named <sha256><ext>, their variants <sha256>-<name><ext>
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.[0-9a-z]+$")
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(?:-[a-z]+)?\.[0-9a-z]+$")
+
+
+def file_etag(path, stat):
+    match = BLOB_NAME.match(os.path.basename(path))
+    if match:
+        return match.group(1)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def fingerprint(path):
+    """Short version tag for a file that is not content-addressed, or None."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}{stat.st_size:x}"[-12:]
+
+
+def is_content_addressed(path):
+    return bool(CONTENT_ADDRESSED.match(os.path.basename(path)))
+
+
+def satisfiable_ranges(byte_range, size):
+    """[(start, stop)] for the request's ranges that overlap the file, merged
+    and sorted; None when the Range header should be ignored."""
+    if byte_range is None or byte_range.units != "bytes":
+        return None
+    ranges = []
+    for start, stop in byte_range.ranges:
+        if start < 0:
+            start, stop = max(size + start, 0), size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            ranges.append((start, stop))
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def read_ranges(path, ranges, parts=None):
+    with open(path, "rb") as f:
+        for i, (start, stop) in enumerate(ranges):
+            if parts:
+                yield parts[i]
+            f.seek(start)
+            remaining = stop - start
+            while remaining:
+                chunk = f.read(min(CHUNK, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+        if parts:
+            yield parts[-1]
+
+
+def send(path, download_name=None, as_attachment=False, cache_control=REVALIDATE, mimetype=None):
+    """Response for the file at ``path`` honouring the current request's
+    conditional and Range headers. The caller has checked the path exists
+    and that the client may have it."""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(path, stat)
+    mimetype = mimetype or mimetypes.guess_type(download_name or path)[0] or "application/octet-stream"
+
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = int(stat.st_mtime)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Cache-Control"] = cache_control
+    if download_name:
+        response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                             filename=download_name)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = (request.if_modified_since is not None
+                        and int(stat.st_mtime) <= request.if_modified_since.timestamp())
+    if not_modified:
+        response.status_code = 304
+        return response
+
+    ranges = None
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        ranges = satisfiable_ranges(request.range, size)
+    elif if_range.etag == etag or (if_range.date is not None and int(stat.st_mtime) <= if_range.date.timestamp()):
+        ranges = satisfiable_ranges(request.range, size)
+
+    if ranges is None:
+        response.response = wrap_file(request.environ, open(path, "rb"), CHUNK)
+        response.direct_passthrough = True
+        response.content_length = size
+        return response
+
+    if not ranges:
+        response.status_code = 416
+        response.headers["Content-Range"] = f"bytes */{size}"
+        response.content_length = 0
+        return response
+
+    response.status_code = 206
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        response.content_length = stop - start
+        response.response = read_ranges(path, ranges)
+        return response
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+        f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n".encode()
+        for start, stop in ranges
+    ] + [f"\r\n--{boundary}--\r\n".encode()]
+    response.content_type = f"multipart/byteranges; boundary={boundary}"
+    response.content_length = sum(len(p) for p in parts) + sum(stop - start for start, stop in ranges)
+    response.response = read_ranges(path, ranges, parts)
+    return response
+
+
+# ---------------- PROXY OFFLOAD ----------------
+# Behind nginx or Apache the route only checks entitlement and names the
+# file; the proxy then does the transfer (and its own Range/ETag handling)
+# without holding a Python worker for the length of the download.
+#
+#   nginx:   location /protected-uploads/ { internal; alias /srv/app/static/uploads/; }
+#   Apache:  XSendFile On; XSendFilePath /srv/app/static/uploads
+#
+# The upload folder holds the paid archives too, so the proxy must not serve
+# it as a public location: leave /static/uploads/ to the app, which only
+# sends published media from it (serve_static in app.py).
+OFFLOAD_MODES = ("x-accel-redirect", "x-sendfile")
+
+
+def offload(mode, path, internal_url, download_name=None, as_attachment=False,
+            cache_control=REVALIDATE, mimetype=None):
+    """Empty response telling the front proxy to send ``path`` itself.
+
+    ``internal_url`` is used for X-Accel-Redirect (an internal nginx
+    location), the absolute ``path`` for X-Sendfile.
+    """
+    if mode not in OFFLOAD_MODES:
+        raise ValueError(f"Unknown download offload mode {mode!r}")
+    mimetype = mimetype or mimetypes.guess_type(download_name or path)[0] or "application/octet-stream"
+    response = current_app.response_class(mimetype=mimetype)
+    if mode == "x-accel-redirect":
+        response.headers["X-Accel-Redirect"] = internal_url
+    else:
+        response.headers["X-Sendfile"] = os.path.abspath(path)
+    response.headers["Cache-Control"] = cache_control
+    if download_name:
+        response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                             filename=download_name)
+    return response
@@ -0,0 +1,116 @@
+"""In-process cache of rendered HTML fragments.
+
+The home page's project cards (title, details, poster and gallery button,
+see templates/_project_card.html) look the same to every visitor. Only the
+action area under them depends on who is logged in and their order status.
+index.html renders each card through project_card() in app.py, which keys
+the cached HTML by project id and a digest of the card's data, so a changed
+project (or a poster that gained its variants) gets a new key and the old
+entry simply ages out.
+
+Entries are evicted least recently used first once their total size passes
+FRAGMENT_CACHE_MB. Hits, misses, evictions, size, the time spent rendering
+misses and the render time hits saved are exported on /metrics.
+"""
+import collections
+import hashlib
+import sys
+import threading
+import time
+
+from markupsafe import Markup
+
+DEFAULT_MAX_MB = 8
+
+
+def row_version(row):
+    """Short digest of the data a fragment is rendered from."""
+    return hashlib.blake2b(repr(row).encode(), digest_size=8).hexdigest()
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # key -> (html, size, render seconds)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.render_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def init_app(self, app):
+        self.max_bytes = int(app.config.get("FRAGMENT_CACHE_MB", DEFAULT_MAX_MB) * 1024 * 1024)
+        app.extensions["fragment_cache"] = self
+        metrics = app.extensions.get("profiling")
+        if metrics is not None:
+            metrics.add_collector(self.render_prometheus)
+
+    def get(self, key, render):
+        """The cached fragment for ``key``, or ``render()``'s result, stored."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                return entry[0]
+            self.misses += 1
+
+        # Rendered outside the lock; two threads missing the same key at once
+        # both render it and the second store wins, which is harmless.
+        start = time.perf_counter()
+        html = Markup(render())
+        elapsed = time.perf_counter() - start
+        size = sys.getsizeof(html)
+        with self.lock:
+            self.render_seconds += elapsed
+            if size > self.max_bytes:
+                return html
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (html, size, elapsed)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return html
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def render_prometheus(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return [
+                "# HELP fragment_cache_lookups_total Rendered-fragment cache lookups by result.",
+                "# TYPE fragment_cache_lookups_total counter",
+                f'fragment_cache_lookups_total{{result="hit"}} {self.hits}',
+                f'fragment_cache_lookups_total{{result="miss"}} {self.misses}',
+                "# HELP fragment_cache_hit_ratio Share of lookups answered from the cache.",
+                "# TYPE fragment_cache_hit_ratio gauge",
+                f"fragment_cache_hit_ratio {self.hits / lookups if lookups else 0}",
+                "# HELP fragment_cache_evictions_total Entries dropped to stay under the memory cap.",
+                "# TYPE fragment_cache_evictions_total counter",
+                f"fragment_cache_evictions_total {self.evictions}",
+                "# HELP fragment_cache_entries Fragments currently cached.",
+                "# TYPE fragment_cache_entries gauge",
+                f"fragment_cache_entries {len(self.entries)}",
+                "# HELP fragment_cache_bytes Memory held by cached fragments.",
+                "# TYPE fragment_cache_bytes gauge",
+                f"fragment_cache_bytes {self.bytes}",
+                "# HELP fragment_cache_render_seconds_total Time spent rendering fragments on misses.",
+                "# TYPE fragment_cache_render_seconds_total counter",
+                f"fragment_cache_render_seconds_total {self.render_seconds}",
+                "# HELP fragment_cache_saved_seconds_total Render time avoided by hits.",
+                "# TYPE fragment_cache_saved_seconds_total counter",
+                f"fragment_cache_saved_seconds_total {self.saved_seconds}",
+            ]
+
+
+cache = FragmentCache()
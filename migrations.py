@@ -0,0 +1,284 @@
+"""Schema migrations for StudentProjectHub.
+
+The schema version lives in SQLite's PRAGMA user_version. Each entry in
+MIGRATIONS upgrades the database by one version; migrate() applies the
+missing ones in a single write transaction. A database that is already at
+SCHEMA_VERSION costs one PRAGMA read and no DDL, so it is cheap to call on
+every worker start.
+
+Run this file directly to create or upgrade app_data.db:
+
+    python migrations.py [path/to/app_data.db]
+"""
+import os
+import sys
+
+import db
+
+MIGRATIONS = [
+    # 1: base tables. IF NOT EXISTS keeps this safe on databases created by
+    # the old init_db.py / fix_db.py scripts, which never set user_version.
+    [
+        """CREATE TABLE IF NOT EXISTS projects(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        project_file TEXT,
+        price INTEGER,
+        photo TEXT,
+        video TEXT,
+        description TEXT,
+        problem_statement TEXT,
+        objectives TEXT,
+        outcomes TEXT,
+        technologies TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS project_photos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        photo_path TEXT,
+        FOREIGN KEY(project_id) REFERENCES projects(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS project_videos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        video_path TEXT,
+        FOREIGN KEY(project_id) REFERENCES projects(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS orders(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        student_username TEXT,
+        status TEXT DEFAULT 'Pending',
+        transaction_id TEXT,
+        FOREIGN KEY(project_id) REFERENCES projects(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS project_requests(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_username TEXT,
+        title TEXT,
+        description TEXT,
+        problem_statement TEXT,
+        objectives TEXT,
+        outcomes TEXT,
+        output_idea TEXT,
+        price INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'Requested',
+        transaction_id TEXT,
+        final_file TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS request_photos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id INTEGER,
+        photo_path TEXT,
+        FOREIGN KEY(request_id) REFERENCES project_requests(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS request_videos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id INTEGER,
+        video_path TEXT,
+        FOREIGN KEY(request_id) REFERENCES project_requests(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS request_messages(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id INTEGER,
+        sender TEXT,
+        message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(request_id) REFERENCES project_requests(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS order_messages(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER,
+        sender TEXT,
+        message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(order_id) REFERENCES orders(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS users(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        password TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS admin(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        password TEXT
+        )""",
+        """INSERT INTO admin(username,password)
+        SELECT 'Rakesh','Rakesh205@'
+        WHERE NOT EXISTS (SELECT 1 FROM admin WHERE username='Rakesh')""",
+    ],
+    # 2: indexes for the hot lookups. orders is keyed student-first so the
+    # home page's per-student status lookup is answered from the index alone,
+    # and it still serves the (project_id, student_username) equality checks
+    # in submit_payment and download.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_orders_student_project ON orders(student_username, project_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_project_photos_project ON project_photos(project_id)",
+        "CREATE INDEX IF NOT EXISTS idx_project_videos_project ON project_videos(project_id)",
+        "CREATE INDEX IF NOT EXISTS idx_project_requests_student ON project_requests(student_username)",
+        "CREATE INDEX IF NOT EXISTS idx_request_photos_request ON request_photos(request_id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_videos_request ON request_videos(request_id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_messages_request_ts ON request_messages(request_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_order_messages_order_ts ON order_messages(order_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+        "CREATE INDEX IF NOT EXISTS idx_admin_username ON admin(username)",
+    ],
+    # 3: generation counters for the in-process caches (see catalog.py)
+    [
+        """CREATE TABLE IF NOT EXISTS cache_generations(
+        name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR IGNORE INTO cache_generations(name, generation) VALUES('catalog', 0)",
+    ],
+    # 4: catalog API filters. projects.technologies is free text ("Python, Flask"),
+    # so keep a normalised lowercase copy that can be searched by index.
+    [
+        """CREATE TABLE IF NOT EXISTS project_technologies(
+        project_id INTEGER NOT NULL,
+        technology TEXT NOT NULL,
+        PRIMARY KEY(technology, project_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_project_technologies_project ON project_technologies(project_id)",
+        """WITH RECURSIVE split(project_id, technology, rest) AS (
+            SELECT id, '', technologies || ',' FROM projects
+            UNION ALL
+            SELECT project_id,
+                   lower(trim(substr(rest, 1, instr(rest, ',') - 1))),
+                   substr(rest, instr(rest, ',') + 1)
+            FROM split WHERE rest <> ''
+        )
+        INSERT OR IGNORE INTO project_technologies(project_id, technology)
+        SELECT project_id, technology FROM split WHERE technology <> ''""",
+        "CREATE INDEX IF NOT EXISTS idx_projects_price ON projects(price, id)",
+    ],
+    # 5: chat history is paged by message id now, not by the one-second
+    # timestamp, so key the chat indexes on (conversation, id) instead.
+    [
+        "DROP INDEX IF EXISTS idx_request_messages_request_ts",
+        "DROP INDEX IF EXISTS idx_order_messages_order_ts",
+        "CREATE INDEX IF NOT EXISTS idx_request_messages_request_id ON request_messages(request_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_order_messages_order_id ON order_messages(order_id, id)",
+    ],
+    # 6: content-addressed blob store (see blobstore.py). Stored paths become
+    # hash-based, so keep the uploaded archive names for downloads.
+    [
+        """CREATE TABLE IF NOT EXISTS blobs(
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "ALTER TABLE projects ADD COLUMN project_file_name TEXT",
+        "ALTER TABLE project_requests ADD COLUMN final_file_name TEXT",
+    ],
+    # 7: resized copies of uploaded photos (see thumbnails.py), keyed by the
+    # stored path of the original.
+    [
+        """CREATE TABLE IF NOT EXISTS image_variants(
+        source TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        path TEXT NOT NULL,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        PRIMARY KEY(source, variant)
+        ) WITHOUT ROWID""",
+    ],
+    # 8: revoked confirmations, so every worker refuses the signed download
+    # links issued before them (see download_tokens.py).
+    [
+        """CREATE TABLE IF NOT EXISTS download_revocations(
+        student_username TEXT NOT NULL,
+        project_id INTEGER NOT NULL,
+        revoked_at INTEGER NOT NULL,
+        PRIMARY KEY(student_username, project_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_download_revocations_revoked_at ON download_revocations(revoked_at)",
+    ],
+    # 9: one order per student and project (see orders.py), so submit_payment
+    # can upsert. Earlier racing submits may have left duplicates: keep the
+    # confirmed one (else the newest) and move the others' chat onto it.
+    # Status is no longer in the index; the one row it points at is a single
+    # lookup by rowid.
+    [
+        """WITH ranked AS (
+            SELECT id, FIRST_VALUE(id) OVER (PARTITION BY student_username, project_id
+                                             ORDER BY status = 'Confirmed' DESC, id DESC) AS keep
+            FROM orders
+        )
+        UPDATE order_messages SET order_id = (SELECT keep FROM ranked WHERE ranked.id = order_messages.order_id)
+        WHERE order_id IN (SELECT id FROM ranked WHERE id <> keep)""",
+        """WITH ranked AS (
+            SELECT id, FIRST_VALUE(id) OVER (PARTITION BY student_username, project_id
+                                             ORDER BY status = 'Confirmed' DESC, id DESC) AS keep
+            FROM orders
+        )
+        DELETE FROM orders WHERE id IN (SELECT id FROM ranked WHERE id <> keep)""",
+        "DROP INDEX IF EXISTS idx_orders_student_project",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_student_project ON orders(student_username, project_id)",
+    ],
+    # 10: statement reconciliation (see reconcile.py) looks pending payments up
+    # by their transaction id, compared without case or surrounding spaces.
+    # Only pending rows are indexed, so the indexes stay as small as the backlog.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_orders_pending_txn ON orders(upper(trim(transaction_id))) "
+        "WHERE status = 'Pending'",
+        "CREATE INDEX IF NOT EXISTS idx_project_requests_pending_txn ON project_requests(upper(trim(transaction_id))) "
+        "WHERE status = 'Pending'",
+    ],
+    # 11: /static/uploads/... only serves files a photo or video row points at
+    # (see serve_static in app.py), so it looks stored paths up directly.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_project_photos_path ON project_photos(photo_path)",
+        "CREATE INDEX IF NOT EXISTS idx_project_videos_path ON project_videos(video_path)",
+        "CREATE INDEX IF NOT EXISTS idx_request_photos_path ON request_photos(photo_path)",
+        "CREATE INDEX IF NOT EXISTS idx_request_videos_path ON request_videos(video_path)",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(con):
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path):
+    con = db.connect(path)
+    try:
+        current = schema_version(con)
+        if current >= SCHEMA_VERSION:
+            return current
+
+        # Several gunicorn workers may start at once: take the write lock
+        # first, then re-check so only one of them runs the DDL.
+        con.isolation_level = None
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            current = schema_version(con)
+            for version in range(current + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS[version - 1]:
+                    con.execute(statement)
+            # PRAGMA does not accept bound parameters
+            con.execute(f"PRAGMA user_version={SCHEMA_VERSION:d}")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return SCHEMA_VERSION
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_data.db")
+    con = db.connect(path)
+    before = schema_version(con)
+    con.close()
+    after = migrate(path)
+    if before == after:
+        print(f"StudentProjectHub database already at schema version {after}.")
+    else:
+        print(f"StudentProjectHub database migrated from version {before} to {after}.")
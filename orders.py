@@ -0,0 +1,120 @@
+"""Order states and the statements that move an order between them.
+
+A student has at most one order per project (a UNIQUE index on
+(student_username, project_id), see migration 9):
+
+    (none)    --submit-->   Pending
+    Pending   --submit-->   Pending     new transaction id
+    Pending   --confirm-->  Confirmed
+    Pending   --reject-->   Rejected
+    Rejected  --submit-->   Pending     the student pays again
+    Confirmed --revoke-->   Pending     the payment never arrived
+
+Every transition is a single write whose WHERE clause names the state it
+starts from, so two requests racing on the same order cannot both apply:
+the loser's statement matches no row and it gets None back. The caller
+commits.
+
+The bulk versions (admin_orders_bulk in app.py) check every order against
+the same rules, report a result per order, and apply the valid ones with
+one executemany. The caller takes the write lock first (BEGIN IMMEDIATE),
+so the statuses they check are the ones the writes see.
+"""
+import db
+
+PENDING = "Pending"
+CONFIRMED = "Confirmed"
+REJECTED = "Rejected"
+STATUSES = (PENDING, CONFIRMED, REJECTED)
+
+# Only these states accept a (new) transaction id from the student
+SUBMITTABLE = (PENDING, REJECTED)
+# An admin may delete an order nobody has been given the project for
+DELETABLE = (PENDING, REJECTED)
+
+# Admin action -> (from, to)
+ACTIONS = {
+    "confirm": (PENDING, CONFIRMED),
+    "reject": (PENDING, REJECTED),
+    "revoke": (CONFIRMED, PENDING),
+}
+
+
+def submit(con, project_id, student, transaction_id):
+    """Create the student's order or put it back to Pending with the new
+    transaction id. Returns (order id, status), or None when the order is
+    already confirmed and was left alone."""
+    return con.execute(
+        "INSERT INTO orders(project_id, student_username, status, transaction_id) VALUES(?, ?, ?, ?) "
+        "ON CONFLICT(student_username, project_id) DO UPDATE "
+        "SET status=excluded.status, transaction_id=excluded.transaction_id "
+        f"WHERE orders.status IN ({', '.join('?' * len(SUBMITTABLE))}) "
+        "RETURNING id, status",
+        (project_id, student, PENDING, transaction_id, *SUBMITTABLE)).fetchone()
+
+
+def transition(con, order_id, from_status, to_status):
+    """Move one order from ``from_status`` to ``to_status``. Returns
+    (student, project id), or None when the order is not in ``from_status``."""
+    return con.execute(
+        "UPDATE orders SET status=? WHERE id=? AND status=? RETURNING student_username, project_id",
+        (to_status, order_id, from_status)).fetchone()
+
+
+def transition_many(con, order_ids, from_status, to_status):
+    """transition() for many orders in one executemany; returns how many moved."""
+    return con.executemany("UPDATE orders SET status=? WHERE id=? AND status=?",
+                           [(to_status, order_id, from_status) for order_id in order_ids]).rowcount
+
+
+def confirm(con, order_id):
+    return transition(con, order_id, *ACTIONS["confirm"])
+
+
+def confirm_many(con, order_ids):
+    return transition_many(con, order_ids, *ACTIONS["confirm"])
+
+
+def reject(con, order_id):
+    return transition(con, order_id, *ACTIONS["reject"])
+
+
+def revoke(con, order_id):
+    return transition(con, order_id, *ACTIONS["revoke"])
+
+
+def statuses(con, order_ids):
+    return dict(con.execute("SELECT id, status FROM orders WHERE id IN (SELECT value FROM json_each(?))",
+                            (db.in_ids(order_ids),)).fetchall())
+
+
+def check(con, order_ids, allowed):
+    """[(order id, None if it may proceed, else why not)] for each id once."""
+    current = statuses(con, order_ids)
+    results = []
+    for order_id in dict.fromkeys(order_ids):
+        status = current.get(order_id)
+        if status is None:
+            results.append((order_id, "No such order"))
+        elif status not in allowed:
+            results.append((order_id, f"Order is {status}, not {' or '.join(allowed)}"))
+        else:
+            results.append((order_id, None))
+    return results
+
+
+def bulk_transition(con, order_ids, action):
+    """Apply an ACTIONS entry to many orders; returns check()'s results."""
+    from_status, to_status = ACTIONS[action]
+    results = check(con, order_ids, (from_status,))
+    transition_many(con, [order_id for order_id, error in results if error is None], from_status, to_status)
+    return results
+
+
+def delete_many(con, order_ids):
+    """Delete orders (and their chat) that are still DELETABLE."""
+    results = check(con, order_ids, DELETABLE)
+    rows = [(order_id,) for order_id, error in results if error is None]
+    con.executemany("DELETE FROM order_messages WHERE order_id=?", rows)
+    con.executemany("DELETE FROM orders WHERE id=?", rows)
+    return results
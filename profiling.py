@@ -0,0 +1,252 @@
+"""Per-request profiling, exposed in Prometheus text format at /metrics.
+
+ProfilingMiddleware wraps the WSGI app, so a request is timed until its
+last byte has been handed to the server. That includes streamed downloads
+and SSE. For each request it records:
+
+* latency, as a histogram by endpoint and method, and a count by status;
+* bytes sent;
+* SQLite statements run and the time spent in them, with fetching
+  included (from db.QueryStats, filled in by the timed connection);
+* template render time, by template.
+
+Requests slower than PROFILING_SLOW_REQUEST_MS are also kept, with their
+statement lists, in a small ring buffer served as JSON at /metrics/slow.
+
+The numbers are per process. Under gunicorn each worker has its own, so
+scrape workers individually or treat /metrics as a sample.
+"""
+import collections
+import threading
+import time
+
+from flask import g, request, before_render_template, template_rendered
+
+import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+RENDER_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_SLOW_SAMPLES = 50
+
+ENVIRON_KEY = "profiling.request"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class RequestProfile:
+    """What one request did; lives in the WSGI environ so it outlives ``g``."""
+
+    def __init__(self):
+        self.endpoint = None
+        self.status = None
+        self.bytes = 0
+        self.content_length = None
+        self.queries = db.QueryStats()
+        self.template_time = 0.0
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in values.items()) + "}"
+
+
+class Metrics:
+    def __init__(self, slow_request_ms=DEFAULT_SLOW_REQUEST_MS, slow_samples=DEFAULT_SLOW_SAMPLES):
+        self.lock = threading.Lock()
+        self.slow_request_ms = slow_request_ms
+        # Keyed by label value tuples
+        self.requests = collections.Counter()       # (endpoint, method, status)
+        self.latency = {}                           # (endpoint, method) -> Histogram
+        self.statements = {}                        # (endpoint,) -> Histogram of statements per request
+        self.bytes_sent = collections.Counter()     # (endpoint,)
+        self.query_seconds = collections.Counter()  # (endpoint,)
+        self.render = {}                            # (template,) -> Histogram
+        self.slow = collections.deque(maxlen=slow_samples)
+        # Other components' metrics: callables returning exposition lines
+        self.collectors = []
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def observe_request(self, method, path, profile, seconds):
+        endpoint = profile.endpoint or "unmatched"
+        with self.lock:
+            self.requests[(endpoint, method, profile.status)] += 1
+            self.latency.setdefault((endpoint, method), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.statements.setdefault((endpoint,), Histogram(STATEMENT_BUCKETS)).observe(profile.queries.count)
+            self.bytes_sent[(endpoint,)] += profile.bytes
+            self.query_seconds[(endpoint,)] += profile.queries.time
+            if seconds * 1000 >= self.slow_request_ms:
+                self.slow.append({
+                    "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "method": method,
+                    "path": path,
+                    "endpoint": endpoint,
+                    "status": profile.status,
+                    "ms": round(seconds * 1000, 1),
+                    "bytes": profile.bytes,
+                    "template_ms": round(profile.template_time * 1000, 1),
+                    "query_ms": round(profile.queries.time * 1000, 1),
+                    "queries": [[entry[0], round(entry[1] * 1000, 2)] for entry in profile.queries.statements],
+                })
+
+    def observe_render(self, template, seconds):
+        with self.lock:
+            self.render.setdefault((template,), Histogram(RENDER_BUCKETS)).observe(seconds)
+
+    def slow_requests(self):
+        with self.lock:
+            return list(self.slow)
+
+    def render_prometheus(self):
+        out = []
+
+        def histogram(name, help_text, series, label_names):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(series.items(), key=lambda item: tuple(map(str, item[0]))):
+                base = dict(zip(label_names, key))
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    out.append(f"{name}_bucket{labels(**base, le=bound)} {cumulative}")
+                out.append(f"{name}_bucket{labels(**base, le='+Inf')} {hist.count}")
+                out.append(f"{name}_sum{labels(**base)} {hist.sum}")
+                out.append(f"{name}_count{labels(**base)} {hist.count}")
+
+        def counter(name, help_text, series, label_names):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items(), key=lambda item: tuple(map(str, item[0]))):
+                out.append(f"{name}{labels(**dict(zip(label_names, key)))} {value}")
+
+        with self.lock:
+            counter("http_requests_total", "Requests by endpoint, method and status.",
+                    self.requests, ("endpoint", "method", "status"))
+            histogram("http_request_duration_seconds", "Time until the last byte of the response was sent.",
+                      self.latency, ("endpoint", "method"))
+            counter("http_response_bytes_total", "Response body bytes sent.", self.bytes_sent, ("endpoint",))
+            histogram("db_statements_per_request", "SQLite statements run per request.",
+                      self.statements, ("endpoint",))
+            counter("db_statement_seconds_total", "Time spent executing and fetching SQLite statements.",
+                    self.query_seconds, ("endpoint",))
+            histogram("template_render_seconds", "Jinja template render time.", self.render, ("template",))
+        for collect in self.collectors:
+            out.extend(collect())
+        return "\n".join(out) + "\n"
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        profile = environ[ENVIRON_KEY] = RequestProfile()
+        start = time.perf_counter()
+
+        def profiled_start_response(status, headers, exc_info=None):
+            profile.status = int(status.split(" ", 1)[0])
+            for name, value in headers:
+                if name.lower() == "content-length":
+                    profile.content_length = int(value)
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            self.metrics.observe_request(environ.get("REQUEST_METHOD", ""), environ.get("PATH_INFO", ""),
+                                         profile, time.perf_counter() - start)
+
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except Exception:
+            profile.status = profile.status or 500
+            finish()
+            raise
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Leave it unwrapped so the server can still use sendfile(); the
+            # time is then until the file was handed over, the size declared.
+            profile.bytes = profile.content_length or 0
+            finish()
+            return body
+        return ProfiledBody(body, profile, finish)
+
+
+class ProfiledBody:
+    """Response iterable that counts bytes and reports when the server closes it."""
+
+    def __init__(self, body, profile, finish):
+        self.body = body
+        self.profile = profile
+        self.finish = finish
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.profile.bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.finish()
+
+
+# ---------------- FLASK HOOKS ----------------
+def current_profile():
+    return request.environ.get(ENVIRON_KEY)
+
+
+def start_request():
+    profile = current_profile()
+    if profile is not None:
+        profile.endpoint = request.endpoint
+        # get_db() records into the profile's stats for this request
+        g.query_stats = profile.queries
+
+
+def start_render(sender, template, context, **extra):
+    g.setdefault("render_starts", []).append(time.perf_counter())
+
+
+def finish_render(sender, template, context, **extra):
+    starts = g.get("render_starts")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = current_profile()
+    if profile is not None:
+        profile.template_time += elapsed
+    sender.extensions["profiling"].observe_render(template.name or "<string>", elapsed)
+
+
+def init_app(app):
+    metrics = Metrics(app.config.get("PROFILING_SLOW_REQUEST_MS", DEFAULT_SLOW_REQUEST_MS),
+                      app.config.get("PROFILING_SLOW_SAMPLES", DEFAULT_SLOW_SAMPLES))
+    app.extensions["profiling"] = metrics
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, metrics)
+    app.before_request(start_request)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
+    return metrics
@@ -0,0 +1,168 @@
+"""Bulk payment reconciliation against a bank / UPI statement.
+
+The admin uploads the statement as CSV (see admin_reconcile in app.py).
+reconcile() reads it row by row: the header row is found by its
+transaction id column (UTR, UPI ref, reference no, ...; any preamble above
+it is skipped), and an amount column is used when there is one. Rows are
+taken CHUNK_ROWS at a time: the chunk's transaction ids are hashed into a
+dict, pending orders and custom requests carrying any of them are fetched
+in one query per table through a partial index on the normalised id
+(migration 10), and the matches are confirmed with executemany. Memory is
+one chunk plus the set of ids already seen (for spotting duplicates),
+however long the statement.
+
+Matching ignores case and surrounding spaces. A statement row is:
+
+    confirmed   exactly one pending order or request has its id, and the
+                amount (if the statement has one) equals the price
+    unmatched   no pending order or request has it
+    duplicate   its id already appeared earlier in the statement
+    ambiguous   several pending orders/requests claim the same id; none is
+                confirmed, the admin has to look
+    mismatch    one match, but the amount differs from the price
+
+Orders go Pending -> Confirmed (see orders.py), requests Pending -> Paid
+(see custom_requests.py).
+Everything happens in the caller's transaction, so a statement is applied
+completely or not at all; the caller commits.
+"""
+import csv
+import itertools
+import re
+
+import custom_requests
+import db
+import orders
+
+CHUNK_ROWS = 2000
+# Statement rows listed per outcome in the report; the counts are always complete
+REPORT_LIMIT = 200
+# Preamble lines (account details, period) tolerated before the header row
+MAX_HEADER_SEARCH = 50
+
+TXN_COLUMNS = {"transaction id", "txn id", "txnid", "utr", "utr no", "utr number", "upi ref", "upi ref no",
+               "upi reference", "upi transaction id", "reference", "reference no", "reference number", "ref no",
+               "rrn"}
+AMOUNT_COLUMNS = {"amount", "credit", "credit amount", "deposit", "deposit amount", "amount inr", "cr amount"}
+
+OUTCOMES = ("confirmed", "unmatched", "duplicate", "ambiguous", "mismatch")
+
+# Pending records by normalised transaction id; both use the partial indexes
+PENDING_LOOKUPS = {
+    "order": """
+        SELECT upper(trim(orders.transaction_id)), orders.id, projects.price
+        FROM orders JOIN projects ON projects.id = orders.project_id
+        WHERE orders.status = 'Pending'
+          AND upper(trim(orders.transaction_id)) IN (SELECT value FROM json_each(?))""",
+    "request": """
+        SELECT upper(trim(transaction_id)), id, price FROM project_requests
+        WHERE status = 'Pending' AND upper(trim(transaction_id)) IN (SELECT value FROM json_each(?))""",
+}
+
+
+class StatementError(ValueError):
+    pass
+
+
+def column_name(cell):
+    return re.sub(r"[\s._/-]+", " ", cell.strip().lower()).strip(" :#")
+
+
+def normalise(txn):
+    return txn.strip().upper()
+
+
+def parse_amount(text):
+    cleaned = re.sub(r"[^\d.\-]", "", text or "")
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def statement_rows(lines):
+    """Yield (line number, transaction id, amount or None) from CSV ``lines``."""
+    reader = csv.reader(lines)
+    txn_col = amount_col = None
+    for row in reader:
+        names = [column_name(cell) for cell in row]
+        txn_col = next((i for i, name in enumerate(names) if name in TXN_COLUMNS), None)
+        if txn_col is not None:
+            amount_col = next((i for i, name in enumerate(names) if name in AMOUNT_COLUMNS), None)
+            break
+        if reader.line_num >= MAX_HEADER_SEARCH:
+            break
+    if txn_col is None:
+        if reader.line_num == 0:
+            raise StatementError("The statement is empty")
+        raise StatementError("No transaction id column (e.g. 'UTR' or 'Transaction ID') in the header")
+
+    for row in reader:
+        if len(row) <= txn_col or not row[txn_col].strip():
+            continue
+        amount = parse_amount(row[amount_col]) if amount_col is not None and len(row) > amount_col else None
+        yield reader.line_num, normalise(row[txn_col]), amount
+
+
+class Report:
+    def __init__(self):
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+        self.rows = {outcome: [] for outcome in OUTCOMES}
+        self.confirmed_orders = 0
+        self.confirmed_requests = 0
+
+    def add(self, outcome, line, txn, detail=None):
+        self.counts[outcome] += 1
+        if len(self.rows[outcome]) < REPORT_LIMIT:
+            self.rows[outcome].append({"line": line, "transaction_id": txn, "detail": detail})
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        return {"rows": self.total, "counts": self.counts, "confirmed_orders": self.confirmed_orders,
+                "confirmed_requests": self.confirmed_requests, "details": self.rows}
+
+
+def reconcile(con, lines, chunk_rows=CHUNK_ROWS):
+    report = Report()
+    seen = set()
+    rows = statement_rows(lines)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            return report
+
+        batch = {}  # transaction id -> (line, amount)
+        for line, txn, amount in chunk:
+            if txn in seen or txn in batch:
+                report.add("duplicate", line, txn)
+            else:
+                batch[txn] = (line, amount)
+        seen.update(batch)
+
+        matches = {}  # transaction id -> [(kind, id, price)]
+        ids = db.in_ids(batch)
+        for kind, sql in PENDING_LOOKUPS.items():
+            for txn, record_id, price in con.execute(sql, (ids,)):
+                matches.setdefault(txn, []).append((kind, record_id, price))
+
+        confirm = {"order": [], "request": []}
+        for txn, (line, amount) in batch.items():
+            found = matches.get(txn)
+            if not found:
+                report.add("unmatched", line, txn)
+            elif len(found) > 1:
+                report.add("ambiguous", line, txn, ", ".join(f"{kind} {record_id}" for kind, record_id, _ in found))
+            else:
+                kind, record_id, price = found[0]
+                if amount is not None and abs(amount - (price or 0)) > 0.005:
+                    report.add("mismatch", line, txn, f"{kind} {record_id}: paid {amount:g}, price {price}")
+                else:
+                    report.add("confirmed", line, txn, f"{kind} {record_id}")
+                    confirm[kind].append(record_id)
+
+        # Guarded like the single-row transitions; rowcount counts what moved
+        report.confirmed_orders += orders.confirm_many(con, confirm["order"])
+        report.confirmed_requests += custom_requests.mark_paid_many(con, confirm["request"])
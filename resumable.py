@@ -0,0 +1,224 @@
+"""Resumable chunked uploads for large project archives.
+
+Protocol (admin only, see the routes in app.py):
+
+    POST /api/uploads                 {"filename", "size", "sha256"?} -> {"upload_id", "offset"}
+    HEAD /api/uploads/<id>            Upload-Offset header with the bytes stored so far
+    PUT  /api/uploads/<id>            body = next chunk, Upload-Offset = where it starts
+    POST /api/uploads/<id>/finalize   {"sha256"?} -> verifies size and checksum
+
+A session lives in UPLOAD_FOLDER/.resumable/<id>/ as meta.json plus the
+partial data file. Chunks must arrive in order: a PUT whose offset is not
+the current size gets 409 with the real offset, so a client that lost a
+connection asks HEAD for the offset and carries on from there. Once
+finalized, add_project and admin_complete_request accept the upload id in
+place of an inline file and move the data into place with a rename; the
+session is only dropped once their transaction has committed, and if it
+rolls back the data goes back into the session. If the
+sha256 sent at creation is already in the blob store the session starts out
+complete and no chunks need to be sent; should that blob be gone by the time
+the upload is claimed, the claim gets 409 with offset 0 and the session is
+reopened (reopen()) for the client to send the chunks after all.
+"""
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+
+MB = 1024 * 1024
+COPY_CHUNK = MB
+
+SESSION_MAX_AGE = 24 * 60 * 60
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Serialises appends within this process; chunks for one upload come from
+# one client in order, so this only guards against accidental retries.
+_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def sessions_dir(upload_folder):
+    return os.path.join(upload_folder, ".resumable")
+
+
+def session_dir(upload_folder, upload_id):
+    if not UPLOAD_ID.match(upload_id or ""):
+        raise UploadError("Unknown upload", 404)
+    path = os.path.join(sessions_dir(upload_folder), upload_id)
+    if not os.path.isdir(path):
+        raise UploadError("Unknown upload", 404)
+    return path
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def data_path(path):
+    return os.path.join(path, "data")
+
+
+def current_offset(path):
+    return os.path.getsize(data_path(path))
+
+
+def purge_stale(upload_folder, max_age=SESSION_MAX_AGE):
+    root = sessions_dir(upload_folder)
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            # The data file's mtime moves with every chunk, so this is "last activity"
+            last_activity = os.path.getmtime(data_path(path))
+        except OSError:
+            # No data file: a broken session, or one another request is creating
+            # right now, so go by the directory's age instead
+            try:
+                last_activity = os.path.getmtime(path)
+            except OSError:
+                continue
+        if last_activity < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def create(upload_folder, filename, size, sha256=None, limit=None, already_stored=False):
+    if not filename:
+        raise UploadError("filename is required")
+    if not isinstance(size, int) or size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if limit is not None and size > limit:
+        raise UploadError(f"Uploads are limited to {limit // MB} MB.", 413)
+    if sha256 is not None and not re.match(r"^[0-9a-f]{64}$", sha256):
+        raise UploadError("sha256 must be a hex digest")
+
+    purge_stale(upload_folder)
+    upload_id = secrets.token_hex(16)
+    path = os.path.join(sessions_dir(upload_folder), upload_id)
+    os.makedirs(path)
+    open(data_path(path), "wb").close()
+    # Content the server already has (matched by sha256) needs no chunks at all
+    complete = bool(already_stored and sha256)
+    write_meta(path, {"filename": filename, "size": size, "sha256": sha256, "complete": complete,
+                      "already_stored": complete})
+    return upload_id
+
+
+def status(upload_folder, upload_id):
+    path = session_dir(upload_folder, upload_id)
+    meta = read_meta(path)
+    offset = meta["size"] if meta.get("already_stored") else current_offset(path)
+    return {"upload_id": upload_id, "offset": offset, "size": meta["size"], "complete": meta["complete"]}
+
+
+def reopen(upload_folder, upload_id):
+    """Turn a session that skipped its chunks back into an empty one; returns
+    the UploadError telling the client to send them."""
+    path = session_dir(upload_folder, upload_id)
+    meta = read_meta(path)
+    meta["complete"] = meta["already_stored"] = False
+    with _lock:
+        open(data_path(path), "wb").close()
+        write_meta(path, meta)
+    return UploadError("The server no longer has this file, upload its chunks", 409, 0)
+
+
+def append(upload_folder, upload_id, offset, stream):
+    """Append a chunk read from ``stream`` at ``offset``; returns the new offset."""
+    path = session_dir(upload_folder, upload_id)
+    meta = read_meta(path)
+    if meta["complete"]:
+        raise UploadError("Upload already finalized", 409, meta["size"])
+
+    with _lock:
+        current = current_offset(path)
+        if offset != current:
+            raise UploadError("Offset does not match the stored data", 409, current)
+        with open(data_path(path), "ab") as f:
+            written = 0
+            for chunk in iter(lambda: stream.read(COPY_CHUNK), b""):
+                written += len(chunk)
+                if current + written > meta["size"]:
+                    f.truncate(current)
+                    raise UploadError("Chunk runs past the declared size", 413, current)
+                f.write(chunk)
+        return current + written
+
+
+def finalize(upload_folder, upload_id, sha256=None):
+    path = session_dir(upload_folder, upload_id)
+    meta = read_meta(path)
+    if meta["complete"]:
+        return {"upload_id": upload_id, "size": meta["size"], "sha256": meta["sha256"]}
+
+    offset = current_offset(path)
+    if offset != meta["size"]:
+        raise UploadError("Upload is incomplete", 409, offset)
+
+    digest = hashlib.sha256()
+    with open(data_path(path), "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    expected = sha256 or meta["sha256"]
+    if expected and expected != digest:
+        raise UploadError("Checksum mismatch", 422, offset)
+
+    meta["sha256"] = digest
+    meta["complete"] = True
+    write_meta(path, meta)
+    return {"upload_id": upload_id, "size": meta["size"], "sha256": digest}
+
+
+def claim(upload_folder, upload_id, place):
+    """Hand a finalized upload to ``place``.
+
+    ``place(data_file, meta)`` moves the data where it belongs and returns
+    whatever the caller needs; ``data_file`` is None when the server already
+    had the content. Returns what ``place`` returned. The session is kept:
+    drop() it once the caller has committed, or restore() it if the caller
+    rolls back, so the same upload id can be claimed again.
+    """
+    path = session_dir(upload_folder, upload_id)
+    meta = read_meta(path)
+    if not meta["complete"]:
+        raise UploadError("Upload has not been finalized", 409, current_offset(path))
+    return place(None if meta.get("already_stored") else data_path(path), meta)
+
+
+def drop(upload_folder, upload_id):
+    shutil.rmtree(os.path.join(sessions_dir(upload_folder), upload_id), ignore_errors=True)
+
+
+def restore(upload_folder, upload_id, moved_to):
+    """Undo a claim whose transaction rolled back: move the data back from
+    ``moved_to``, or with None (the file there is in use again) mark the
+    session as already stored, for the next claim to reference."""
+    path = session_dir(upload_folder, upload_id)
+    if moved_to is not None:
+        os.replace(moved_to, data_path(path))
+        return
+    meta = read_meta(path)
+    meta["already_stored"] = True
+    write_meta(path, meta)
@@ -0,0 +1,228 @@
+"""Opt-in log of slow SQL statements, with their query plans.
+
+Set SLOW_QUERY_MS to turn it on. When a request finishes, every statement
+it ran that took at least that long (execute plus fetching, as timed by
+db.TimedCursor) is appended to SLOW_QUERY_LOG as one JSON line with:
+
+* the SQL normalised (literals and IN lists folded) and its fingerprint;
+* the shape of the parameters (types and lengths, never the values);
+* the duration and the request it came from;
+* the EXPLAIN QUERY PLAN output, run on the same connection. Plans are
+  cached per statement for PLAN_TTL seconds so a hot slow query is not
+  explained on every request.
+
+The report groups the log by fingerprint and flags plans that scan a
+table without a covering index or sort through a temporary B-tree:
+
+    python slowlog.py [slow_queries.jsonl] [--top 20]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from flask import g, request
+
+PLAN_TTL = 300
+MAX_CACHED_PLANS = 256
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+SPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    sql = COMMENT.sub(" ", sql)
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    sql = IN_LIST.sub("IN (?+)", sql)
+    return SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def value_shape(value):
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def parameter_shape(parameters, many=False):
+    if many:
+        if not parameters:
+            return {"rows": 0}
+        return {"rows": len(parameters), "row": parameter_shape(parameters[0])}
+    if isinstance(parameters, dict):
+        return {name: value_shape(value) for name, value in parameters.items()}
+    return [value_shape(value) for value in parameters or ()]
+
+
+def plan_lines(rows):
+    """EXPLAIN QUERY PLAN rows as indented lines, like the sqlite3 shell."""
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def plan_warnings(plan):
+    warnings = []
+    for line in plan or ():
+        step = line.strip()
+        if step.startswith("SCAN "):
+            target = step[5:]
+            # Constant rows, subqueries and json_each() are not table scans
+            if target.startswith(("CONSTANT ROW", "(")) or "VIRTUAL TABLE" in target:
+                continue
+            if "COVERING INDEX" not in target:
+                warnings.append(f"scan without covering index: {step}")
+        elif step.startswith("USE TEMP B-TREE"):
+            warnings.append(f"temporary b-tree: {step}")
+    return warnings
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.threshold_ms = None
+        self.path = None
+        self.lock = threading.Lock()
+        self.plans = {}  # sql -> (plan lines, explained at)
+
+    @property
+    def enabled(self):
+        return bool(self.threshold_ms) and self.path is not None
+
+    def init_app(self, app):
+        self.threshold_ms = app.config.get("SLOW_QUERY_MS")
+        self.path = app.config.get("SLOW_QUERY_LOG")
+        app.extensions["slow_query_log"] = self
+        if self.enabled:
+            app.teardown_request(self.flush)
+
+    def explain(self, con, sql, parameters, many):
+        now = time.monotonic()
+        cached = self.plans.get(sql)
+        if cached and now - cached[1] < PLAN_TTL:
+            return cached[0]
+        if many:
+            parameters = parameters[0] if parameters else None
+        if parameters is None:
+            return None
+        try:
+            plan = plan_lines(con.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall())
+        except sqlite3.Error as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        if len(self.plans) >= MAX_CACHED_PLANS:
+            self.plans.clear()
+        self.plans[sql] = (plan, now)
+        return plan
+
+    def flush(self, exc=None):
+        """Teardown hook: log the request's slow statements while its
+        connection is still checked out."""
+        stats = g.get("query_stats")
+        con = g.get("db")
+        if stats is None or con is None:
+            return
+        threshold = self.threshold_ms / 1000
+        slow = [entry for entry in stats.statements if entry[1] >= threshold]
+        if not slow:
+            return
+        # The EXPLAINs are ours, not the request's
+        con.stats = None
+        records = []
+        for sql, seconds, parameters in slow:
+            normalized = normalize(sql)
+            if not normalized.upper().startswith(EXPLAINABLE):
+                continue
+            many = isinstance(parameters, (list, tuple)) and bool(parameters) \
+                and isinstance(parameters[0], (list, tuple, dict))
+            records.append({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "ms": round(seconds * 1000, 2),
+                "fingerprint": fingerprint(normalized),
+                "sql": normalized,
+                "params": parameter_shape(parameters, many),
+                "plan": self.explain(con, sql, parameters, many),
+            })
+        if records:
+            lines = "".join(json.dumps(record) + "\n" for record in records)
+            # One write per request so lines from several workers do not interleave
+            with self.lock, open(self.path, "a") as f:
+                f.write(lines)
+
+
+log = SlowQueryLog()
+
+
+# ---------------- REPORT ----------------
+def read_log(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def report(records, top=20, out=sys.stdout):
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record["fingerprint"], {"sql": record["sql"], "ms": [], "paths": set(),
+                                                          "params": record["params"], "plan": None})
+        group["ms"].append(record["ms"])
+        group["paths"].add(record["path"])
+        if record["plan"] is not None:
+            group["plan"] = record["plan"]
+
+    ranked = sorted(groups.items(), key=lambda item: sum(item[1]["ms"]), reverse=True)
+    flagged = 0
+    for fp, group in ranked[:top]:
+        times = sorted(group["ms"])
+        warnings = plan_warnings(group["plan"])
+        flagged += bool(warnings)
+        print(f"{fp}  {len(times)}x  total {sum(times):.1f} ms  p50 {percentile(times, 0.5):.1f} ms  "
+              f"p95 {percentile(times, 0.95):.1f} ms  max {times[-1]:.1f} ms", file=out)
+        print(f"    {group['sql']}", file=out)
+        print(f"    params {json.dumps(group['params'])}  from {', '.join(sorted(group['paths']))}", file=out)
+        if group["plan"] is None:
+            plan = ["(no plan captured)"]
+        else:
+            plan = group["plan"] or ["(no table access)"]
+        for line in plan:
+            print(f"      {line}", file=out)
+        for warning in warnings:
+            print(f"    !! {warning}", file=out)
+        print(file=out)
+    print(f"{len(groups)} statement fingerprints, {flagged} of the top {min(top, len(groups))} "
+          f"need an index or a rewrite", file=out)
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Group the slow-query log by statement fingerprint.")
+    parser.add_argument("log", nargs="?", default=os.path.join(here, "slow_queries.jsonl"))
+    parser.add_argument("--top", type=int, default=20, help="fingerprints to show, by total time")
+    args = parser.parse_args()
+    if not os.path.exists(args.log):
+        sys.exit(f"No slow-query log at {args.log} (is SLOW_QUERY_MS set?)")
+    report(read_log(args.log), args.top)
@@ -0,0 +1,46 @@
+// Multi-select on the admin orders and requests pages and, for the admin, the catalog.
+// Each row's checkbox belongs to a form.bulk-form through its form="" attribute,
+// so the ticked ids post to /admin_*/bulk together with the chosen action.
+// Inputs marked data-bulk-action only apply to that action (the price).
+
+function bulkBoxes(form) {
+    return [...document.querySelectorAll(`input.bulk-select[form="${form.id}"]`)];
+}
+
+function updateBulkForm(form) {
+    const boxes = bulkBoxes(form);
+    const ticked = boxes.filter(box => box.checked).length;
+    form.querySelector('.bulk-count').textContent = ticked;
+    const all = form.querySelector('.bulk-select-all');
+    all.checked = ticked > 0 && ticked === boxes.length;
+    all.indeterminate = ticked > 0 && ticked < boxes.length;
+    const action = form.elements.action.value;
+    form.querySelectorAll('[data-bulk-action]').forEach(el => {
+        const active = el.dataset.bulkAction === action;
+        el.style.display = active ? '' : 'none';
+        el.querySelectorAll('input').forEach(input => { input.disabled = !active; });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('form.bulk-form').forEach(form => {
+        const all = form.querySelector('.bulk-select-all');
+        all.addEventListener('change', () => {
+            bulkBoxes(form).forEach(box => { box.checked = all.checked; });
+            updateBulkForm(form);
+        });
+        bulkBoxes(form).forEach(box => box.addEventListener('change', () => updateBulkForm(form)));
+        form.elements.action.addEventListener('change', () => updateBulkForm(form));
+        form.addEventListener('submit', event => {
+            const ticked = bulkBoxes(form).filter(box => box.checked).length;
+            const label = form.elements.action.selectedOptions[0].text;
+            if (!ticked) {
+                alert('Select at least one row first.');
+                event.preventDefault();
+            } else if (!confirm(`${label}: ${ticked} selected. Continue?`)) {
+                event.preventDefault();
+            }
+        });
+        updateBulkForm(form);
+    });
+});
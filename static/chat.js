@@ -0,0 +1,168 @@
+// Live chat for orders and custom requests.
+// Opening a chat fetches the latest page of history, then holds one
+// EventSource on /stream_*_messages/<id>?after_id=<newest> that only pushes
+// messages newer than what is already on screen. Older history is fetched a
+// page at a time with ?before_id=<oldest>.
+
+const CHAT_KINDS = {
+    order: {
+        stream: id => `/stream_order_messages/${id}`,
+        history: id => `/get_order_messages/${id}`,
+        send: id => `/send_order_message/${id}`,
+        panels: ['order-chat-', 'order-chat-row-'],
+        box: 'order-chat-box-',
+        input: 'order-chat-input-',
+    },
+    request: {
+        stream: id => `/stream_messages/${id}`,
+        history: id => `/get_messages/${id}`,
+        send: id => `/send_message/${id}`,
+        panels: ['chat-section-', 'chat-row-'],
+        box: 'chat-box-',
+        input: 'chat-input-',
+    },
+};
+
+const chatStreams = {};
+
+function chatPanel(kind, id) {
+    for (const prefix of CHAT_KINDS[kind].panels) {
+        const el = document.getElementById(`${prefix}${id}`);
+        if (el) return el;
+    }
+    return null;
+}
+
+function renderChatMessage(msg) {
+    const div = document.createElement('div');
+    const isAdmin = msg.sender.toLowerCase().includes('admin');
+    div.className = `message ${isAdmin ? 'admin' : 'student'}`;
+    div.style.marginBottom = '10px';
+    const sender = document.createElement('strong');
+    sender.textContent = msg.sender;
+    const body = document.createElement('div');
+    body.style.marginTop = '4px';
+    body.textContent = msg.message;
+    div.append(sender, body);
+    return div;
+}
+
+function showOlderButton(kind, id, chat) {
+    if (!chat.hasMore) {
+        if (chat.olderButton) chat.olderButton.remove();
+        chat.olderButton = null;
+        return;
+    }
+    if (!chat.olderButton) {
+        chat.olderButton = document.createElement('button');
+        chat.olderButton.type = 'button';
+        chat.olderButton.textContent = 'Load earlier messages';
+        chat.olderButton.style.marginBottom = '10px';
+        chat.olderButton.addEventListener('click', () => loadOlder(kind, id));
+        chat.box.prepend(chat.olderButton);
+    }
+}
+
+async function loadOlder(kind, id) {
+    const chat = chatStreams[`${kind}-${id}`];
+    if (!chat || chat.oldestId === null) return;
+    const response = await fetch(`${CHAT_KINDS[kind].history(id)}?before_id=${chat.oldestId}`);
+    const data = await response.json();
+    if (!data.messages) return;
+    const anchor = chat.olderButton ? chat.olderButton.nextSibling : chat.box.firstChild;
+    data.messages.forEach(msg => chat.box.insertBefore(renderChatMessage(msg), anchor));
+    if (data.messages.length) chat.oldestId = data.messages[0].id;
+    chat.hasMore = data.has_more;
+    showOlderButton(kind, id, chat);
+}
+
+async function openChat(kind, id) {
+    const box = document.getElementById(`${CHAT_KINDS[kind].box}${id}`);
+    if (!box) return;
+    box.innerHTML = '';
+    const chat = { box, oldestId: null, newestId: 0, hasMore: false, olderButton: null, source: null };
+    chatStreams[`${kind}-${id}`] = chat;
+
+    try {
+        const response = await fetch(CHAT_KINDS[kind].history(id));
+        const data = await response.json();
+        if (data.messages) {
+            data.messages.forEach(msg => box.appendChild(renderChatMessage(msg)));
+            if (data.messages.length) {
+                chat.oldestId = data.messages[0].id;
+                chat.newestId = data.messages[data.messages.length - 1].id;
+            }
+            chat.hasMore = data.has_more;
+            showOlderButton(kind, id, chat);
+            box.scrollTop = box.scrollHeight;
+        }
+    } catch (error) {
+        console.error("Chat loading failed:", error);
+    }
+
+    // Closed while the history was loading
+    if (chatStreams[`${kind}-${id}`] !== chat) return;
+    chat.source = new EventSource(`${CHAT_KINDS[kind].stream(id)}?after_id=${chat.newestId}`);
+    chat.source.onmessage = event => {
+        const msg = JSON.parse(event.data);
+        if (msg.id <= chat.newestId) return;
+        chat.newestId = msg.id;
+        if (chat.oldestId === null) chat.oldestId = msg.id;
+        box.appendChild(renderChatMessage(msg));
+        box.scrollTop = box.scrollHeight;
+    };
+}
+
+function closeChat(kind, id) {
+    const key = `${kind}-${id}`;
+    if (chatStreams[key]) {
+        if (chatStreams[key].source) chatStreams[key].source.close();
+        delete chatStreams[key];
+    }
+}
+
+function toggleChat(kind, id) {
+    if (!id) return;
+    const panel = chatPanel(kind, id);
+    if (!panel) return;
+    if (panel.style.display === 'none') {
+        panel.style.display = '';
+        openChat(kind, id);
+    } else {
+        panel.style.display = 'none';
+        closeChat(kind, id);
+    }
+}
+
+async function sendChat(kind, id) {
+    const input = document.getElementById(`${CHAT_KINDS[kind].input}${id}`);
+    const message = input.value;
+    if (!message) return;
+
+    try {
+        await fetch(CHAT_KINDS[kind].send(id), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message })
+        });
+        // The open stream delivers the message back to us
+        input.value = '';
+    } catch (error) {
+        console.error("Message sending failed:", error);
+    }
+}
+
+// Used by the inline handlers in index.html
+function toggleOrderChat(orderId) { toggleChat('order', orderId); }
+function sendOrderMessage(orderId) { sendChat('order', orderId); }
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.chat-toggle-btn[data-order-id]').forEach(btn =>
+        btn.addEventListener('click', () => toggleChat('order', btn.dataset.orderId)));
+    document.querySelectorAll('.send-order-msg-btn[data-order-id]').forEach(btn =>
+        btn.addEventListener('click', () => sendChat('order', btn.dataset.orderId)));
+    document.querySelectorAll('.request-chat-toggle[data-request-id]').forEach(btn =>
+        btn.addEventListener('click', () => toggleChat('request', btn.dataset.requestId)));
+    document.querySelectorAll('.send-message-btn[data-request-id]').forEach(btn =>
+        btn.addEventListener('click', () => sendChat('request', btn.dataset.requestId)));
+});
@@ -0,0 +1,62 @@
+// Project media galleries on the catalog page.
+// Cards only ship a poster image and the media counts; the full gallery is
+// fetched from /api/projects/<id>/media the first time a card is expanded.
+// Videos use preload="none", so nothing is downloaded until one is played.
+
+const mediaGalleries = {};
+
+function renderGalleryPhoto(photo) {
+    const img = document.createElement('img');
+    img.src = photo.src;
+    if (photo.srcset) {
+        img.srcset = photo.srcset;
+        img.sizes = '(max-width: 600px) 100vw, 560px';
+    }
+    img.loading = 'lazy';
+    img.decoding = 'async';
+    img.style.cssText = 'width: 100%; border-radius: 12px; border: 1px solid var(--glass-border); cursor: pointer;';
+    img.addEventListener('click', () => window.open(photo.full));
+    return img;
+}
+
+function renderGalleryVideo(video) {
+    const el = document.createElement('video');
+    el.src = video.src;
+    el.controls = true;
+    el.preload = 'none';
+    el.style.cssText = 'width: 100%; border-radius: 12px; border: 1px solid var(--glass-border);';
+    return el;
+}
+
+async function loadGallery(projectId, container) {
+    const response = await fetch(`/api/projects/${projectId}/media`);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    const data = await response.json();
+    container.innerHTML = '';
+    // The first photo is already on the card as the poster
+    data.photos.slice(1).forEach(photo => container.appendChild(renderGalleryPhoto(photo)));
+    data.videos.forEach(video => container.appendChild(renderGalleryVideo(video)));
+}
+
+async function toggleGallery(projectId) {
+    const container = document.getElementById(`media-gallery-${projectId}`);
+    if (!container) return;
+    if (container.style.display !== 'none') {
+        container.style.display = 'none';
+        return;
+    }
+    container.style.display = 'flex';
+    if (mediaGalleries[projectId]) return;
+    mediaGalleries[projectId] = true;
+    try {
+        await loadGallery(projectId, container);
+    } catch (error) {
+        delete mediaGalleries[projectId];
+        console.error("Gallery loading failed:", error);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.media-toggle-btn[data-project-id]').forEach(btn =>
+        btn.addEventListener('click', () => toggleGallery(btn.dataset.projectId)));
+});
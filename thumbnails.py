@@ -0,0 +1,178 @@
+"""Thumbnail and medium-size copies of uploaded photos.
+
+Admins and students upload full-resolution screenshots and wallpapers that
+the catalog shows at card size. After add_project/request_project commit,
+the new photos are handed to a small thread pool that writes WebP copies
+at each width in VARIANTS (never upscaling) next to the blob store, under
+UPLOAD_FOLDER/variants/, and records them in image_variants. Pages read a
+photo's variants with the query that already loads its path (see
+variants_column) and render them as srcset with loading="lazy"; a photo
+with no variants yet is shown as-is and queued, so photos uploaded before
+this existed are backfilled the first time a page shows them.
+
+Under gevent the pool's threads are greenlets, so the resize itself runs
+through blocking.call() on a native thread and never holds up the worker's
+other requests and chat streams.
+
+Pillow is optional: without it nothing is queued and pages keep serving
+the original files. It is only imported when a photo is resized, so a cold
+start that never resizes anything does not pay for it.
+"""
+import importlib.util
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import blobstore
+import blocking
+import catalog
+import db
+
+log = logging.getLogger(__name__)
+
+HAVE_PILLOW = importlib.util.find_spec("PIL") is not None
+
+# (name, width in pixels), smallest first
+VARIANTS = (("thumb", 320), ("medium", 800))
+FORMAT = "WEBP"
+EXTENSION = ".webp"
+QUALITY = 80
+VARIANT_DIR = "variants"
+
+DEFAULT_WORKERS = 2
+
+
+def variants_column(column):
+    """SQL for an extra column holding the variants of the photo in ``column``
+    as a JSON array of [path, width], smallest first."""
+    return ("(SELECT json_group_array(json_array(path, width)) FROM "
+            f"(SELECT path, width FROM image_variants WHERE source = {column} ORDER BY width))")
+
+
+class Photo(namedtuple("Photo", "path variants")):
+    """A stored photo and its (path, width) variants, smallest first."""
+
+    @property
+    def src(self):
+        # Largest variant for browsers that ignore srcset, else the original
+        return self.variants[-1][0] if self.variants else self.path
+
+
+def photo(path, variants_json):
+    """Build a Photo from a row that selected variants_column(); queues
+    generation if the photo has no variants yet."""
+    variants = tuple((p, w) for p, w in json.loads(variants_json)) if variants_json else ()
+    if not variants:
+        worker.enqueue(path)
+    return Photo(path, variants)
+
+
+def variant_path(source, name):
+    stem = os.path.splitext(source[len(blobstore.PREFIX):])[0]
+    return f"{blobstore.PREFIX}{VARIANT_DIR}/{stem}-{name}{EXTENSION}"
+
+
+def generate(upload_folder, source):
+    """Write the variants of ``source``; returns [(name, path, width, height)]."""
+    from PIL import Image, ImageOps
+
+    made = []
+    with Image.open(blobstore.fs_path(upload_folder, source)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            transparent = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if transparent else "RGB")
+        for name, target in VARIANTS:
+            width = min(target, image.width)
+            if made and width <= made[-1][2]:
+                break  # the photo is smaller than this size; the last variant covers it
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS) if width < image.width else image
+            path = variant_path(source, name)
+            dest = blobstore.fs_path(upload_folder, path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+            resized.save(tmp, FORMAT, quality=QUALITY)
+            os.replace(tmp, dest)
+            made.append((name, path, width, height))
+    return made
+
+
+def record(con, source, made):
+    con.executemany(
+        "INSERT INTO image_variants(source, variant, path, width, height) VALUES(?,?,?,?,?) "
+        "ON CONFLICT(source, variant) DO UPDATE SET path=excluded.path, width=excluded.width, height=excluded.height",
+        [(source,) + variant for variant in made])
+
+
+def remove_variants(con, upload_folder, sources):
+    """Delete the variants of photos whose blob has been removed (pass the
+    paths blobstore.release() returned, after blobstore.remove_unused())."""
+    for source in sources:
+        if con.execute("SELECT 1 FROM blobs WHERE path=?", (source,)).fetchone():
+            continue
+        paths = [r[0] for r in con.execute("DELETE FROM image_variants WHERE source=? RETURNING path", (source,))]
+        for path in paths:
+            try:
+                os.remove(blobstore.fs_path(upload_folder, path))
+            except FileNotFoundError:
+                pass
+    con.commit()
+
+
+class ThumbnailWorker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.failed = set()  # not an image, or unreadable: don't retry in this process
+        self.executor = None
+        self.database = None
+        self.upload_folder = None
+        self.workers = DEFAULT_WORKERS
+
+    def init_app(self, app):
+        self.database = app.config["DATABASE"]
+        self.upload_folder = app.config["UPLOAD_FOLDER"]
+        self.workers = app.config.get("THUMBNAIL_WORKERS", DEFAULT_WORKERS)
+        app.extensions["thumbnails"] = self
+
+    def enqueue(self, *sources):
+        if not HAVE_PILLOW or self.database is None or self.workers < 1:
+            return
+        with self.lock:
+            # Started on first use so each gunicorn worker gets its own threads
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="thumbnails")
+            for source in sources:
+                if source and source not in self.pending and source not in self.failed:
+                    self.pending.add(source)
+                    self.executor.submit(self.run, source)
+
+    def run(self, source):
+        con = db.connect(self.database)
+        try:
+            record(con, source, blocking.call(generate, self.upload_folder, source))
+            # Catalog snapshots carry the variants of project photos
+            if con.execute("SELECT 1 FROM project_photos WHERE photo_path=? LIMIT 1", (source,)).fetchone():
+                catalog.catalog.bump(con)
+            con.commit()
+        except Exception:
+            self.failed.add(source)
+            log.exception("Thumbnail error for %s", source)
+        finally:
+            con.close()
+            with self.lock:
+                self.pending.discard(source)
+
+    def wait(self):
+        """Block until everything queued so far is done (benchmarks, CLI)."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+worker = ThumbnailWorker()
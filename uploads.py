@@ -0,0 +1,155 @@
+"""Streaming upload handling for project media and archives.
+
+Werkzeug normally spools every uploaded file to a temporary file and the
+route then copies it again with FileStorage.save(). UploadRequest instead
+hands the multipart parser a SpoolFile that writes each chunk straight into
+a hidden file inside UPLOAD_FOLDER, hashing and counting as it goes, so
+save() is a rename on the same filesystem. Each part is checked against the
+limit for its kind (photo, video or archive) while it is still arriving, so
+an oversized video is rejected with 413 after at most one chunk past the
+limit rather than after the whole body has been read.
+
+The kind comes from the form field the part was posted under, never from
+its Content-Type or filename, which the client chooses: a 90 MB file sent
+as "photos" is held to the photo limit whatever it claims to be.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app, g
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser, MultiPartParser
+
+MB = 1024 * 1024
+
+DEFAULT_LIMITS = {
+    "photo": 10 * MB,
+    "video": 100 * MB,
+    "archive": 100 * MB,
+}
+
+
+# Form field -> kind of file, for every file input a route reads. A field
+# missing here gets the smallest limit, so add new upload fields to it.
+FIELD_KINDS = {
+    "photos": "photo",
+    "videos": "video",
+    "project_file": "archive",
+    "final_file": "archive",
+    "statement": "archive",
+}
+
+
+def field_kind(field):
+    return FIELD_KINDS.get(field, "photo")
+
+
+class SpoolFile:
+    """Writable/readable file object the multipart parser streams a part into."""
+
+    def __init__(self, directory, kind, limit):
+        self.kind = kind
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix=".upload-", delete=False)
+        self.path = self.file.name
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            self.discard()
+            raise RequestEntityTooLarge(
+                f"{self.kind.capitalize()} uploads are limited to {self.limit // MB} MB.")
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    # The parser seeks back to the start once the part is complete, and
+    # FileStorage may read from it; delegate the rest to the real file.
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def commit(self, destination):
+        self.file.close()
+        os.replace(self.path, destination)
+        self.committed = True
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FieldMultiPartParser(MultiPartParser):
+    """Passes each file part's form field name on to the stream factory."""
+
+    def start_file_streaming(self, event, total_content_length):
+        content_type = event.headers.get("content-type")
+        try:
+            content_length = int(event.headers["content-length"])
+        except (KeyError, ValueError):
+            content_length = 0
+        return self.stream_factory(total_content_length=total_content_length, content_type=content_type,
+                                   filename=event.filename, content_length=content_length, field=event.name)
+
+
+class FieldFormDataParser(FormDataParser):
+    def _parse_multipart(self, stream, mimetype, content_length, options):
+        parser = FieldMultiPartParser(stream_factory=self.stream_factory,
+                                      max_form_memory_size=self.max_form_memory_size,
+                                      max_form_parts=self.max_form_parts, cls=self.cls)
+        boundary = options.get("boundary", "").encode("ascii")
+        if not boundary:
+            raise ValueError("Missing boundary")
+        form, files = parser.parse(stream, boundary, content_length)
+        return stream, form, files
+
+
+class UploadRequest(Request):
+    form_data_parser_class = FieldFormDataParser
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None,
+                         field=None):
+        kind = field_kind(field)
+        limit = current_app.config.get("UPLOAD_LIMITS", DEFAULT_LIMITS)[kind]
+        if content_length is not None and content_length > limit:
+            raise RequestEntityTooLarge(f"{kind.capitalize()} uploads are limited to {limit // MB} MB.")
+        spool = SpoolFile(current_app.config["UPLOAD_FOLDER"], kind, limit)
+        g.setdefault("upload_spools", []).append(spool)
+        return spool
+
+
+def save(storage, path):
+    """Move an uploaded file to ``path``; returns (size, sha256 hex digest)."""
+    stream = storage.stream
+    if isinstance(stream, SpoolFile):
+        stream.commit(path)
+        return stream.size, stream.hexdigest
+
+    # Not spooled by UploadRequest (e.g. a FileStorage built by hand)
+    storage.save(path)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            sha256.update(chunk)
+    return os.path.getsize(path), sha256.hexdigest()
+
+
+def cleanup_spools(exc=None):
+    # Anything the route did not save (empty file inputs, errors, aborted
+    # requests) must not linger in the upload folder.
+    for spool in g.pop("upload_spools", []):
+        spool.discard()
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+    app.config.setdefault("UPLOAD_LIMITS", dict(DEFAULT_LIMITS))
+    app.teardown_request(cleanup_spools)